@@ -0,0 +1,100 @@
+# benchmarks/bench_capture_profiles.py
+"""
+So sánh các hồ sơ định dạng chụp (CAPTURE_PROFILES trong core/config.py) trên một camera:
+định dạng driver thật sự chấp nhận, FPS thực tế nhận được, độ dao động chu kỳ frame,
+số frame trễ/rơi và (tùy chọn) độ trễ glass-to-app đo bằng cách nháy màn hình trước camera.
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.bench_capture_profiles --camera 0 --seconds 5
+    python -m benchmarks.bench_capture_profiles --camera 0 --flash --flashes 8   # camera hướng vào màn hình
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core import config
+from utils.camera import Camera
+from utils.latency import FrameRecorder, measure_flash_latency
+
+
+def run_profile(index, name, profile, seconds, flash, flashes, threshold):
+    cam = Camera(index, ring_size=config.CAMERA_RING_SIZE, profile=profile)
+    if not cam.start() or cam.wait_for_frame(timeout=3.0) is None:
+        cam.release()
+        return {'name': name, 'error': "không mở được camera"}
+    time.sleep(1.0) # Bỏ qua giai đoạn driver/phơi sáng tự động ổn định
+    stats_before = cam.stats()
+    recorder = FrameRecorder(cam)
+    recorder.start()
+    time.sleep(seconds)
+    times = np.asarray(recorder.times)
+    stats_after = cam.stats()
+    latencies = measure_flash_latency(recorder, flashes, threshold) if flash else []
+    recorder.stop()
+    cam.release()
+
+    intervals_ms = np.diff(times) * 1000
+    result = {
+        'name': name,
+        'format': cam.format,
+        'fps': (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 else 0.0,
+        'interval_p95_ms': float(np.percentile(intervals_ms, 95)) if intervals_ms.size else 0.0,
+        'late': stats_after['late'] - stats_before['late'],
+        'dropped': stats_after['dropped'] - stats_before['dropped'],
+        'missed': recorder.missed,
+    }
+    latencies = [latency for latency in latencies if latency is not None]
+    if latencies:
+        result['latency_ms'] = float(np.median(latencies))
+        result['latency_min_ms'] = float(np.min(latencies))
+    return result
+
+
+def describe_format(fmt):
+    actual = fmt['actual']
+    text = f"{actual['fourcc'] or '?'} {actual['width']:.0f}x{actual['height']:.0f}@{actual['fps']:g} đệm {actual['buffersize']:.0f}"
+    if fmt['mismatched']:
+        text += f" (lệch: {', '.join(fmt['mismatched'])})"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các hồ sơ định dạng chụp của camera")
+    parser.add_argument("--camera", type=int, default=0, help="Chỉ số camera")
+    parser.add_argument("--profiles", nargs="*", default=None,
+                        help=f"Tên hồ sơ cần đo (mặc định tất cả: {', '.join(config.CAPTURE_PROFILES)})")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Thời gian đo FPS mỗi hồ sơ")
+    parser.add_argument("--flash", action="store_true", help="Đo thêm độ trễ glass-to-app bằng nháy màn hình")
+    parser.add_argument("--flashes", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=20.0, help="Ngưỡng thay đổi độ sáng (0-255)")
+    args = parser.parse_args()
+
+    names = args.profiles or list(config.CAPTURE_PROFILES)
+    unknown = [name for name in names if name not in config.CAPTURE_PROFILES]
+    if unknown:
+        print(f"Không có hồ sơ: {', '.join(unknown)}")
+        return
+
+    results = []
+    for name in names:
+        print(f"Đang đo hồ sơ '{name}'...")
+        results.append(run_profile(
+            args.camera, name, config.CAPTURE_PROFILES[name], args.seconds, args.flash, args.flashes, args.threshold
+        ))
+
+    print(f"{'Hồ sơ':<16}{'FPS':>7}{'Chu kỳ p95':>12}{'Trễ':>6}{'Rơi':>6}{'Độ trễ':>10}{'(min)':>8}  Định dạng thực tế")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['name']:<16}  {result['error']}")
+            continue
+        latency = f"{result['latency_ms']:>10.0f}{result['latency_min_ms']:>8.0f}" if 'latency_ms' in result else f"{'--':>10}{'':>8}"
+        print(f"{result['name']:<16}{result['fps']:>7.1f}{result['interval_p95_ms']:>12.1f}"
+              f"{result['late']:>6}{result['dropped']:>6}{latency}  {describe_format(result['format'])}")
+    if any(result.get('missed') for result in results):
+        print("Lưu ý: bộ ghi đã bỏ lỡ một số frame, FPS có thể bị đánh giá thấp hơn thực tế.")
+    print(f"Hồ sơ đang dùng: CAPTURE_PROFILE = '{config.CAPTURE_PROFILE}' (core/config.py)")
+
+
+if __name__ == "__main__":
+    main()
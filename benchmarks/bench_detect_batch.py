@@ -0,0 +1,82 @@
+# benchmarks/bench_detect_batch.py
+"""
+So sánh thông lượng nhận dạng theo từng frame và theo batch trên CPU.
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.bench_detect_batch --model my_modelv8s.pt --frames captured_images
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from module.detection_module import ObjectDetector
+
+BATCH_SIZES = [1, 4, 8, 16]
+
+
+def load_frames(folder, count):
+    """Đọc tối đa `count` ảnh trong thư mục, nếu thiếu thì sinh ảnh ngẫu nhiên."""
+    frames = []
+    if folder and os.path.isdir(folder):
+        paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+        for path in paths[:count]:
+            img = cv2.imread(path)
+            if img is not None:
+                frames.append(img)
+    rng = np.random.default_rng(0)
+    while len(frames) < count:
+        frames.append(rng.integers(0, 255, size=(640, 480, 3), dtype=np.uint8))
+    return frames
+
+
+def run_serial(detector, frames, conf):
+    start = time.perf_counter()
+    for frame in frames:
+        detector.detect(frame, conf=conf)
+    return time.perf_counter() - start
+
+
+def run_batched(detector, frames, batch_size, conf):
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detector.detect_batch(frames[i:i + batch_size], conf=conf)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detect() và detect_batch() trên CPU")
+    parser.add_argument("--model", default="my_modelv8s.pt")
+    parser.add_argument("--frames", default="captured_images", help="Thư mục chứa ảnh đã chụp")
+    parser.add_argument("--count", type=int, default=64, help="Số frame cho mỗi lần đo")
+    parser.add_argument("--conf", type=float, default=0.75)
+    args = parser.parse_args()
+
+    detector = ObjectDetector(model_path=args.model)
+    if detector.model is None:
+        return
+
+    # Ép chạy trên CPU để đo đúng cấu hình máy trường bắn
+    detector.model.to("cpu")
+    frames = load_frames(args.frames, args.count)
+
+    # Warm-up cho cả hai đường chạy
+    detector.detect(frames[0], conf=args.conf)
+    detector.detect_batch(frames[:max(BATCH_SIZES)], conf=args.conf)
+
+    serial_time = run_serial(detector, frames, args.conf)
+    serial_fps = len(frames) / serial_time
+    print(f"{'Chế độ':<12}{'Batch':>6}{'Tổng (s)':>12}{'FPS':>10}{'Tăng tốc':>10}")
+    print(f"{'từng frame':<12}{1:>6}{serial_time:>12.3f}{serial_fps:>10.1f}{1.0:>10.2f}")
+
+    for batch_size in BATCH_SIZES:
+        batch_time = run_batched(detector, frames, batch_size, args.conf)
+        fps = len(frames) / batch_time
+        print(f"{'batch':<12}{batch_size:>6}{batch_time:>12.3f}{fps:>10.1f}{fps / serial_fps:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
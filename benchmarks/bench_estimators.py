@@ -0,0 +1,95 @@
+# benchmarks/bench_estimators.py
+"""
+So sánh các bộ ước lượng homography (RANSAC và các biến thể USAC của OpenCV):
+thời gian ước lượng, tỉ lệ inlier và độ lệch điểm chuyển đổi so với cấu hình RANSAC hiện tại.
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.bench_estimators --reference images/original/bia_so_4.png \
+        --mask images/mask/mask_bia_so_4.png --crops crops_bia_so_4
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.features import compute_features
+from utils.matching import create_matcher
+from utils.processing import ROBUST_ESTIMATORS, robust_homography, transform_point
+
+BASELINE = 'ransac'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các bộ ước lượng homography")
+    parser.add_argument("--reference", required=True, help="Ảnh bia gốc")
+    parser.add_argument("--mask", default=None, help="Mask của ảnh bia gốc")
+    parser.add_argument("--crops", required=True, help="Thư mục ảnh crop")
+    parser.add_argument("--thresh", type=float, default=4.0)
+    parser.add_argument("--max-iters", type=int, default=2000)
+    parser.add_argument("--confidence", type=float, default=0.995)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    reference = cv2.imread(args.reference)
+    mask = cv2.imread(args.mask, cv2.IMREAD_GRAYSCALE) if args.mask else None
+    ref_features = compute_features(reference, mask)
+    matcher = create_matcher(ref_features['descriptors'])
+
+    # Tính sẵn các cặp match để chỉ đo riêng bước ước lượng
+    cases = []
+    paths = sorted(glob.glob(os.path.join(args.crops, "*.png")) + glob.glob(os.path.join(args.crops, "*.jpg")))
+    for path in paths:
+        crop = cv2.imread(path)
+        crop_features = compute_features(crop)
+        if crop_features is None:
+            continue
+        ref_idx, crop_idx = matcher.match(crop_features['descriptors'])
+        if len(ref_idx) < 5:
+            continue
+        src = crop_features['points'][crop_idx].reshape(-1, 1, 2)
+        dst = ref_features['points'][ref_idx].reshape(-1, 1, 2)
+        # Điểm kiểm tra: tâm ảnh crop, gần với vị trí tâm ngắm thường gặp
+        center = (crop.shape[1] / 2, crop.shape[0] / 2)
+        cases.append((src, dst, center))
+
+    if not cases:
+        print(f"Không có crop nào đủ match trong '{args.crops}'.")
+        return
+
+    stats = {}
+    baseline_points = []
+    for method in ROBUST_ESTIMATORS:
+        times, ratios, points, failures = [], [], [], 0
+        for src, dst, center in cases:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                H, inliers = robust_homography(src, dst, method, args.thresh, args.max_iters, args.confidence)
+            times.append((time.perf_counter() - start) * 1000 / args.repeat)
+            if H is None:
+                failures += 1
+                points.append(None)
+                continue
+            ratios.append(inliers / len(src))
+            points.append(transform_point(H, center))
+        stats[method] = (times, ratios, points, failures)
+        if method == BASELINE:
+            baseline_points = points
+
+    print(f"Số crop: {len(cases)} | match TB/crop: {np.mean([len(c[0]) for c in cases]):.0f}")
+    print(f"{'Bộ ước lượng':<15}{'TB (ms)':>9}{'p95 (ms)':>10}{'Inlier TB':>11}{'Lệch TB (px)':>14}{'Lỗi':>6}")
+    for method, (times, ratios, points, failures) in stats.items():
+        deviations = [
+            np.hypot(p[0] - b[0], p[1] - b[1])
+            for p, b in zip(points, baseline_points) if p is not None and b is not None
+        ]
+        deviation = f"{np.mean(deviations):.2f}" if deviations else "-"
+        mean_ratio = f"{np.mean(ratios) * 100:.1f}%" if ratios else "-"
+        print(f"{method:<15}{np.mean(times):>9.2f}{np.percentile(times, 95):>10.2f}"
+              f"{mean_ratio:>11}{deviation:>14}{failures:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_matching.py
+"""
+So sánh tốc độ so khớp descriptor: cách cũ (2 lượt BFMatcher.knnMatch + lọc bằng list/set),
+BruteForceMatcher (NumPy) và FlannLshMatcher (chỉ mục LSH huấn luyện sẵn).
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.bench_matching --reference images/original/bia_so_4.png \
+        --mask images/mask/mask_bia_so_4.png --crops crops_bia_so_4
+Thư mục `--crops` chứa các ảnh crop mục tiêu đã cắt từ ảnh chụp thực tế.
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.features import compute_features
+from utils.matching import create_matcher, MATCHERS
+
+
+def legacy_match(des1, des2, ratio_thresh=0.75):
+    """Bản sao logic so khớp cũ trong warp_crop_to_original để làm mốc so sánh."""
+    bf = cv2.BFMatcher(cv2.NORM_HAMMING)
+    matches12 = bf.knnMatch(des1, des2, k=2)
+    matches21 = bf.knnMatch(des2, des1, k=2)
+    good12 = [m for m, n in matches12 if m.distance < ratio_thresh * n.distance]
+    good21 = [m for m, n in matches21 if m.distance < ratio_thresh * n.distance]
+    reverse_map = {(m.trainIdx, m.queryIdx) for m in good21}
+    return {(m.queryIdx, m.trainIdx) for m in good12 if (m.queryIdx, m.trainIdx) in reverse_map}
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark các engine so khớp descriptor")
+    parser.add_argument("--reference", required=True, help="Ảnh bia gốc")
+    parser.add_argument("--mask", default=None, help="Mask của ảnh bia gốc")
+    parser.add_argument("--crops", required=True, help="Thư mục ảnh crop")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    reference = cv2.imread(args.reference)
+    mask = cv2.imread(args.mask, cv2.IMREAD_GRAYSCALE) if args.mask else None
+    ref_features = compute_features(reference, mask)
+    if ref_features is None:
+        print("Không tính được đặc trưng cho ảnh bia gốc.")
+        return
+
+    build_ms = {}
+    matchers = {}
+    for kind in MATCHERS:
+        matchers[kind], build_ms[kind] = timed(lambda: create_matcher(ref_features['descriptors'], kind), 1)
+
+    paths = sorted(glob.glob(os.path.join(args.crops, "*.png")) + glob.glob(os.path.join(args.crops, "*.jpg")))
+    times = {'legacy': [], **{kind: [] for kind in MATCHERS}}
+    counts = {key: [] for key in times}
+    agreement = {kind: [] for kind in MATCHERS}
+    for path in paths:
+        crop_features = compute_features(cv2.imread(path))
+        if crop_features is None:
+            continue
+        des_crop = crop_features['descriptors']
+
+        legacy, ms = timed(lambda: legacy_match(ref_features['descriptors'], des_crop), args.repeat)
+        times['legacy'].append(ms)
+        counts['legacy'].append(len(legacy))
+        for kind, matcher in matchers.items():
+            (ref_idx, crop_idx), ms = timed(lambda: matcher.match(des_crop), args.repeat)
+            times[kind].append(ms)
+            counts[kind].append(len(ref_idx))
+            pairs = set(zip(ref_idx.tolist(), crop_idx.tolist()))
+            agreement[kind].append(len(pairs & legacy) / len(legacy) if legacy else 1.0)
+
+    if not times['legacy']:
+        print(f"Không có ảnh crop hợp lệ trong '{args.crops}'.")
+        return
+
+    print(f"Ảnh gốc: {len(ref_features['points'])} đặc trưng | Số crop: {len(times['legacy'])}")
+    print(f"{'Engine':<10}{'Dựng (ms)':>11}{'Match TB (ms)':>15}{'Tăng tốc':>10}{'Mutual TB':>11}{'Trùng cũ':>10}")
+    legacy_mean = np.mean(times['legacy'])
+    print(f"{'legacy':<10}{'-':>11}{legacy_mean:>15.2f}{1.0:>10.2f}{np.mean(counts['legacy']):>11.1f}{'100%':>10}")
+    for kind in MATCHERS:
+        mean_ms = np.mean(times[kind])
+        print(f"{kind:<10}{build_ms[kind]:>11.2f}{mean_ms:>15.2f}{legacy_mean / mean_ms:>10.2f}"
+              f"{np.mean(counts[kind]):>11.1f}{np.mean(agreement[kind]) * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
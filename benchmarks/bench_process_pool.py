@@ -0,0 +1,120 @@
+# benchmarks/bench_process_pool.py
+"""
+Đo độ trễ hàng đợi khi bắn liên tục (mặc định 5 phát/giây): một worker duy nhất
+(như QThread hiện tại) so với nhóm tiến trình ShotProcessPool.
+Với một worker, độ trễ hàng đợi tăng dần theo từng phát; với nhóm tiến trình đủ lớn nó phải giữ ổn định.
+
+Cách chạy (từ thư mục gốc dự án), với thư mục ảnh đã chụp (ví dụ captured_images):
+    python -m benchmarks.bench_process_pool --frames captured_images --shots 20 --rate 5
+"""
+import argparse
+import glob
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from core.process_pool import ShotProcessPool, default_pool_size
+from core.shot_queue import Shot, ShotQueue
+from core.worker import ProcessingWorker
+
+
+def load_frames(folder, count):
+    paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+    frames = [cv2.imread(path) for path in paths[:count]]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return []
+    return [frames[i % len(frames)] for i in range(count)]
+
+
+def run_single(frames, rate):
+    """Mô phỏng một worker FIFO: phát bắn i đến lúc i/rate, bắt đầu khi worker rảnh."""
+    worker = ProcessingWorker()
+    worker.initialize()
+    queue_ms = []
+    t0 = time.monotonic()
+    for i, frame in enumerate(frames):
+        arrival = t0 + i / rate
+        now = time.monotonic()
+        if now < arrival:
+            time.sleep(arrival - now)
+        queue_ms.append((time.monotonic() - arrival) * 1000)
+        worker.process(frame, None, "")
+    return queue_ms
+
+
+def run_pool(frames, rate, size):
+    shot_queue = ShotQueue(max_depth=len(frames), coalesce_ms=0)
+    pool = ShotProcessPool(shot_queue, size=size)
+    shot_queue.shot_ready.connect(pool.pump)
+    if not pool.wait_ready(timeout=300):
+        print("Nhóm tiến trình không khởi động kịp.")
+        pool.shutdown()
+        return [], [], {}
+
+    received, done = [], threading.Event()
+
+    def on_finished(package):
+        received.append(package)
+        if len(received) == len(frames):
+            done.set()
+
+    pool.finished.connect(on_finished)
+    t0 = time.monotonic()
+    for i, frame in enumerate(frames):
+        arrival = t0 + i / rate
+        now = time.monotonic()
+        if now < arrival:
+            time.sleep(arrival - now)
+        # image_path dùng làm số thứ tự để kiểm tra thứ tự trả về
+        shot_queue.push(Shot(frame, None, str(i), stamps={'trigger': time.monotonic()}))
+    done.wait(timeout=60 + len(frames) * 5)
+    pool.shutdown()
+    for package in received:
+        shot_queue.record(package['stamps'])
+    order = [int(package['image_path']) for package in received]
+    queue_ms = [(package['stamps']['dequeue'] - package['stamps']['enqueue']) * 1000 for package in received]
+    return queue_ms, order, shot_queue.latency_summary()
+
+
+def summary(name, queue_ms):
+    queue_ms = np.asarray(queue_ms)
+    half = len(queue_ms) // 2
+    print(f"{name:<22}{queue_ms.mean():>9.0f}{np.percentile(queue_ms, 95):>10.0f}"
+          f"{queue_ms[:half].mean():>12.0f}{queue_ms[half:].mean():>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark nhóm tiến trình xử lý phát bắn")
+    parser.add_argument("--frames", required=True, help="Thư mục ảnh frame 480x640")
+    parser.add_argument("--shots", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=5.0, help="Số phát bắn mỗi giây")
+    parser.add_argument("--size", type=int, default=None, help="Số tiến trình (mặc định theo số lõi CPU)")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.shots)
+    if not frames:
+        print(f"Không có ảnh nào trong '{args.frames}'.")
+        return
+    size = args.size or default_pool_size()
+
+    single = run_single(frames, args.rate)
+    pooled, order, stages = run_pool(frames, args.rate, size)
+
+    print(f"{len(frames)} phát bắn, {args.rate:g} phát/giây")
+    print(f"{'Chế độ':<22}{'Chờ TB':>9}{'Chờ p95':>10}{'Nửa đầu TB':>12}{'Nửa sau TB':>12}  (ms)")
+    summary("một worker", single)
+    if pooled:
+        summary(f"nhóm {size} tiến trình", pooled)
+        print(f"Kết quả đúng thứ tự bóp cò: {order == sorted(order)} ({len(order)}/{len(frames)} kết quả)")
+        print("Độ trễ từng bước ở chế độ nhóm tiến trình (ms):")
+        for stage, values in stages.items():
+            if stage != 'queue':
+                print(f"  {stage:<10}TB {values['mean']:>7.1f}  p95 {values['p95']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/calibrate_trigger_offset.py
+"""
+Hiệu chỉnh độ lệch giữa trigger và camera (TRIGGER_FRAME_OFFSET_MS trong core/config.py) trên máy đang dùng.
+
+Chế độ 'trigger' (đo trực tiếp, khuyên dùng): đặt trigger Bluetooth trong khung hình, sao cho
+đèn LED của trigger (hoặc nút bấm) nằm trong vùng --roi, rồi bấm trigger --presses lần, mỗi lần cách nhau
+khoảng 1 giây. Mỗi lần bấm, độ lệch = thời điểm nhận sự kiện phím - thời điểm frame đầu tiên thấy
+vùng --roi thay đổi.
+
+Chế độ 'flash': hướng camera vào màn hình; script nháy màn hình đen/trắng và đo độ trễ camera
+(từ lúc vẽ tới lúc nhận frame, gồm cả độ trễ màn hình). Độ lệch = --trigger-latency-ms - độ trễ camera.
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.calibrate_trigger_offset --camera 0 --mode trigger --presses 10
+    python -m benchmarks.calibrate_trigger_offset --camera 0 --mode flash --flashes 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core import config
+from core.triggers import BluetoothTrigger
+from utils.camera import Camera
+from utils.latency import FrameRecorder, find_step, measure_flash_latency, summarize_offsets
+
+# Cửa sổ tìm frame thay đổi quanh mỗi lần bấm (giây)
+SEARCH_BEFORE_S = 0.5
+SEARCH_AFTER_S = 0.5
+
+
+def default_roi(cam):
+    """Một phần tư khung hình ở giữa."""
+    latest = cam.latest()
+    h, w = latest[2].shape[:2]
+    return w // 4, h // 4, w // 2, h // 2
+
+
+def run_trigger(recorder, presses, threshold):
+    trigger_times = []
+    trigger = BluetoothTrigger()
+    trigger.triggered.connect(trigger_times.append)
+    trigger.start_listening()
+    print(f"Bấm trigger {presses} lần, mỗi lần cách nhau khoảng 1 giây...")
+    while len(trigger_times) < presses:
+        time.sleep(0.05)
+    time.sleep(SEARCH_AFTER_S + 0.2)
+    trigger.stop_listening()
+
+    offsets = []
+    for i, trigger_time in enumerate(trigger_times):
+        frame_time = find_step(
+            recorder.times, recorder.values, trigger_time - SEARCH_BEFORE_S, trigger_time + SEARCH_AFTER_S,
+            threshold=threshold,
+        )
+        if frame_time is None:
+            print(f"  Lần {i + 1}: không thấy vùng ROI thay đổi, bỏ qua.")
+            continue
+        offsets.append((trigger_time - frame_time) * 1000)
+        print(f"  Lần {i + 1}: độ lệch {offsets[-1]:+.1f} ms")
+    return offsets
+
+
+def run_flash(recorder, flashes, threshold, trigger_latency_ms):
+    latencies = measure_flash_latency(recorder, flashes, threshold)
+    for i, latency_ms in enumerate(latencies):
+        if latency_ms is None:
+            print(f"  Lần {i + 1}: không thấy màn hình sáng lên, bỏ qua.")
+        else:
+            print(f"  Lần {i + 1}: độ trễ camera {latency_ms:.1f} ms")
+    return [trigger_latency_ms - latency_ms for latency_ms in latencies if latency_ms is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hiệu chỉnh độ lệch thời gian giữa trigger và camera")
+    parser.add_argument("--camera", type=int, default=0, help="Chỉ số camera")
+    parser.add_argument("--mode", choices=("trigger", "flash"), default="trigger")
+    parser.add_argument("--presses", type=int, default=10, help="Số lần bấm trigger (chế độ trigger)")
+    parser.add_argument("--flashes", type=int, default=10, help="Số lần nháy màn hình (chế độ flash)")
+    parser.add_argument("--roi", type=int, nargs=4, metavar=("X", "Y", "W", "H"), default=None,
+                        help="Vùng theo dõi trên frame camera (mặc định: một phần tư ở giữa)")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Ngưỡng thay đổi độ sáng (0-255)")
+    parser.add_argument("--trigger-latency-ms", type=float, default=0.0,
+                        help="Độ trễ trigger -> ứng dụng giả định (chỉ dùng ở chế độ flash)")
+    args = parser.parse_args()
+
+    # Độ lệch phụ thuộc định dạng chụp (độ trễ nén/đệm), nên đo với đúng hồ sơ đang dùng
+    cam = Camera(args.camera, ring_size=config.CAMERA_RING_SIZE, profile=config.CAPTURE_PROFILES[config.CAPTURE_PROFILE])
+    if not cam.start() or cam.wait_for_frame(timeout=2.0) is None:
+        print(f"Không mở được camera {args.camera}.")
+        cam.release()
+        return
+    recorder = FrameRecorder(cam, args.roi or default_roi(cam))
+    recorder.start()
+    time.sleep(1.0) # Có mức nền trước sự kiện đầu tiên
+    try:
+        if args.mode == "trigger":
+            offsets = run_trigger(recorder, args.presses, args.threshold)
+        else:
+            offsets = run_flash(recorder, args.flashes, args.threshold, args.trigger_latency_ms)
+    finally:
+        recorder.stop()
+        cam.release()
+
+    summary = summarize_offsets(offsets)
+    if not summary['count']:
+        print("Không đo được lần nào. Kiểm tra vùng --roi và --threshold.")
+        return
+    print(f"{summary['count']} lần đo: trung vị {summary['median_ms']:+.1f} ms, MAD {summary['mad_ms']:.1f} ms "
+          f"(từ {summary['min_ms']:+.1f} đến {summary['max_ms']:+.1f} ms), "
+          f"chu kỳ frame {cam.frame_period * 1000:.1f} ms")
+    print(f"Đặt trong core/config.py: TRIGGER_FRAME_OFFSET_MS = {summary['median_ms']:.0f}")
+    needed = int(np.ceil(max(0.0, summary['max_ms']) / (cam.frame_period * 1000))) + 2
+    if needed > config.CAMERA_RING_SIZE:
+        print(f"Và tăng CAMERA_RING_SIZE lên ít nhất {needed} để bộ đệm còn giữ frame cần tìm.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/check_backend_parity.py
+"""
+Kiểm tra kết quả của backend export (ONNX/OpenVINO) có khớp với PyTorch hay không.
+So sánh class và box của từng ảnh, đồng thời in thời gian suy luận trung bình.
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.check_backend_parity --backend onnx --frames captured_images
+Mã thoát khác 0 nếu có ảnh không khớp.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core import config
+from module.detection_module import ObjectDetector
+
+
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_detections(ref_dets, test_dets, iou_thresh):
+    """
+    Ghép cặp tham lam theo IoU giữa hai danh sách detection cùng class.
+    Trả về (số cặp khớp, danh sách IoU của các cặp khớp).
+    """
+    used = set()
+    ious = []
+    for ref in sorted(ref_dets, key=lambda d: -d['conf']):
+        best_j, best_iou = None, 0.0
+        for j, det in enumerate(test_dets):
+            if j in used or det['class_name'] != ref['class_name']:
+                continue
+            iou = box_iou(ref['box'], det['box'])
+            if iou > best_iou:
+                best_j, best_iou = j, iou
+        if best_j is not None and best_iou >= iou_thresh:
+            used.add(best_j)
+            ious.append(best_iou)
+    return len(ious), ious
+
+
+def timed_detect(detector, image, conf):
+    start = time.perf_counter()
+    dets = detector.detect(image, conf=conf)
+    return dets, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra độ khớp giữa backend torch và backend export")
+    parser.add_argument("--model", default=config.DETECTOR_MODEL_PATH)
+    parser.add_argument("--backend", default="onnx", choices=["onnx", "openvino"])
+    parser.add_argument("--frames", default="captured_images")
+    parser.add_argument("--conf", type=float, default=config.DETECTOR_CONF)
+    parser.add_argument("--iou", type=float, default=0.9, help="IoU tối thiểu để coi hai box là khớp")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.frames, "*.png")) + glob.glob(os.path.join(args.frames, "*.jpg")))
+    if not paths:
+        print(f"Không có ảnh nào trong thư mục '{args.frames}'.")
+        sys.exit(1)
+
+    reference = ObjectDetector(model_path=args.model, backend="torch")
+    candidate = ObjectDetector(model_path=args.model, backend=args.backend)
+    if reference.model is None or candidate.model is None or candidate.backend != args.backend:
+        print("Không tải được một trong hai model, dừng kiểm tra.")
+        sys.exit(1)
+
+    mismatched = []
+    all_ious = []
+    ref_times, cand_times = [], []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        ref_dets, ref_ms = timed_detect(reference, image, args.conf)
+        cand_dets, cand_ms = timed_detect(candidate, image, args.conf)
+        ref_times.append(ref_ms)
+        cand_times.append(cand_ms)
+
+        matched, ious = match_detections(ref_dets, cand_dets, args.iou)
+        all_ious.extend(ious)
+        if matched != len(ref_dets) or matched != len(cand_dets):
+            mismatched.append((os.path.basename(path), len(ref_dets), len(cand_dets), matched))
+
+    # Bỏ lần chạy đầu tiên vì còn chứa thời gian khởi tạo
+    ref_mean = np.mean(ref_times[1:] or ref_times)
+    cand_mean = np.mean(cand_times[1:] or cand_times)
+    print(f"Số ảnh: {len(ref_times)} | Không khớp: {len(mismatched)}")
+    if all_ious:
+        print(f"IoU các box khớp: trung bình {np.mean(all_ious):.3f}, nhỏ nhất {np.min(all_ious):.3f}")
+    print(f"Thời gian trung bình: torch {ref_mean:.1f} ms | {args.backend} {cand_mean:.1f} ms "
+          f"(x{ref_mean / cand_mean:.2f})")
+    for name, n_ref, n_cand, matched in mismatched:
+        print(f"  ❌ {name}: torch={n_ref} box, {args.backend}={n_cand} box, khớp={matched}")
+
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
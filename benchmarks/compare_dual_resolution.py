@@ -0,0 +1,83 @@
+# benchmarks/compare_dual_resolution.py
+"""
+So sánh pipeline một độ phân giải (so khớp trên crop của frame 480x640) với pipeline
+hai độ phân giải (so khớp trên crop cắt từ frame gốc của camera): độ trễ, số lần
+phải dùng điểm ước tính (fallback) và độ lệch điểm/tọa độ giữa hai chế độ.
+
+Cách chạy (từ thư mục gốc dự án), với thư mục chứa các frame gốc chụp từ camera (ví dụ 1280x720):
+    python -m benchmarks.compare_dual_resolution --frames raw_frames --center 240 320
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from core.worker import ProcessingWorker
+from utils.processing import crop_to_aspect
+
+FINAL_SIZE = (480, 640) # Giống MainWindow.final_size
+
+
+def run_once(worker, small, center, hires):
+    # Xóa cache homography để mỗi lần đo đều ước lượng đầy đủ
+    for bundle in worker.assets.values():
+        bundle['homography_cache'].invalidate()
+    start = time.perf_counter()
+    package = worker.process(small, center, "", hires)
+    return package, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh chế độ một và hai độ phân giải")
+    parser.add_argument("--frames", required=True, help="Thư mục frame gốc của camera")
+    parser.add_argument("--center", type=int, nargs=2, default=None, help="Tâm ngắm (x y) trên frame 480x640")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.frames, "*.png")) + glob.glob(os.path.join(args.frames, "*.jpg")))
+    if not paths:
+        print(f"Không có frame nào trong '{args.frames}'.")
+        return
+
+    worker = ProcessingWorker()
+    worker.initialize()
+    center = tuple(args.center) if args.center else None
+
+    rows = []
+    for path in paths:
+        raw = cv2.imread(path)
+        if raw is None:
+            continue
+        hires = crop_to_aspect(raw)
+        small = cv2.resize(hires, FINAL_SIZE, interpolation=cv2.INTER_AREA)
+        single, single_ms = run_once(worker, small, center, None)
+        dual, dual_ms = run_once(worker, small, center, hires)
+        if single['target_name'] == 'Trượt':
+            continue
+        rows.append((os.path.basename(path), single, single_ms, dual, dual_ms))
+
+    if not rows:
+        print("Không có frame nào trúng mục tiêu để so sánh.")
+        return
+
+    single_ms = np.array([r[2] for r in rows])
+    dual_ms = np.array([r[4] for r in rows])
+    single_fallback = sum(r[1]['match_source'] == 'fallback' for r in rows)
+    dual_fallback = sum(r[3]['match_source'] == 'fallback' for r in rows)
+    same_score = sum(r[1]['score'] == r[3]['score'] for r in rows)
+
+    print(f"Số frame trúng mục tiêu: {len(rows)}")
+    print(f"{'Chế độ':<18}{'TB (ms)':>9}{'p95 (ms)':>10}{'Fallback':>10}")
+    print(f"{'một độ phân giải':<18}{single_ms.mean():>9.1f}{np.percentile(single_ms, 95):>10.1f}{single_fallback:>10}")
+    print(f"{'hai độ phân giải':<18}{dual_ms.mean():>9.1f}{np.percentile(dual_ms, 95):>10.1f}{dual_fallback:>10}")
+    print(f"Cùng điểm số: {same_score}/{len(rows)}")
+    for name, single, _, dual, _ in rows:
+        if single['score'] != dual['score'] or single['match_source'] != dual['match_source']:
+            print(f"  {name}: {single['score']} ({single['match_source']}) -> {dual['score']} ({dual['match_source']}), "
+                  f"tọa độ {single['coords']} -> {dual['coords']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/report_int8.py
+"""
+Báo cáo so sánh model fp32 và model INT8 trên một thư mục ảnh:
+độ trễ trung bình/p95, bộ nhớ sử dụng và mức độ trùng khớp class/box.
+Dùng để quyết định từng máy có nên bật DETECTOR_BACKEND = 'openvino_int8' hay không.
+
+Cách chạy (từ thư mục gốc dự án):
+    python -m benchmarks.report_int8 --frames captured_images --fp32-backend openvino
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+import psutil
+
+from core import config
+from module.detection_module import ObjectDetector
+from benchmarks.check_backend_parity import match_detections
+
+
+def path_size_mb(path):
+    """Dung lượng trên đĩa của file hoặc thư mục model (MB)."""
+    if os.path.isdir(path):
+        total = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    else:
+        total = os.path.getsize(path)
+    return total / (1024 * 1024)
+
+
+def load_detector(model_path, backend, calibration_dir, warmup_image):
+    """Tải model và đo lượng RAM tăng thêm sau khi tải + warm-up."""
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    detector = ObjectDetector(model_path=model_path, backend=backend, calibration_dir=calibration_dir)
+    detector.detect(warmup_image)
+    rss_mb = (process.memory_info().rss - rss_before) / (1024 * 1024)
+    return detector, rss_mb
+
+
+def run(detector, images, conf):
+    results, times = [], []
+    for image in images:
+        start = time.perf_counter()
+        results.append(detector.detect(image, conf=conf))
+        times.append((time.perf_counter() - start) * 1000)
+    return results, np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh độ trễ/độ chính xác giữa model fp32 và INT8")
+    parser.add_argument("--model", default=config.DETECTOR_MODEL_PATH)
+    parser.add_argument("--frames", default=config.CAPTURE_DIR, help="Thư mục ảnh dùng để đánh giá")
+    parser.add_argument("--calibration", default=config.CAPTURE_DIR, help="Thư mục ảnh hiệu chỉnh INT8")
+    parser.add_argument("--fp32-backend", default="torch", choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--conf", type=float, default=config.DETECTOR_CONF)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU tối thiểu để coi hai box là khớp")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.frames, "*.png")) + glob.glob(os.path.join(args.frames, "*.jpg")))
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not images:
+        print(f"Không có ảnh nào trong thư mục '{args.frames}'.")
+        return
+
+    fp32, fp32_rss = load_detector(args.model, args.fp32_backend, args.calibration, images[0])
+    int8, int8_rss = load_detector(args.model, "openvino_int8", args.calibration, images[0])
+    if fp32.model is None or int8.model is None or int8.backend != "openvino_int8":
+        print("Không tải được model fp32 hoặc INT8, dừng báo cáo.")
+        return
+
+    fp32_dets, fp32_ms = run(fp32, images, args.conf)
+    int8_dets, int8_ms = run(int8, images, args.conf)
+
+    total_ref = total_int8 = total_matched = same_top_class = 0
+    ious = []
+    for ref, test in zip(fp32_dets, int8_dets):
+        matched, pair_ious = match_detections(ref, test, args.iou)
+        total_ref += len(ref)
+        total_int8 += len(test)
+        total_matched += matched
+        ious.extend(pair_ious)
+        ref_top = max(ref, key=lambda d: d['conf'])['class_name'] if ref else None
+        test_top = max(test, key=lambda d: d['conf'])['class_name'] if test else None
+        same_top_class += int(ref_top == test_top)
+
+    print(f"Số ảnh đánh giá: {len(images)}")
+    print(f"{'Model':<22}{'TB (ms)':>10}{'p95 (ms)':>10}{'RAM (MB)':>10}{'Đĩa (MB)':>10}")
+    for name, model, ms, rss in (
+        (f"fp32 ({fp32.backend})", fp32, fp32_ms, fp32_rss),
+        ("int8 (openvino)", int8, int8_ms, int8_rss),
+    ):
+        print(f"{name:<22}{ms.mean():>10.1f}{np.percentile(ms, 95):>10.1f}{rss:>10.1f}{path_size_mb(model.model_path):>10.1f}")
+
+    print(f"Tăng tốc trung bình: x{fp32_ms.mean() / int8_ms.mean():.2f}")
+    print(f"Box khớp (IoU >= {args.iou}, cùng class): {total_matched}/{total_ref} của fp32, "
+          f"INT8 phát hiện tổng cộng {total_int8} box")
+    print(f"Class tin cậy nhất trùng nhau: {same_top_class}/{len(images)} ảnh")
+    if ious:
+        print(f"IoU trung bình của các box khớp: {np.mean(ious):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# core/config.py
+"""
+Các thông số cấu hình dùng chung cho toàn bộ ứng dụng.
+Chỉnh sửa tại đây thay vì sửa trực tiếp trong từng module.
+"""
+
+# --- Mô hình nhận dạng ---
+DETECTOR_MODEL_PATH = "my_modelv8s.pt"
+# Backend suy luận: 'torch' (file .pt gốc), 'onnx' (ONNX Runtime), 'openvino'
+# hoặc 'openvino_int8' (OpenVINO lượng tử hóa INT8).
+# Với các backend export, file sẽ được tạo một lần và lưu cạnh file .pt.
+DETECTOR_BACKEND = "torch"
+DETECTOR_CONF = 0.75
+
+# --- Nhận dạng theo vùng quanh tâm ngắm (ROI) ---
+# Khi bật, YOLO chỉ chạy trên cửa sổ (2*ROI_MARGIN) x (2*ROI_MARGIN) quanh tâm ngắm.
+# Giữ ROI_IMGSZ ~ 2*ROI_MARGIN để vật thể có cùng tỉ lệ như khi chạy toàn frame.
+# Nếu không có mục tiêu hợp lệ chứa tâm ngắm, worker tự chạy lại trên toàn frame.
+ROI_ENABLED = False
+ROI_MARGIN = 160
+ROI_IMGSZ = 320
+
+# --- Nhận dạng trước khi bóp cò (speculative) ---
+# Khi bật, worker chạy nhận dạng nền trên frame xem trước với chu kỳ SPECULATIVE_INTERVAL_MS.
+# Lúc bóp cò, kết quả này được dùng lại nếu còn mới (<= SPECULATIVE_MAX_AGE_MS) và khung
+# cảnh không đổi (độ lệch trung bình trên ảnh thu nhỏ <= SPECULATIVE_DIFF_THRESH, thang 0-255).
+SPECULATIVE_ENABLED = False
+SPECULATIVE_INTERVAL_MS = 250
+SPECULATIVE_MAX_AGE_MS = 1000
+SPECULATIVE_DIFF_THRESH = 4.0
+
+# --- Xử lý hai độ phân giải ---
+# Khi bật, YOLO vẫn chạy trên frame thu nhỏ nhưng box được quy đổi sang frame gốc của camera
+# để so khớp ORB/homography trên ảnh crop độ phân giải cao (chính xác hơn, chậm hơn vài ms).
+DUAL_RESOLUTION = False
+
+# --- Hàng đợi phát bắn ---
+# Số phát tối đa chờ xử lý; khi đầy: 'drop_newest' bỏ phát mới, 'drop_oldest' bỏ phát cũ nhất.
+# Trigger đến trong vòng SHOT_COALESCE_MS sau trigger trước được coi là trùng lặp và bị gộp.
+SHOT_QUEUE_MAX_DEPTH = 8
+SHOT_QUEUE_DROP_POLICY = "drop_newest"
+SHOT_COALESCE_MS = 150
+
+# --- Xử lý phát bắn đa tiến trình ---
+# Khi bật, mỗi phát bắn được gửi vào một nhóm tiến trình con (mỗi tiến trình có mô hình và tài sản riêng)
+# thay vì một QThread duy nhất; kết quả vẫn trả về GUI đúng thứ tự bóp cò.
+# PROCESS_POOL_SIZE = 0: tự chọn theo số lõi CPU (số lõi - 1, tối đa PROCESS_POOL_MAX).
+# Chế độ nhận dạng trước (speculative) chỉ dùng được với QThread nên bị bỏ qua khi bật.
+PROCESS_POOL_ENABLED = False
+PROCESS_POOL_SIZE = 0
+PROCESS_POOL_MAX = 4
+# Số lần tối đa khởi động lại tiến trình con bị chết (sau khi đã sẵn sàng) trước khi dừng cả nhóm.
+# Tiến trình chết ngay khi đang khởi tạo thì dừng cả nhóm luôn (lỗi sẽ lặp lại).
+PROCESS_POOL_MAX_RESTARTS = 5
+
+# --- Đo đạc hiệu năng (metrics) ---
+# Counter và histogram độ trễ của từng bước (grab, crop/resize, YOLO, ORB, homography, lưu ảnh, DB...)
+# được xuất định kỳ ra file: METRICS_EXPORT_PATH + '.prom' (định dạng Prometheus) hoặc '.json'.
+# Mỗi tiến trình xử lý con ghi file riêng có kèm pid. Chi phí rất nhỏ, có thể để bật khi chạy thật.
+METRICS_ENABLED = True
+METRICS_FORMAT = "prometheus"
+METRICS_EXPORT_PATH = "metrics/metrics"
+METRICS_EXPORT_INTERVAL_S = 10
+
+# --- HUD hiệu năng ---
+# Lớp chữ vẽ đè lên khung camera: FPS xem trước, frame camera rơi/trễ, độ sâu hàng đợi phát bắn,
+# độ trễ trigger -> kết quả của phát gần nhất và backend nhận dạng. Bật/tắt bằng phím HUD_HOTKEY.
+HUD_ENABLED = False
+HUD_HOTKEY = "F3"
+
+# --- Camera ---
+# Một luồng nền đọc frame liên tục vào bộ đệm vòng CAMERA_RING_SIZE ô (cấp phát sẵn), mỗi frame
+# kèm mốc thời gian chụp. Frame đến sau hơn CAMERA_LATE_FACTOR chu kỳ frame được đếm là trễ;
+# đọc lỗi liên tiếp CAMERA_MAX_READ_FAILURES lần thì coi như mất camera.
+CAMERA_RING_SIZE = 8
+CAMERA_LATE_FACTOR = 1.5
+CAMERA_MAX_READ_FAILURES = 30
+# Hồ sơ định dạng chụp: FOURCC, kích thước, FPS và số frame đệm trong driver (CAP_PROP_BUFFERSIZE).
+# MJPG cho phép 720p/1080p ở 30 FPS qua USB 2.0; YUYV (không nén) thường chỉ đạt 5-10 FPS ở 720p.
+# buffersize = 1 để driver không giữ frame cũ (giảm độ trễ). Giá trị None = mặc định của driver.
+# Giá trị driver thật sự chấp nhận được ghi vào log khi mở camera; đo FPS/độ trễ thực tế bằng
+# python -m benchmarks.bench_capture_profiles
+CAPTURE_PROFILES = {
+    'mjpg_720p30': {'fourcc': "MJPG", 'width': 1280, 'height': 720, 'fps': 30, 'buffersize': 1},
+    'mjpg_1080p30': {'fourcc': "MJPG", 'width': 1920, 'height': 1080, 'fps': 30, 'buffersize': 1},
+    'yuyv_720p': {'fourcc': "YUYV", 'width': 1280, 'height': 720, 'fps': None, 'buffersize': 1},
+    'yuyv_480p30': {'fourcc': "YUYV", 'width': 640, 'height': 480, 'fps': 30, 'buffersize': 1},
+    # Như trước đây: chỉ đặt kích thước, còn lại theo driver
+    'driver_default': {'width': 1280, 'height': 720},
+}
+CAPTURE_PROFILE = "mjpg_720p30"
+# Tìm camera: các thiết bị được dò song song, mỗi lần làm mới chờ tối đa CAMERA_PROBE_TIMEOUT_S giây.
+# Ngoài Linux (không có /dev/video*) thử mở các chỉ số 0..CAMERA_MAX_INDEX-1.
+# CAMERA_PREFERRED: một phần tên camera (vd. "Logitech") hoặc định danh thiết bị cần ưu tiên; "" = tự chọn
+# camera USB tháo rời được. Camera đã kết nối thành công luôn được ưu tiên ở lần làm mới sau.
+CAMERA_PROBE_TIMEOUT_S = 2.0
+CAMERA_MAX_INDEX = 10
+CAMERA_PREFERRED = ""
+
+# --- Chọn frame theo thời điểm bóp cò ---
+# Phát bắn được tính trên frame có mốc thời gian gần (thời điểm trigger - TRIGGER_FRAME_OFFSET_MS) nhất.
+# TRIGGER_FRAME_OFFSET_MS là độ lệch độ trễ giữa đường trigger và đường camera của từng máy,
+# đo bằng: python -m benchmarks.calibrate_trigger_offset (xem utils/latency.py).
+# Nếu frame cần tìm chưa tới, chờ thêm tối đa TRIGGER_MAX_WAIT_MS. Bộ đệm camera
+# (CAMERA_RING_SIZE frame) phải đủ dài để còn giữ frame ứng với độ lệch dương lớn nhất.
+TRIGGER_FRAME_OFFSET_MS = 0
+TRIGGER_MAX_WAIT_MS = 100
+
+# --- Lưu ảnh ---
+# Thư mục lưu ảnh mỗi phát bắn, đồng thời là nguồn ảnh hiệu chỉnh cho model INT8
+CAPTURE_DIR = "captured_images"
+
+# --- Hồ sơ bia ---
+# Mỗi loại bia (ảnh gốc, ảnh thay thế, mask, vòng điểm, tên class) khai báo trong file JSON.
+# Khi khởi động, hồ sơ được biên dịch thành cache đóng gói (TARGET_CACHE_PATH.bin + .json)
+# và được memory-map ở những lần sau; cache tự tính lại khi hồ sơ hoặc file ảnh thay đổi.
+TARGET_PROFILES_PATH = "core/target_profiles.json"
+TARGET_CACHE_PATH = "images/cache/targets"
+
+# --- So khớp đặc trưng ---
+# 'bf': so khớp vét cạn (chính xác), 'flann': chỉ mục FLANN-LSH huấn luyện sẵn cho mỗi ảnh bia gốc
+MATCHER = "bf"
+# Các mức tỉ lệ kim tự tháp của ảnh bia gốc; mức được chọn theo kích thước box của crop
+REFERENCE_PYRAMID_SCALES = (1.0, 0.5, 0.25)
+
+# --- Ước lượng homography ---
+# Bộ ước lượng bền vững: 'ransac', 'usac_default', 'usac_fast', 'usac_accurate' hoặc 'magsac' (MAGSAC++).
+# HOMOGRAPHY_MAX_ITERS/HOMOGRAPHY_CONFIDENCE giới hạn số vòng lặp trên các crop xấu.
+HOMOGRAPHY_METHOD = "ransac"
+HOMOGRAPHY_RANSAC_THRESH = 4.0
+HOMOGRAPHY_MAX_ITERS = 2000
+HOMOGRAPHY_CONFIDENCE = 0.995
@@ -3,6 +3,8 @@ import sqlite3
 import logging
 from datetime import datetime
 
+from utils import metrics
+
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
@@ -58,6 +60,7 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Lỗi khi tạo bảng: {e}")
 
+    @metrics.timer('db_add_user_ms')
     def add_user(self, name: str, unit: str = None, position: str = None) -> bool:
         try:
             sql = "INSERT INTO users (name, unit, position) VALUES (?, ?, ?)"
@@ -84,6 +87,7 @@ class DatabaseManager:
     # ======================================================================
     # CHÚ THÍCH: CÁC HÀM MỚI ĐỂ QUẢN LÝ LẦN BẮN VÀ PHÁT BẮN
     # ======================================================================
+    @metrics.timer('db_create_session_ms')
     def create_session(self, user_id: int) -> int | None: # Bỏ tham số target_type
         """Tạo một lần bắn mới và trả về ID của nó."""
         try:
@@ -99,6 +103,7 @@ class DatabaseManager:
             logger.error(f"Lỗi khi tạo Lần bắn: {e}")
             return None
 
+    @metrics.timer('db_end_session_ms')
     def end_session(self, session_id: int):
         """Cập nhật thời gian kết thúc cho một Lần bắn."""
         try:
@@ -110,6 +115,7 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Lỗi khi kết thúc Lần bắn: {e}")
 
+    @metrics.timer('db_add_shot_ms')
     def add_shot(self, session_id: int, score: int, target_name: str, 
                  coords: tuple | None, image_path: str):
         """Lưu thông tin một phát bắn vào database."""
@@ -126,11 +132,13 @@ class DatabaseManager:
             self.cursor.execute(sql, (session_id, timestamp, score, target_name, coord_x, coord_y, image_path))
             self.conn.commit()
         except sqlite3.Error as e:
+            metrics.inc('db_errors')
             logger.error(f"Lỗi khi lưu phát bắn: {e}")
 
     # ======================================================================
     # CHÚ THÍCH: CÁC HÀM MỚI ĐỂ TRUY XUẤT DỮ LIỆU
     # ======================================================================
+    @metrics.timer('db_query_ms')
     def get_sessions_for_user(self, user_id: int) -> list:
         """Lấy tất cả các lần bắn của một người dùng, sắp xếp mới nhất trước tiên."""
         try:
@@ -143,6 +151,7 @@ class DatabaseManager:
             logger.error(f"Lỗi khi lấy danh sách Lần bắn: {e}")
             return []
 
+    @metrics.timer('db_query_ms')
     def get_shots_for_session(self, session_id: int) -> list:
         """Lấy tất cả các phát bắn của một lần bắn cụ thể."""
         try:
@@ -0,0 +1,287 @@
+# core/process_pool.py
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+from core import config
+from core.shot_queue import stamp
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Thời gian chờ mỗi lần đọc hàng đợi kết quả, đồng thời là chu kỳ kiểm tra tiến trình con còn sống
+_POLL_SECONDS = 0.5
+
+def default_pool_size() -> int:
+    """Số tiến trình xử lý theo cấu hình; 0 nghĩa là tự chọn theo số lõi CPU (chừa một lõi cho GUI)."""
+    if config.PROCESS_POOL_SIZE > 0:
+        return config.PROCESS_POOL_SIZE
+    return max(1, min(config.PROCESS_POOL_MAX, (os.cpu_count() or 2) - 1))
+
+def prepare_shared_resources(backend: str) -> str:
+    """
+    Chuẩn bị một lần, trước khi khởi động các tiến trình con, những thứ được ghi ra đĩa:
+    file model export (ONNX/OpenVINO/INT8) và cache tài sản bia đóng gói. Nhờ vậy các tiến trình con
+    chỉ đọc, không cùng lúc export/biên dịch vào cùng một file.
+
+    Returns:
+        Backend các tiến trình con nên dùng ('torch' nếu không export được).
+    """
+    from module.detection_module import resolve_model_path
+    from utils.targets import ensure_target_cache, load_target_profiles
+    try:
+        resolve_model_path(config.DETECTOR_MODEL_PATH, backend, calibration_dir=config.CAPTURE_DIR)
+    except Exception as e:
+        logger.warning(f"ShotProcessPool: Không thể chuẩn bị backend '{backend}': {e}. Dùng backend torch.")
+        backend = "torch"
+    profiles = load_target_profiles(config.TARGET_PROFILES_PATH)
+    ensure_target_cache(profiles, config.TARGET_CACHE_PATH, scales=config.REFERENCE_PYRAMID_SCALES)
+    return backend
+
+def _pool_process_main(tasks, results, backend):
+    """
+    Vòng lặp của một tiến trình con: tự tải mô hình + tài sản một lần (file export và cache
+    đã được tiến trình cha chuẩn bị sẵn), sau đó lần lượt nhận phát bắn từ hàng đợi riêng
+    của nó cho tới khi gặp None.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(processName)s %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    exporter = metrics.start_exporter(
+        config.METRICS_ENABLED, config.METRICS_EXPORT_PATH, config.METRICS_FORMAT, config.METRICS_EXPORT_INTERVAL_S
+    )
+    # Import trong tiến trình con để tiến trình GUI không phải tải mô hình
+    from core.worker import ProcessingWorker
+    worker = ProcessingWorker(backend=backend)
+    pid = os.getpid()
+    errors = []
+    worker.init_failed.connect(errors.append)
+    worker.initialize()
+    if not worker.is_ready:
+        results.put(('failed', None, pid, errors[0] if errors else "không rõ lỗi"))
+        return
+    results.put(('ready', None, pid, {'backend': worker.detector.backend}))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, stamps, args = task
+        stamp(stamps, 'dequeue')
+        try:
+            package = worker.process(*args, stamps=stamps)
+            results.put(('done', seq, pid, package))
+        except Exception as e:
+            logging.getLogger(__name__).exception(f"Lỗi khi xử lý phát bắn #{seq}")
+            results.put(('error', seq, pid, str(e)))
+    if exporter is not None:
+        exporter.stop()
+
+class ShotProcessPool(QObject):
+    """
+    Nhóm tiến trình xử lý phát bắn. Mỗi tiến trình con giữ mô hình nhận dạng và tài sản riêng,
+    nên các phát bắn liên tiếp được xử lý song song và không tranh GIL với GUI.
+    Kết quả được phát qua tín hiệu `finished` đúng thứ tự bóp cò.
+
+    Phát bắn được lấy từ `shot_queue` (core.shot_queue.ShotQueue) chỉ khi có tiến trình rảnh và
+    được giao thẳng vào hàng đợi riêng của tiến trình đó, nên tiến trình cha luôn biết phát nào
+    đang ở tiến trình nào (phát của tiến trình chết đột ngột được bỏ qua, không làm kẹt thứ tự).
+    """
+    finished = Signal(dict)
+    # Cùng ý nghĩa với các tín hiệu khởi tạo của ProcessingWorker, tính trên toàn nhóm tiến trình
+    init_progress = Signal(str, int)
+    ready = Signal(dict)
+    init_failed = Signal(str)
+
+    def __init__(self, shot_queue, size=None, backend=config.DETECTOR_BACKEND, max_restarts=None):
+        super().__init__()
+        self.shot_queue = shot_queue
+        self.size = size or default_pool_size()
+        self.backend = backend
+        self.max_restarts = config.PROCESS_POOL_MAX_RESTARTS if max_restarts is None else max_restarts
+        # 'spawn' an toàn với Qt/OpenCV trên mọi hệ điều hành (fork sau khi Qt khởi tạo dễ bị treo)
+        self._ctx = mp.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._processes = {}  # pid -> (tiến trình, hàng đợi việc riêng)
+        self._ready_pids = set()
+        self._assigned = {}   # pid -> số thứ tự phát bắn đang xử lý
+        self._pending = {}    # seq -> kết quả về sớm, chờ các phát trước
+        self._next_seq = 0    # Số thứ tự gán cho phát bắn kế tiếp
+        self._next_emit = 0   # Số thứ tự phải phát ra tiếp theo
+        self._restarts = 0
+        self._lock = threading.RLock()
+        self._closing = threading.Event()  # Đang tắt hoặc đã lỗi: không khởi động lại tiến trình con nữa
+        self._stopping = threading.Event() # Dừng luồng thu kết quả
+        self._all_ready = threading.Event()
+        self._started_at = time.perf_counter()
+
+        # Export model / biên dịch cache rồi mới khởi động tiến trình con, trên luồng nền để không chặn GUI
+        self._collector = threading.Thread(target=self._run, name="shot-pool-collector", daemon=True)
+        self._collector.start()
+
+    def _run(self):
+        self.init_progress.emit("Đang chuẩn bị mô hình và tài sản bia...", 5)
+        try:
+            self.backend = prepare_shared_resources(self.backend)
+        except Exception as e:
+            logger.exception("ShotProcessPool: Lỗi khi chuẩn bị mô hình/tài sản")
+            self._fail(str(e))
+            return
+        with self._lock:
+            if self._closing.is_set():
+                return
+            for _ in range(self.size):
+                self._spawn()
+        logger.info(f"ShotProcessPool: Khởi động {self.size} tiến trình xử lý (backend '{self.backend}').")
+        self._collect()
+
+    def _spawn(self):
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(target=_pool_process_main, args=(tasks, self._results, self.backend), daemon=True)
+        process.start()
+        self._processes[process.pid] = (process, tasks)
+
+    def _fail(self, message: str):
+        """Dừng hẳn nhóm tiến trình và báo lỗi khởi tạo (chỉ một lần)."""
+        if not self._closing.is_set():
+            self._closing.set()
+            self.init_failed.emit(message)
+
+    def wait_ready(self, timeout=None) -> bool:
+        """Chờ tới khi mọi tiến trình con đã tải xong mô hình và tài sản; trả về False ngay nếu nhóm đã lỗi."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._all_ready.wait(_POLL_SECONDS):
+            if self._closing.is_set() or (deadline is not None and time.monotonic() >= deadline):
+                return False
+        return True
+
+    @Slot()
+    def pump(self):
+        """Giao phát bắn từ ShotQueue cho các tiến trình con đang rảnh."""
+        with self._lock:
+            if self._closing.is_set():
+                return
+            idle = [pid for pid in self._ready_pids if pid not in self._assigned]
+            for pid in idle:
+                shot = self.shot_queue.pop()
+                if shot is None:
+                    break
+                seq = self._next_seq
+                self._next_seq += 1
+                self._assigned[pid] = seq
+                self._processes[pid][1].put((seq, shot.stamps, shot.args()))
+                logger.info(f"ShotProcessPool: Đã gửi phát bắn #{seq} cho tiến trình {pid}.")
+
+    def _collect(self):
+        """Nhận kết quả từ các tiến trình con và phát ra theo thứ tự."""
+        while not self._stopping.is_set():
+            try:
+                message = self._results.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                message = None
+            if message is not None:
+                self._handle(*message)
+            self._check_processes()
+
+    def _handle(self, kind, seq, pid, payload):
+        if kind == 'ready':
+            with self._lock:
+                self._ready_pids.add(pid)
+                ready_count = len(self._ready_pids)
+            logger.info(f"ShotProcessPool: Tiến trình {pid} đã sẵn sàng ({ready_count}/{self.size}).")
+            if not self._all_ready.is_set():
+                self.init_progress.emit(
+                    f"Đã khởi tạo {ready_count}/{self.size} tiến trình xử lý", int(100 * ready_count / self.size)
+                )
+                if ready_count >= self.size:
+                    self._all_ready.set()
+                    init_ms = (time.perf_counter() - self._started_at) * 1000
+                    metrics.observe('worker_init_ms', init_ms)
+                    self.ready.emit({'backend': payload['backend'], 'init_ms': init_ms})
+            # Tiến trình mới sẵn sàng (kể cả tiến trình được khởi động lại) nhận việc đang chờ
+            self.pump()
+        elif kind == 'failed':
+            # Lỗi khởi tạo (thiếu model, thiếu tài sản...) sẽ lặp lại nếu khởi động lại, nên dừng hẳn
+            logger.error(f"ShotProcessPool: Tiến trình {pid} khởi tạo thất bại: {payload}")
+            self._fail(payload)
+        elif kind in ('done', 'error'):
+            if kind == 'done':
+                logger.info(f"ShotProcessPool: Phát bắn #{seq} xong (tiến trình {pid}).")
+            else:
+                logger.error(f"ShotProcessPool: Phát bắn #{seq} lỗi: {payload}")
+            with self._lock:
+                if self._assigned.get(pid) == seq:
+                    del self._assigned[pid]
+            self._deliver(seq, payload if kind == 'done' else None)
+
+    def _check_processes(self):
+        """
+        Xử lý tiến trình con bị chết: phát bắn nó đang giữ được coi là lỗi. Tiến trình chết trước khi
+        sẵn sàng (crash trong plugin, bị OOM killer...) hoặc chết quá max_restarts lần thì dừng cả nhóm
+        và báo init_failed; còn lại thì khởi động tiến trình mới thay thế.
+        """
+        lost, failure = [], None
+        with self._lock:
+            if self._closing.is_set():
+                return
+            for pid, (process, _) in list(self._processes.items()):
+                if process.is_alive():
+                    continue
+                logger.error(f"ShotProcessPool: Tiến trình {pid} đã dừng (mã {process.exitcode}).")
+                del self._processes[pid]
+                # Tiến trình chết đột ngột không tự xóa được file metric của nó
+                metrics.remove_export_file(metrics.export_path(config.METRICS_EXPORT_PATH, config.METRICS_FORMAT, pid))
+                was_ready = pid in self._ready_pids
+                self._ready_pids.discard(pid)
+                seq = self._assigned.pop(pid, None)
+                if seq is not None:
+                    lost.append(seq)
+                if not was_ready:
+                    failure = f"Tiến trình xử lý {pid} bị dừng khi đang khởi tạo (mã {process.exitcode})"
+                elif self._restarts >= self.max_restarts:
+                    failure = f"Tiến trình xử lý bị dừng quá {self.max_restarts} lần"
+                else:
+                    self._restarts += 1
+                    metrics.inc('process_pool_restarts')
+                    logger.warning(f"ShotProcessPool: Khởi động lại tiến trình ({self._restarts}/{self.max_restarts}).")
+                    self._spawn()
+        for seq in lost:
+            self._deliver(seq, None)
+        if failure is not None:
+            logger.error(f"ShotProcessPool: {failure}, dừng nhóm tiến trình.")
+            self._fail(failure)
+
+    def _deliver(self, seq, package):
+        """Giữ lại kết quả về sớm; phát ra liên tiếp khi các phát trước đã xong (None = bỏ qua)."""
+        if seq < self._next_emit or seq in self._pending:
+            return
+        self._pending[seq] = package
+        while self._next_emit in self._pending:
+            package = self._pending.pop(self._next_emit)
+            self._next_emit += 1
+            if package is not None:
+                self.finished.emit(package)
+        self.pump()
+
+    def shutdown(self, timeout: float = 3.0):
+        """Dừng các tiến trình con (chờ tối đa `timeout` giây rồi buộc dừng) và luồng thu kết quả."""
+        with self._lock:
+            self._closing.set()
+            processes = list(self._processes.values())
+        for _, tasks in processes:
+            tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for process, _ in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._stopping.set()
+        self._collector.join(timeout)
+        logger.info("ShotProcessPool: Đã dừng.")
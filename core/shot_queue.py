@@ -0,0 +1,163 @@
+# core/shot_queue.py
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PySide6.QtCore import QObject, Signal
+
+logger = logging.getLogger(__name__)
+
+# Các mốc thời gian của một phát bắn, theo đúng thứ tự xảy ra (time.monotonic, giây).
+# Mỗi mốc là thời điểm bước đó HOÀN THÀNH; phát trượt không có mốc 'match'.
+STAGES = ('trigger', 'grab', 'enqueue', 'dequeue', 'detect', 'match', 'score', 'persist')
+DROP_POLICIES = ('drop_newest', 'drop_oldest')
+
+def stamp(stamps, stage: str):
+    """Ghi mốc thời gian cho một bước nếu đang theo dõi (stamps có thể là None)."""
+    if stamps is not None:
+        stamps[stage] = time.monotonic()
+
+def stage_latencies(stamps: dict) -> dict:
+    """
+    Đổi các mốc thời gian thành độ trễ (ms) của từng bước, tính từ mốc có mặt liền trước.
+
+    Returns:
+        dict {bước: ms} theo thứ tự STAGES, thêm 'total' = từ mốc đầu tới mốc cuối.
+    """
+    latencies, previous, first = {}, None, None
+    for stage in STAGES:
+        if stage not in stamps:
+            continue
+        if previous is None:
+            first = stamps[stage]
+        else:
+            latencies[stage] = (stamps[stage] - previous) * 1000
+        previous = stamps[stage]
+    if first is not None:
+        latencies['total'] = (previous - first) * 1000
+    return latencies
+
+class Shot:
+    """Một phát bắn đang chờ xử lý, kèm các mốc thời gian của nó."""
+    def __init__(self, photo_frame, calibrated_center, image_path, hires_frame=None, stamps=None):
+        self.photo_frame = photo_frame
+        self.calibrated_center = calibrated_center
+        self.image_path = image_path
+        self.hires_frame = hires_frame
+        self.stamps = dict(stamps or {})
+        self.merged = 0 # Số trigger trùng lặp đã gộp vào phát này
+
+    def args(self):
+        """Tham số cho ProcessingWorker.process."""
+        return self.photo_frame, self.calibrated_center, self.image_path, self.hires_frame
+
+class ShotQueue(QObject):
+    """
+    Hàng đợi phát bắn có giới hạn giữa GUI và worker.
+
+    - Trigger đến trong vòng `coalesce_ms` kể từ trigger trước được coi là trùng lặp
+      (nảy phím, bấm đúp) và gộp vào phát trước thay vì tạo phát mới.
+    - Khi hàng đợi đầy `max_depth` phát: 'drop_newest' bỏ phát mới, 'drop_oldest' bỏ phát cũ nhất.
+    - Mỗi phát bắn xong được ghi nhận qua `record` để thống kê độ trễ theo từng bước.
+
+    Tín hiệu `shot_ready` phát ra mỗi khi có phát mới được nhận; bên xử lý gọi `pop`
+    (có thể nhận None nếu phát đó đã bị bỏ).
+    """
+    shot_ready = Signal()
+
+    def __init__(self, max_depth: int = 8, coalesce_ms: float = 150.0, drop_policy: str = 'drop_newest',
+                 history: int = 100):
+        super().__init__()
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Chính sách bỏ phát không hợp lệ: '{drop_policy}'. Chọn một trong {DROP_POLICIES}")
+        self.max_depth = max_depth
+        self.coalesce_ms = coalesce_ms
+        self.drop_policy = drop_policy
+        self._shots = deque()
+        self._lock = threading.Lock()
+        self._last_trigger = None
+        self._last_shot = None
+        self._history = deque(maxlen=history)
+        self.accepted = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_seen_depth = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._shots)
+
+    def accept_trigger(self, trigger_time: float) -> bool:
+        """
+        Kiểm tra trigger trước khi chụp ảnh. Trả về False nếu là trigger trùng lặp
+        (đã gộp vào phát trước), khi đó không cần chụp và xử lý nữa.
+        """
+        with self._lock:
+            last = self._last_trigger
+            if last is not None and (trigger_time - last) * 1000 < self.coalesce_ms:
+                self.coalesced += 1
+                if self._last_shot is not None:
+                    self._last_shot.merged += 1
+                logger.info(f"ShotQueue: Gộp trigger trùng lặp ({(trigger_time - last) * 1000:.0f} ms sau phát trước).")
+                return False
+            self._last_trigger = trigger_time
+            return True
+
+    def push(self, shot: Shot) -> bool:
+        """Đưa phát bắn vào hàng đợi. Trả về False nếu chính phát này bị bỏ do hàng đợi đầy."""
+        stamp(shot.stamps, 'enqueue')
+        with self._lock:
+            if len(self._shots) >= self.max_depth:
+                self.dropped += 1
+                if self.drop_policy == 'drop_newest':
+                    logger.warning(f"ShotQueue: Hàng đợi đầy ({self.max_depth} phát), bỏ phát mới.")
+                    return False
+                old = self._shots.popleft()
+                logger.warning(f"ShotQueue: Hàng đợi đầy ({self.max_depth} phát), bỏ phát cũ nhất ({old.image_path}).")
+            self._shots.append(shot)
+            self._last_shot = shot
+            self.accepted += 1
+            self.max_seen_depth = max(self.max_seen_depth, len(self._shots))
+            depth = len(self._shots)
+        logger.info(f"ShotQueue: Đã nhận phát bắn, độ sâu hàng đợi {depth}/{self.max_depth}.")
+        self.shot_ready.emit()
+        return True
+
+    def pop(self):
+        """Lấy phát bắn cũ nhất, hoặc None nếu hàng đợi rỗng."""
+        with self._lock:
+            return self._shots.popleft() if self._shots else None
+
+    def record(self, stamps: dict) -> dict:
+        """Ghi nhận mốc thời gian của một phát bắn đã xong và in ra độ trễ từng bước."""
+        latencies = stage_latencies(stamps)
+        with self._lock:
+            self._history.append(latencies)
+        details = ", ".join(f"{stage} {ms:.0f}" for stage, ms in latencies.items() if stage != 'total')
+        logger.info(f"ShotQueue: Độ trễ phát bắn {latencies.get('total', 0):.0f} ms ({details}).")
+        return latencies
+
+    def latency_summary(self) -> dict:
+        """
+        Thống kê độ trễ các phát bắn gần đây.
+
+        Returns:
+            dict {bước: {'mean', 'p95', 'count'}} theo ms, cùng các bộ đếm của hàng đợi trong 'queue'.
+        """
+        with self._lock:
+            history = list(self._history)
+            summary = {
+                'queue': {
+                    'depth': len(self._shots), 'max_depth': self.max_seen_depth, 'accepted': self.accepted,
+                    'dropped': self.dropped, 'coalesced': self.coalesced,
+                },
+            }
+        for stage in STAGES[1:] + ('total',):
+            values = [latencies[stage] for latencies in history if stage in latencies]
+            if values:
+                summary[stage] = {
+                    'mean': float(np.mean(values)), 'p95': float(np.percentile(values, 95)), 'count': len(values),
+                }
+        return summary
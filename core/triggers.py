@@ -1,24 +1,29 @@
 # core/triggers.py
 import logging
+import time
 from PySide6.QtCore import QObject, Signal
-from pynput import keyboard
 
 logger = logging.getLogger(__name__)
 
 class BluetoothTrigger(QObject):
-    triggered = Signal()
+    # Mốc thời gian (time.monotonic) lúc nhận được sự kiện phím, trước khi qua hàng đợi sự kiện Qt
+    triggered = Signal(float)
 
-    def __init__(self):
+    def __init__(self, key_name: str = "media_volume_up"):
         super().__init__()
-        self.trigger_key = keyboard.Key.media_volume_up
+        # pynput chỉ được import khi bắt đầu lắng nghe (xem start_listening)
+        self.key_name = key_name
+        self.trigger_key = None
         self.listener = None
         self._is_key_pressed = False
 
     def on_press(self, key):
+        # Lấy mốc thời gian ngay khi vào callback, trước mọi xử lý khác
+        pressed_at = time.monotonic()
         if key == self.trigger_key and not self._is_key_pressed:
             self._is_key_pressed = True
             logger.info(f"Phát hiện tín hiệu trigger từ phím: {key}")
-            self.triggered.emit()
+            self.triggered.emit(pressed_at)
 
     def on_release(self, key):
         if key == self.trigger_key:
@@ -26,6 +31,8 @@ class BluetoothTrigger(QObject):
 
     def start_listening(self):
         if self.listener is None:
+            from pynput import keyboard
+            self.trigger_key = getattr(keyboard.Key, self.key_name)
             self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
             self.listener.start()
             logger.info(f"Bắt đầu lắng nghe tín hiệu trigger từ phím: {self.trigger_key}...")
@@ -3,35 +3,82 @@ import logging
 import cv2
 import numpy as np
 import os
+import time
 from datetime import datetime
 from PySide6.QtCore import QObject, Signal, Slot
 
+from core import config
 from module.detection_module import ObjectDetector
-from utils.processing import check_object_center
-from utils.handles import handle_hit_bia_so_4, handle_hit_bia_so_7, handle_hit_bia_so_8, handle_miss
+from utils.processing import (
+    check_object_center, aim_point, box_contains, frame_signature, signature_difference, map_hit_to_hires
+)
+from utils.handles import handle_hit, handle_miss
+from utils.targets import load_target_profiles, class_aliases, compile_target_assets
+from core.shot_queue import stamp
+from utils import metrics, startup_profile
 
 logger = logging.getLogger(__name__)
 
 class ProcessingWorker(QObject):
     finished = Signal(dict)
+    speculative_ready = Signal()
+    # Tiến trình khởi tạo: (mô tả bước, phần trăm)
+    init_progress = Signal(str, int)
+    # Đã sẵn sàng xử lý: {'backend', 'init_ms'}
+    ready = Signal(dict)
+    init_failed = Signal(str)
 
-    def __init__(self):
+    def __init__(self, backend=config.DETECTOR_BACKEND, shot_queue=None):
+        """
+        Chỉ lưu cấu hình, không tải gì cả: việc tải mô hình, tài sản và warm-up nằm trong
+        `initialize`, được gọi trên luồng/tiến trình của worker để không chặn GUI.
+        """
         super().__init__()
-        self.detector = ObjectDetector(model_path="my_modelv8s.pt")
-        self.assets = self._load_assets()
-        
-        # --- THAY ĐỔI: Ánh xạ chính xác 3 object class của bạn ---
-        # Key: Tên class mà model nhận diện được.
-        # Value: (Hàm xử lý tương ứng, Tên tài sản (asset) để sử dụng).
-        self.hit_handlers = {
-            'bia_so_4': (handle_hit_bia_so_4, 'bia_so_4'),
-            'bia_so_7_8': (handle_hit_bia_so_7, 'bia_so_7'), # Khi phát hiện 'bia_so_7_8' -> dùng handler và asset của bia 7
-            'bia_so_8': (handle_hit_bia_so_8, 'bia_so_8'),
+        self.backend = backend
+        # Hàng đợi phát bắn (core.shot_queue.ShotQueue) mà slot process_queued lấy việc từ đó
+        self.shot_queue = shot_queue
+        self.detector = None
+        self.profiles = {}
+        self.assets = {}
+        self.class_to_target = {}
+        self.is_ready = False
+        # Kết quả nhận dạng gần nhất trên frame xem trước (chế độ speculative)
+        self._speculative = None
+        # Thông số bộ ước lượng homography truyền cho các handler
+        self.estimator = {
+            'method': config.HOMOGRAPHY_METHOD,
+            'ransac_thresh': config.HOMOGRAPHY_RANSAC_THRESH,
+            'max_iters': config.HOMOGRAPHY_MAX_ITERS,
+            'confidence': config.HOMOGRAPHY_CONFIDENCE,
         }
-        # ----------------------------------------------------------
 
-        logger.info("Worker: Đã khởi tạo, tải xong mô hình và tài sản.")
+    @Slot()
+    def initialize(self):
+        """Tải mô hình, tài sản bia và warm-up; báo tiến độ qua init_progress và kết thúc bằng ready/init_failed."""
+        start = time.perf_counter()
+        try:
+            self.init_progress.emit("Đang tải mô hình nhận dạng...", 10)
+            self.detector = ObjectDetector(
+                model_path=config.DETECTOR_MODEL_PATH,
+                backend=self.backend,
+                calibration_dir=config.CAPTURE_DIR,
+            )
+            logger.info(f"Worker: Sử dụng backend nhận dạng '{self.detector.backend}'.")
+            startup_profile.mark("worker: tải xong mô hình")
+
+            self.init_progress.emit("Đang tải tài sản bia...", 50)
+            self.profiles = load_target_profiles(config.TARGET_PROFILES_PATH)
+            self.assets = self._load_assets()
+            # Tên class mà model nhận diện được -> key hồ sơ bia (khai báo qua 'aliases' trong hồ sơ)
+            self.class_to_target = class_aliases(self.profiles)
+            startup_profile.mark("worker: tải xong tài sản bia")
+        except Exception as e:
+            logger.exception("Worker: Lỗi khi khởi tạo mô hình/tài sản")
+            self.init_failed.emit(str(e))
+            return
+
         # --- THÊM VÀO: LOGIC "LÀM NÓNG" MODEL ---
+        self.init_progress.emit("Đang warm-up mô hình...", 80)
         logger.info("Worker: Thực hiện warm-up cho mô hình YOLO...")
         try:
             # Tạo một ảnh giả (đen) với kích thước tiêu chuẩn
@@ -39,63 +86,133 @@ class ProcessingWorker(QObject):
             # Chạy nhận diện một lần để buộc model khởi tạo hoàn toàn
             self.detector.detect(dummy_image)
             logger.info("Worker: Warm-up hoàn tất.")
+            startup_profile.mark("worker: warm-up xong")
         except Exception as e:
             logger.error(f"Worker: Lỗi trong quá trình warm-up: {e}")
         # ------------------------------------------
 
-        logger.info("Worker: Đã khởi tạo, tải xong mô hình và tài sản.")
+        init_ms = (time.perf_counter() - start) * 1000
+        metrics.observe('worker_init_ms', init_ms)
+        self.is_ready = True
+        logger.info(f"Worker: Đã khởi tạo, tải xong mô hình và tài sản ({init_ms:.0f} ms).")
+        self.init_progress.emit("Sẵn sàng", 100)
+        self.ready.emit({'backend': self.detector.backend, 'init_ms': init_ms})
 
     def _load_assets(self):
-        base_dir = "images"
-        assets = {}
-        target_names = ['bia_so_4', 'bia_so_7', 'bia_so_8']
-        
-        for name in target_names:
-            img_path = os.path.join(base_dir, "original", f"{name}.png")
-            img_alt_path = os.path.join(base_dir, "original", f"{name}_1.png")
-            mask_path = os.path.join(base_dir, "mask", f"mask_{name}.png")
-            
-            img = cv2.imread(img_path)
-            mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-
-            if img is not None and mask is not None:
-                # THAY ĐỔI: Sử dụng key đã được chuẩn hóa
-                assets[name] = {
-                    'original_img': img,
-                    'original_img_alt': cv2.imread(img_alt_path),
-                    'mask': mask
-                }
-            else:
-                logger.error(f"LỖI: Không tìm thấy file tài sản cho '{name}'")
+        """
+        Biên dịch các hồ sơ bia thành bộ tài sản. Ảnh, mask, ảnh điểm và đặc trưng ORB
+        được đóng gói vào một file cache và chỉ cần memory-map ở những lần khởi động sau.
+        """
+        start = time.perf_counter()
+        assets = compile_target_assets(
+            self.profiles,
+            config.TARGET_CACHE_PATH,
+            matcher_kind=config.MATCHER,
+            scales=config.REFERENCE_PYRAMID_SCALES,
+        )
+        logger.info(f"Worker: Tải tài sản {len(assets)} bia trong {(time.perf_counter() - start) * 1000:.0f} ms.")
         return assets
 
-    @Slot(np.ndarray, object, str)
-    def process_image(self, photo_frame, calibrated_center, image_path):
-        detections = self.detector.detect(image=photo_frame, conf=0.75)
+    def _run_detection(self, frame, calibrated_center):
+        """
+        Nhận dạng mục tiêu trên frame. Ở chế độ ROI chỉ chạy quanh tâm ngắm và
+        quay về chạy toàn frame khi không có mục tiêu nguyên vẹn chứa tâm ngắm.
+        """
+        if config.ROI_ENABLED:
+            center = aim_point(frame, calibrated_center)
+            with metrics.timer('yolo_detect_roi_ms'):
+                detections = self.detector.detect_roi(
+                    frame, center, margin=config.ROI_MARGIN, conf=config.DETECTOR_CONF, imgsz=config.ROI_IMGSZ
+                )
+            detections = [det for det in detections if not det['clipped']]
+            if any(box_contains(det['box'], center) for det in detections):
+                return detections
+            metrics.inc('roi_fallbacks')
+            logger.info("Worker: ROI không có mục tiêu chứa tâm ngắm, chạy lại trên toàn frame.")
+        with metrics.timer('yolo_detect_ms'):
+            return self.detector.detect(image=frame, conf=config.DETECTOR_CONF)
+
+    @Slot(np.ndarray, object, float)
+    def prefetch_detections(self, preview_frame, calibrated_center, timestamp):
+        """
+        Chạy nhận dạng nền trên frame xem trước và lưu lại kèm thời điểm chụp frame,
+        để lúc bóp cò có thể bỏ qua bước YOLO nếu khung cảnh không đổi.
+        """
+        try:
+            detections = self._run_detection(preview_frame, calibrated_center)
+            self._speculative = {
+                'timestamp': timestamp,
+                'center': calibrated_center,
+                'signature': frame_signature(preview_frame),
+                'detections': detections,
+            }
+        except Exception as e:
+            logger.error(f"Worker: Lỗi khi nhận dạng trước trên frame xem trước: {e}")
+        finally:
+            self.speculative_ready.emit()
+
+    def _reuse_speculative(self, frame, calibrated_center):
+        """Trả về detection đã tính sẵn nếu còn dùng được cho frame này, ngược lại None."""
+        spec = self._speculative
+        if not config.SPECULATIVE_ENABLED or spec is None or spec['center'] != calibrated_center:
+            return None
+
+        age_ms = (time.monotonic() - spec['timestamp']) * 1000
+        if age_ms > config.SPECULATIVE_MAX_AGE_MS:
+            return None
+
+        diff = signature_difference(frame_signature(frame), spec['signature'])
+        if diff > config.SPECULATIVE_DIFF_THRESH:
+            logger.info(f"Worker: Khung cảnh đã thay đổi (lệch {diff:.1f}), nhận dạng lại.")
+            return None
+
+        metrics.inc('speculative_reuses')
+        logger.info(f"Worker: Dùng lại kết quả nhận dạng trước ({age_ms:.0f} ms, lệch {diff:.1f}).")
+        # Trả về bản sao để các bước sau không sửa vào kết quả đang lưu
+        return [dict(det) for det in spec['detections']]
+
+    @metrics.timer('shot_process_ms')
+    def process(self, photo_frame, calibrated_center, image_path, hires_frame=None, stamps=None):
+        """
+        Xử lý trọn vẹn một phát bắn và trả về gói kết quả.
+
+        Args:
+            photo_frame: Frame đã thu nhỏ, dùng để nhận dạng và hiển thị.
+            calibrated_center: Tâm ngắm trên photo_frame (hoặc None).
+            image_path: Đường dẫn ảnh đã lưu của phát bắn.
+            hires_frame: Cùng vùng nhìn với photo_frame nhưng ở độ phân giải gốc của camera.
+                Nếu có, bước so khớp ORB dùng ảnh crop cắt từ frame này.
+            stamps: dict mốc thời gian của phát bắn (xem core.shot_queue); các mốc
+                'detect', 'match', 'score' được ghi vào đây và trả về trong gói kết quả.
+        """
+        detections = self._reuse_speculative(photo_frame, calibrated_center)
+        if detections is None:
+            detections = self._run_detection(photo_frame, calibrated_center)
+        stamp(stamps, 'detect')
         status, hit_info = check_object_center(detections, photo_frame, calibrated_center)
 
         result_data = None
         if status == "TRÚNG":
             detected_name = hit_info.get('name')
+            if hires_frame is not None:
+                hit_info = map_hit_to_hires(hit_info, photo_frame.shape, hires_frame)
             
-            # --- THAY ĐỔI: Dùng tra cứu trực tiếp thay vì vòng lặp ---
-            # Logic này nhanh và chính xác hơn.
-            handler_info = self.hit_handlers.get(detected_name)
-            # ------------------------------------------------------
-
-            if handler_info:
-                handler_func, asset_key = handler_info
-                asset_bundle = self.assets[asset_key]
-                result_data = handler_func(
+            asset_key = self.class_to_target.get(detected_name)
+            if asset_key in self.assets:
+                result_data = handle_hit(
                     hit_info=hit_info,
                     original_frame=photo_frame,
-                    **asset_bundle
+                    estimator=self.estimator,
+                    stamps=stamps,
+                    **self.assets[asset_key]
                 )
             else:
-                logger.warning(f"Bắn trúng '{detected_name}' nhưng không có handler được định nghĩa.")
+                logger.warning(f"Bắn trúng '{detected_name}' nhưng không có hồ sơ bia tương ứng.")
                 result_data = handle_miss(hit_info, photo_frame)
         else:
             result_data = handle_miss(hit_info, photo_frame)
+        stamp(stamps, 'score')
+        metrics.inc('shots_hit' if status == "TRÚNG" else 'shots_miss')
 
         # Đóng gói lại kết quả cuối cùng
         final_package = {
@@ -104,8 +221,19 @@ class ProcessingWorker(QObject):
             'score': result_data.get('score'),
             'result_frame': result_data.get('image'),
             'coords': result_data.get('coords'), # Key mới
-            'image_path': image_path             # Key mới
+            'image_path': image_path,            # Key mới
+            'match_source': result_data.get('match_source'),
+            'stamps': stamps,
         }
-        
+        return final_package
+
+    @Slot()
+    def process_queued(self):
+        """Lấy phát bắn kế tiếp từ hàng đợi, xử lý và gửi kết quả về GUI."""
+        shot = self.shot_queue.pop() if self.shot_queue is not None else None
+        if shot is None:
+            return
+        stamp(shot.stamps, 'dequeue')
+        final_package = self.process(*shot.args(), stamps=shot.stamps)
         self.finished.emit(final_package)
-        logger.info(f"Worker: Đã xử lý xong. Kết quả: {final_package['target_name']} - {final_package['score']} điểm.")
\ No newline at end of file
+        logger.info(f"Worker: Đã xử lý xong. Kết quả: {final_package['target_name']} - {final_package['score']} điểm.")
@@ -1,6 +1,7 @@
 # gui/gui.py
 import cv2
 import base64
+import numpy as np
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSlider, QFrame, QSizePolicy,
     QGraphicsDropShadowEffect, QGroupBox, QComboBox
@@ -28,6 +29,8 @@ class VideoLabel(QLabel):
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
         self.setAlignment(Qt.AlignCenter)
         self._is_calibrating = False
+        # Các dòng chữ của HUD hiệu năng, vẽ đè lên ảnh trong paintEvent (rỗng = ẩn)
+        self._overlay_lines = []
 
     # ... (Các hàm còn lại của VideoLabel giữ nguyên) ...
     def set_calibration_mode(self, active: bool):
@@ -54,6 +57,27 @@ class VideoLabel(QLabel):
         self._pixmap = pixmap
         self.update()
 
+    def set_overlay(self, lines):
+        """Đặt nội dung HUD. Chỉ lưu lại danh sách chữ, việc vẽ diễn ra trong paintEvent."""
+        if lines != self._overlay_lines:
+            self._overlay_lines = list(lines)
+            self.update()
+
+    def _draw_overlay(self, painter: QPainter, x: int, y: int):
+        """Vẽ HUD ở góc trên bên trái vùng ảnh: nền tối bán trong suốt, chữ đơn cách."""
+        font = QFont("Consolas", 10)
+        font.setStyleHint(QFont.Monospace)
+        painter.setFont(font)
+        metrics = painter.fontMetrics()
+        padding = 6
+        line_height = metrics.height()
+        width = max(metrics.horizontalAdvance(line) for line in self._overlay_lines) + 2 * padding
+        height = line_height * len(self._overlay_lines) + 2 * padding
+        painter.fillRect(x + 8, y + 8, width, height, QColor(0, 0, 0, 160))
+        painter.setPen(QColor(120, 255, 120))
+        for i, line in enumerate(self._overlay_lines):
+            painter.drawText(x + 8 + padding, y + 8 + padding + metrics.ascent() + i * line_height, line)
+
     def paintEvent(self, event):
         if self._pixmap.isNull():
             super().paintEvent(event)
@@ -64,6 +88,8 @@ class VideoLabel(QLabel):
         y = (self.height() - scaled_pixmap.height()) / 2
         painter = QPainter(self)
         painter.drawPixmap(QPoint(int(x), int(y)), scaled_pixmap)
+        if self._overlay_lines:
+            self._draw_overlay(painter, int(x), int(y))
 class MainGui(QWidget):
     def __init__(self):
         super().__init__()
@@ -234,15 +260,17 @@ class MainGui(QWidget):
     
     def _convert_cv_to_pixmap(self, cv_img) -> QPixmap:
         if cv_img is None: return QPixmap()
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
+        # Dựng QImage trực tiếp trên dữ liệu BGR (không chuyển sang RGB), QPixmap.fromImage tự sao chép
+        bgr_image = np.ascontiguousarray(cv_img)
+        h, w, ch = bgr_image.shape
         bytes_per_line = ch * w
-        qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
+        qt_image = QImage(bgr_image.data, w, h, bytes_per_line, QImage.Format_BGR888)
         return QPixmap.fromImage(qt_image)
 
     def display_frame(self, frame_bgr):
         if frame_bgr is None: return
-        self.current_frame = frame_bgr.copy()
+        # Frame hiển thị không bị sửa sau khi gọi hàm này nên giữ tham chiếu, không cần sao chép
+        self.current_frame = frame_bgr
         pixmap = self._convert_cv_to_pixmap(frame_bgr)
         self.camera_view_label.setPixmap(pixmap)
 
@@ -11,7 +11,9 @@ from PySide6.QtCore import Qt, QSize
 from PySide6.QtGui import QPixmap, QImage, QFont, QIcon
 from datetime import datetime
 
+from core import config
 from gui.gui import VideoLabel
+from utils.targets import load_target_profiles
 logger = logging.getLogger(__name__)
 # ======================================================================
 # LỚP WIDGET TÙY CHỈNH CHO ITEM TRONG DANH SÁCH
@@ -148,9 +150,8 @@ class StatisticsWindow(QDialog):
         """)
 
         self.target_info = {
-            'Bia số 4': {'path': 'images/original/bia_so_4.png'},
-            'Bia số 7': {'path': 'images/original/bia_so_7.png'},
-            'Bia số 8': {'path': 'images/original/bia_so_8.png'},
+            profile['label']: {'path': profile['image']}
+            for profile in load_target_profiles(config.TARGET_PROFILES_PATH).values()
         }
 
         # --- Layout chính ---
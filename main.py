@@ -1,8 +1,10 @@
 # main.py
+import argparse
 import sys
+import time
 import logging
-from PySide6.QtWidgets import QApplication
-from main_window import MainWindow
+import multiprocessing
+from utils import startup_profile
 
 def setup_logging():
     logging.basicConfig(
@@ -11,17 +13,53 @@ def setup_logging():
         datefmt="%Y-%m-%d %H:%M:%S",
     )
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Phần mềm kiểm tra đường ngắm súng tiểu liên STV")
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="Đo và in thời gian import từng module và các mốc khởi tạo",
+    )
+    # Các tham số còn lại (nếu có) để dành cho Qt
+    args, qt_args = parser.parse_known_args()
+    return args, [sys.argv[0]] + qt_args
+
 def main():
+    started_at = time.monotonic()
+    args, qt_args = parse_args()
+    if args.profile_startup:
+        startup_profile.enable(started_at)
     setup_logging()
-    app = QApplication(sys.argv)
+
+    # Import ở đây (sau khi bật đo khởi động) thay vì đầu file, để đo được và để tiến trình con
+    # của nhóm tiến trình (spawn import lại file này) không phải tải Qt/giao diện.
+    from PySide6.QtWidgets import QApplication
+    from core import config
+    from utils import metrics
+    from main_window import MainWindow
+    startup_profile.mark("import xong")
+
+    exporter = metrics.start_exporter(
+        config.METRICS_ENABLED, config.METRICS_EXPORT_PATH, config.METRICS_FORMAT, config.METRICS_EXPORT_INTERVAL_S
+    )
+    app = QApplication(qt_args)
+    startup_profile.mark("tạo QApplication")
     try:
-        window = MainWindow()
+        window = MainWindow(started_at=started_at)
+        startup_profile.mark("tạo cửa sổ chính")
         window.showMaximized()
+        startup_profile.mark("cửa sổ chính hiển thị")
+        logging.info(f"Khởi động: cửa sổ chính hiển thị sau {(time.monotonic() - started_at) * 1000:.0f} ms.")
         exit_code = app.exec()
+        # Trường hợp thoát trước khi worker sẵn sàng
+        startup_profile.report()
+        if exporter is not None:
+            exporter.stop()
         sys.exit(exit_code)
     except Exception:
         logging.exception("Ứng dụng bị lỗi không mong đợi")
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Cần cho nhóm tiến trình xử lý khi đóng gói thành file thực thi trên Windows
+    multiprocessing.freeze_support()
     main()
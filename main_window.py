@@ -1,31 +1,44 @@
 # main_window.py
 import os
+import time
 import logging
 import cv2
 import numpy as np
 from PySide6.QtWidgets import QApplication, QMainWindow, QMessageBox
 from PySide6.QtCore import QTimer, QObject, Signal, QPoint, QThread, Slot
-from PySide6.QtGui import QScreen
+from PySide6.QtGui import QScreen, QShortcut, QKeySequence
 from datetime import datetime
 
 # THAY ĐỔI: Import từ các file mới
 from gui.gui import MainGui
 from utils.audio import AudioManager
-from utils.camera import Camera, find_available_cameras
+from utils.camera import Camera, CameraRegistry
 from core.triggers import BluetoothTrigger
 from core.worker import ProcessingWorker
+from core.process_pool import ShotProcessPool
+from core.shot_queue import Shot, ShotQueue, stamp
 from core.database import DatabaseManager
+from core import config
 from gui.user_dialog import UserDialog
 from gui.statistics_window import StatisticsWindow
+from utils.processing import crop_to_aspect
+from utils.latency import target_frame_time
+from utils import metrics, startup_profile
 
 logger = logging.getLogger(__name__)
 
 class MainWindow(QMainWindow):
-    # Tín hiệu để gửi việc cho Worker
-    request_processing = Signal(np.ndarray, object, str)
+    # Tín hiệu để gửi việc cho Worker (phát bắn đi qua ShotQueue)
+    request_prefetch = Signal(np.ndarray, object, float)
 
-    def __init__(self):
+    def __init__(self, started_at=None):
         super().__init__()
+        # Mốc khởi động ứng dụng (time.monotonic) để đo thời gian tới frame đầu tiên / worker sẵn sàng
+        self._started_at = started_at if started_at is not None else time.monotonic()
+        self._first_frame_shown = False
+        # Phát bắn chỉ được nhận sau khi worker đã tải xong mô hình và tài sản
+        self._worker_ready = False
+        self._detector_backend = None
         self.setWindowTitle("Phần Mềm Kiểm Tra Đường Ngắm Súng Tiểu Liên STV")
         screen = QScreen.availableGeometry(QApplication.primaryScreen())
         self.setGeometry(screen)
@@ -35,26 +48,65 @@ class MainWindow(QMainWindow):
         self.gui = MainGui()
         self.setCentralWidget(self.gui)
         self.cam = None
+        # Danh sách camera lưu giữa các lần làm mới, theo định danh ổn định của thiết bị
+        self.camera_registry = CameraRegistry(
+            probe_timeout=config.CAMERA_PROBE_TIMEOUT_S, max_index=config.CAMERA_MAX_INDEX
+        )
         self.final_size = (480, 640)
         self.zoom_level = 1.0
         self.calibrated_center = None
+        # Trạng thái nhận dạng trước trên frame xem trước
+        self._last_prefetch_time = 0.0
+        self._prefetch_pending = False
+        # Số liệu cho HUD hiệu năng
+        self._hud_visible = config.HUD_ENABLED
+        self._preview_fps = 0.0
+        self._last_frame_time = None
+        self._last_frame_seq = -1
+        self._skipped_frames = 0 # Frame camera đã chụp nhưng xem trước không kịp hiển thị
+        self._last_shot_latency_ms = None
         
         # --- Các Module phụ trợ ---
-        self.audio_manager = AudioManager()
+        # Âm thanh (pygame) và trigger (pynput) được tải sau khi cửa sổ đã hiện, xem _start_background_init
+        self.audio_manager = AudioManager(load=False)
         self.video_timer = QTimer(self)
         self.bt_trigger = BluetoothTrigger()
         
         self.db_manager = DatabaseManager()
 
         # --- Thiết lập Worker bền bỉ ---
+        # Chế độ đa tiến trình: nhóm tiến trình con xử lý song song, kết quả về đúng thứ tự bóp cò.
+        # Mặc định: một worker trên QThread riêng.
+        # Phát bắn chờ xử lý nằm trong ShotQueue (có giới hạn, gộp trigger trùng lặp).
+        self.shot_queue = ShotQueue(
+            max_depth=config.SHOT_QUEUE_MAX_DEPTH,
+            coalesce_ms=config.SHOT_COALESCE_MS,
+            drop_policy=config.SHOT_QUEUE_DROP_POLICY,
+        )
         self.processing_thread = QThread()
-        self.worker = ProcessingWorker()
-        self.worker.moveToThread(self.processing_thread)
+        self.worker = None
+        self.shot_pool = None
+        if config.PROCESS_POOL_ENABLED:
+            self.shot_pool = ShotProcessPool(self.shot_queue)
+            self.shot_queue.shot_ready.connect(self.shot_pool.pump)
+            self.shot_pool.finished.connect(self.on_processing_finished)
+            processor = self.shot_pool
+        else:
+            self.worker = ProcessingWorker(shot_queue=self.shot_queue)
+            self.worker.moveToThread(self.processing_thread)
+            self.shot_queue.shot_ready.connect(self.worker.process_queued)
+            self.worker.finished.connect(self.on_processing_finished)
+            self.request_prefetch.connect(self.worker.prefetch_detections)
+            self.worker.speculative_ready.connect(self.on_prefetch_finished)
+            self.processing_thread.finished.connect(self.worker.deleteLater)
+            # Mô hình và tài sản được tải trên luồng của worker, không chặn việc tạo cửa sổ
+            self.processing_thread.started.connect(self.worker.initialize)
+            processor = self.worker
+        processor.init_progress.connect(self.on_worker_progress)
+        processor.ready.connect(self.on_worker_ready)
+        processor.init_failed.connect(self.on_worker_failed)
 
         # --- Kết nối Tín hiệu (Signals) & Tác vụ (Slots) ---
-        self.request_processing.connect(self.worker.process_image)
-        self.worker.finished.connect(self.on_processing_finished)
-        self.processing_thread.finished.connect(self.worker.deleteLater)
         self.video_timer.timeout.connect(self.update_frame)
         self.bt_trigger.triggered.connect(self.capture_photo)
         self.gui.calibrate_button.clicked.connect(self.toggle_calibration_mode)
@@ -65,10 +117,13 @@ class MainWindow(QMainWindow):
         self.gui.manage_users_button.clicked.connect(self.manage_users)
         self.gui.session_button.clicked.connect(self.toggle_session)
         self.gui.stats_button.clicked.connect(self.open_statistics_window)
+        self.hud_shortcut = QShortcut(QKeySequence(config.HUD_HOTKEY), self)
+        self.hud_shortcut.activated.connect(self.toggle_hud)
         
         # --- Khởi động ---
-        self.processing_thread.start()
-        self.bt_trigger.start_listening()
+        # Trigger chỉ bắt đầu lắng nghe khi worker sẵn sàng (xem on_worker_ready)
+        QTimer.singleShot(0, self._start_background_init)
+        self.statusBar().showMessage("Đang khởi tạo bộ xử lý...")
         self.refresh_camera_connection()
         
         # Tải danh sách người dùng lên giao diện
@@ -77,12 +132,53 @@ class MainWindow(QMainWindow):
         # ======================================================================
         # CHÚ THÍCH: THÊM VÀO LOGIC TẠO THƯ MỤC LƯU ẢNH
         # ======================================================================
-        self.save_dir = "captured_images"
+        self.save_dir = config.CAPTURE_DIR
         if not os.path.exists(self.save_dir):
             os.makedirs(self.save_dir)
             logger.info(f"Đã tạo thư mục lưu ảnh training: {self.save_dir}")
         # ======================================================================
 
+    @Slot()
+    def _start_background_init(self):
+        """
+        Chạy khi vòng lặp sự kiện đã bắt đầu (cửa sổ đã được vẽ): khởi động luồng worker
+        (tải ultralytics/torch, mô hình, tài sản) và tải âm thanh trên luồng nền.
+        """
+        self.processing_thread.start()
+        self.audio_manager.load_in_background()
+        startup_profile.mark("bắt đầu khởi tạo nền")
+
+    def _elapsed_since_start_ms(self) -> float:
+        return (time.monotonic() - self._started_at) * 1000
+
+    @Slot(str, int)
+    def on_worker_progress(self, message, percent):
+        self.statusBar().showMessage(f"{message} ({percent}%)")
+
+    @Slot(dict)
+    def on_worker_ready(self, info):
+        """Worker đã tải xong: bật nhận trigger và ghi lại thời gian khởi động."""
+        self._worker_ready = True
+        self._detector_backend = info.get('backend')
+        self.bt_trigger.start_listening()
+        ready_ms = self._elapsed_since_start_ms()
+        metrics.observe('startup_worker_ready_ms', ready_ms)
+        startup_profile.mark("bộ xử lý sẵn sàng")
+        startup_profile.report()
+        logger.info(
+            f"Khởi động: bộ xử lý sẵn sàng sau {ready_ms:.0f} ms "
+            f"(khởi tạo {info.get('init_ms', 0):.0f} ms, backend '{self._detector_backend}')."
+        )
+        self.statusBar().showMessage(f"Sẵn sàng (backend {self._detector_backend})", 5000)
+
+    @Slot(str)
+    def on_worker_failed(self, message):
+        logger.error(f"Khởi tạo bộ xử lý thất bại: {message}")
+        startup_profile.mark("bộ xử lý khởi tạo thất bại")
+        startup_profile.report()
+        self.statusBar().showMessage("Khởi tạo bộ xử lý thất bại")
+        QMessageBox.critical(self, "Lỗi", f"Không thể khởi tạo bộ xử lý ảnh:\n{message}")
+
     # THÊM CÁC HÀM MỚI NÀY VÀO LỚP MainWindow
     def open_statistics_window(self):
         """Mở cửa sổ thống kê cho người dùng đang được chọn."""
@@ -169,14 +265,23 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Lỗi", f"Người bắn '{name}' đã tồn tại.")
 
     def update_frame(self):
-        if not (self.cam and self.cam.is_opened()): return
-        frame = self.cam.grab()
-        if frame is None:
+        if not self.cam: return
+        if not self.cam.is_opened():
+            metrics.inc('frame_grab_failures')
             self.disconnect_camera()
             return
+        # Đọc frame mới nhất từ bộ đệm vòng của luồng chụp, không chờ camera.
+        # Frame này không được copy: chỉ dùng để tạo ảnh xem trước ngay trong hàm này.
+        latest = self.cam.latest()
+        if latest is None or latest[0] == self._last_frame_seq:
+            return
+        seq, _, frame = latest
+        metrics.inc('frames')
+        self._update_preview_stats(seq)
         
-        processed_frame = self.crop_and_resize_frame(frame)
-        self.gui.current_frame = processed_frame.copy()
+        with metrics.timer('frame_crop_resize_ms'):
+            processed_frame = self.crop_and_resize_frame(frame)
+        self.maybe_request_prefetch(processed_frame)
         
         zoomed_frame = self.apply_digital_zoom(processed_frame, self.zoom_level)
         
@@ -205,26 +310,131 @@ class MainWindow(QMainWindow):
         if point_to_draw:
             cv2.drawMarker(zoomed_frame, point_to_draw, (0, 0, 255), cv2.MARKER_CROSS, 40, 2)
 
+        if self._hud_visible:
+            self.gui.camera_view_label.set_overlay(self._hud_lines())
         self.gui.display_frame(zoomed_frame)
+
+        if not self._first_frame_shown:
+            self._first_frame_shown = True
+            first_frame_ms = self._elapsed_since_start_ms()
+            metrics.observe('startup_first_frame_ms', first_frame_ms)
+            startup_profile.mark("frame camera đầu tiên")
+            logger.info(f"Khởi động: frame camera đầu tiên hiển thị sau {first_frame_ms:.0f} ms.")
+
+    def _update_preview_stats(self, seq):
+        """Cập nhật FPS xem trước (trung bình trượt) và số frame camera mà xem trước đã bỏ qua."""
+        now = time.monotonic()
+        if self._last_frame_time is not None:
+            interval = now - self._last_frame_time
+            if interval > 0:
+                fps = 1.0 / interval
+                self._preview_fps = fps if self._preview_fps == 0 else 0.9 * self._preview_fps + 0.1 * fps
+            skipped = seq - self._last_frame_seq - 1
+            if skipped > 0:
+                self._skipped_frames += skipped
+                metrics.inc('preview_frames_skipped', skipped)
+        self._last_frame_time = now
+        self._last_frame_seq = seq
+
+    def _hud_lines(self):
+        """Nội dung HUD: FPS, frame rơi/trễ, độ sâu hàng đợi, độ trễ phát bắn gần nhất và backend."""
+        backend = self._detector_backend or "đang tải..."
+        latency = f"{self._last_shot_latency_ms:.0f} ms" if self._last_shot_latency_ms is not None else "--"
+        cam = self.cam.stats() if self.cam else {'dropped': 0, 'late': 0}
+        return [
+            f"FPS xem trước : {self._preview_fps:5.1f}",
+            f"Frame rơi/trễ : {cam['dropped']}/{cam['late']} (bỏ qua {self._skipped_frames})",
+            f"Hàng đợi      : {len(self.shot_queue)}/{self.shot_queue.max_depth}",
+            f"Trigger->KQ   : {latency}",
+            f"Backend       : {backend}",
+        ]
+
+    @Slot()
+    def toggle_hud(self):
+        """Bật/tắt HUD hiệu năng trên khung camera (phím tắt HUD_HOTKEY)."""
+        self._hud_visible = not self._hud_visible
+        if not self._hud_visible:
+            self.gui.camera_view_label.set_overlay([])
+        logger.info(f"GUI: {'Bật' if self._hud_visible else 'Tắt'} HUD hiệu năng.")
     
-    def capture_photo(self):
+    def maybe_request_prefetch(self, processed_frame):
+        """Gửi frame xem trước cho worker nhận dạng nền theo chu kỳ cấu hình."""
+        if not config.SPECULATIVE_ENABLED or self.worker is None or not self._worker_ready \
+                or self._prefetch_pending:
+            return
+        now = time.monotonic()
+        if (now - self._last_prefetch_time) * 1000 < config.SPECULATIVE_INTERVAL_MS:
+            return
+        self._last_prefetch_time = now
+        self._prefetch_pending = True
+        # Gửi bản sao vì processed_frame còn được vẽ tâm ngắm lên sau đó
+        self.request_prefetch.emit(processed_frame.copy(), self.calibrated_center, now)
+
+    @Slot()
+    def on_prefetch_finished(self):
+        self._prefetch_pending = False
+
+    def capture_photo(self, trigger_time=None):
         """
-        Lưu lại frame ảnh đã zoom (không có tâm ngắm) để training, sau đó gửi đi xử lý.
+        Nhận trigger: chọn frame ứng với thời điểm bóp cò (trigger_time, time.monotonic lúc nhận
+        sự kiện phím; None = lúc này), lưu frame đã zoom (không có tâm ngắm) để training rồi gửi đi xử lý.
         """
+        stamps = {}
+        stamp(stamps, 'trigger')
+        if trigger_time is not None:
+            stamps['trigger'] = trigger_time
+        if not self._worker_ready:
+            logger.warning("Bộ xử lý chưa sẵn sàng. Bỏ qua trigger.")
+            return
         # Kiểm tra xem có frame nào từ camera không
         if self.cam is None or not self.cam.is_opened():
             logger.warning("Camera chưa được kết nối hoặc đang đóng. Không thể chụp ảnh.")
             return
+        # Trigger trùng lặp (nảy phím, bấm đúp) được gộp vào phát trước
+        metrics.inc('shots_triggered')
+        if not self.shot_queue.accept_trigger(stamps['trigger']):
+            metrics.inc('shots_coalesced')
+            return
 
-        # Lấy frame mới nhất trực tiếp từ camera
-        # Việc này đảm bảo chúng ta có một frame hoàn toàn mới, chưa bị vẽ gì lên
-        raw_frame = self.cam.grab() 
-        if raw_frame is None:
+        # Frame cần tìm là frame chụp đúng khoảnh khắc bóp cò, sau khi bù độ lệch trigger/camera.
+        # Nếu frame đó chưa về tới bộ đệm thì hẹn lấy sau (không chặn GUI).
+        target_time = target_frame_time(stamps['trigger'], config.TRIGGER_FRAME_OFFSET_MS)
+        latest = self.cam.latest()
+        half_period = self.cam.frame_period / 2
+        if latest is not None and latest[1] < target_time - half_period:
+            wait_ms = min(config.TRIGGER_MAX_WAIT_MS, (target_time - latest[1] + half_period) * 1000)
+            metrics.inc('shots_waited_for_frame')
+            QTimer.singleShot(int(wait_ms) + 1, lambda: self._grab_shot(stamps, target_time))
+            return
+        self._grab_shot(stamps, target_time)
+
+    def _grab_shot(self, stamps, target_time):
+        """Lấy bản sao frame gần `target_time` nhất từ bộ đệm vòng của camera và gửi phát bắn đi xử lý."""
+        if self.cam is None or not self.cam.is_opened():
+            logger.warning("Camera đã bị ngắt trước khi lấy được frame. Bỏ qua phát bắn.")
+            return
+        with metrics.timer('shot_grab_ms'):
+            selected = self.cam.frame_at(target_time, copy=True)
+        if selected is None:
             logger.warning("Không thể lấy frame từ camera. Không thể chụp ảnh.")
             return
+        _, frame_time, raw_frame = selected
+        stamp(stamps, 'grab')
+        # Sai lệch giữa frame được chọn và thời điểm cần tìm; lớn hơn nửa chu kỳ frame nghĩa là
+        # frame cần tìm đã bị đẩy khỏi bộ đệm (CAMERA_RING_SIZE quá nhỏ) hoặc chờ không kịp
+        error_ms = abs(frame_time - target_time) * 1000
+        metrics.observe('shot_frame_error_ms', error_ms)
+        if error_ms > self.cam.frame_period * 1000:
+            metrics.inc('shot_frame_out_of_range')
+            logger.warning(f"Frame được chọn lệch {error_ms:.0f} ms so với thời điểm bóp cò.")
             
-        # Xử lý frame thô: crop và resize về kích thước tiêu chuẩn
-        processed_frame = self.crop_and_resize_frame(raw_frame)
+        # Xử lý frame thô: crop và resize về kích thước tiêu chuẩn.
+        # Ở chế độ hai độ phân giải, giữ lại bản crop chưa resize để worker so khớp chi tiết hơn.
+        with metrics.timer('shot_crop_resize_ms'):
+            hires_frame = crop_to_aspect(raw_frame)
+            processed_frame = cv2.resize(hires_frame, self.final_size, interpolation=cv2.INTER_AREA)
+        if not config.DUAL_RESOLUTION:
+            hires_frame = None
 
         # Phát âm thanh bắn
         self.audio_manager.play_sound('shot')
@@ -243,7 +453,8 @@ class MainWindow(QMainWindow):
             save_path = os.path.join(self.save_dir, filename)
 
             # 3. Lưu ảnh ra file
-            cv2.imwrite(save_path, image_to_save)
+            with metrics.timer('image_save_ms'):
+                cv2.imwrite(save_path, image_to_save)
             logger.info(f"Đã lưu ảnh để training tại: {save_path}")
 
         except Exception as e:
@@ -253,8 +464,11 @@ class MainWindow(QMainWindow):
         # Gửi processed_frame đi để xử lý tính điểm như bình thường
         # (Lưu ý: worker sẽ tự áp dụng zoom nếu cần cho việc hiển thị,
         #         nhưng việc tính toán gốc là trên processed_frame này)
-        self.request_processing.emit(processed_frame, self.calibrated_center, save_path)
-        logger.info("GUI: Đã gửi yêu cầu xử lý cho worker.")
+        shot = Shot(processed_frame, self.calibrated_center, save_path, hires_frame, stamps)
+        if self.shot_queue.push(shot):
+            logger.info("GUI: Đã gửi yêu cầu xử lý cho worker.")
+        else:
+            metrics.inc('shots_dropped')
             
     @Slot(dict)
     def on_processing_finished(self, result):
@@ -281,6 +495,14 @@ class MainWindow(QMainWindow):
                 coords=result.get('coords'),
                 image_path=result.get('image_path')
             )
+        # Mốc cuối cùng của phát bắn: kết quả đã được lưu, ghi nhận độ trễ từng bước
+        stamps = result.get('stamps')
+        if stamps is not None:
+            stamp(stamps, 'persist')
+            latencies = self.shot_queue.record(stamps)
+            for stage, ms in latencies.items():
+                metrics.observe(f"shot_stage_{stage}_ms", ms)
+            self._last_shot_latency_ms = latencies.get('total')
 
         # 1. Nếu là bắn trượt, áp dụng zoom vào ảnh frame camera
         if target_name == 'Trượt':
@@ -314,15 +536,13 @@ class MainWindow(QMainWindow):
         # Yêu cầu luồng nền dừng lại và chờ nó kết thúc
         self.processing_thread.quit()
         self.processing_thread.wait(3000)
+        if self.shot_pool is not None:
+            self.shot_pool.shutdown()
         super().closeEvent(event)
 
     # --- Các hàm còn lại không thay đổi đáng kể ---
     def crop_and_resize_frame(self, frame):
-        h, w, _ = frame.shape
-        target_aspect_ratio = 3.0 / 4.0
-        new_w = int(h * target_aspect_ratio)
-        start_x = (w - new_w) // 2 if w > new_w else 0
-        cropped_frame = frame[:, start_x : start_x + new_w]
+        cropped_frame = crop_to_aspect(frame, 3.0 / 4.0)
         return cv2.resize(cropped_frame, self.final_size, interpolation=cv2.INTER_AREA)
 
     def apply_digital_zoom(self, frame, zoom):
@@ -386,11 +606,21 @@ class MainWindow(QMainWindow):
     
     def connect_camera(self, index):
         self.disconnect_camera()
-        self.cam = Camera(index)
-        if self.cam.is_opened() and self.cam.grab() is not None:
-            self.video_timer.start(30)
-        else:
-            self.disconnect_camera()
+        self.cam = Camera(
+            index,
+            ring_size=config.CAMERA_RING_SIZE,
+            late_factor=config.CAMERA_LATE_FACTOR,
+            max_read_failures=config.CAMERA_MAX_READ_FAILURES,
+            profile=config.CAPTURE_PROFILES[config.CAPTURE_PROFILE],
+        )
+        self._last_frame_time = None
+        self._last_frame_seq = -1
+        # Timer chỉ đọc bộ đệm vòng (không chặn), frame trùng với lần trước được bỏ qua
+        if self.cam.start() and self.cam.wait_for_frame(timeout=2.0) is not None:
+            self.video_timer.start(15)
+            return True
+        self.disconnect_camera()
+        return False
 
     def disconnect_camera(self, message="Vui lòng kết nối camera"):
         """Ngắt kết nối camera hiện tại và hiển thị thông báo tùy chỉnh."""
@@ -403,22 +633,15 @@ class MainWindow(QMainWindow):
     
     def refresh_camera_connection(self):
         """
-        Làm mới kết nối, chỉ chọn camera 0 nếu có nhiều hơn 1 camera được phát hiện.
+        Làm mới kết nối: ưu tiên camera đã dùng lần trước, sau đó camera khớp CAMERA_PREFERRED,
+        rồi tới camera USB tháo rời được (camera laptop không được chọn).
         """
-        logger.info("Đang tìm kiếm camera theo logic tùy chỉnh...")
-        all_cameras = find_available_cameras()
-        
-        # THAY ĐỔI: Áp dụng logic mới
-        if len(all_cameras) > 1:
-            # Nếu có nhiều hơn 1 camera, kết nối với camera 0
-            target_index = 0
-            logger.info(f"Phát hiện {len(all_cameras)} camera. Kết nối với camera USB tại chỉ số {target_index}.")
-            self.connect_camera(target_index)
-        elif len(all_cameras) == 1:
-            # Nếu chỉ có 1 camera, đó là camera laptop, không kết nối
-            logger.warning("Chỉ phát hiện camera laptop. Vui lòng kết nối camera USB.")
-            self.disconnect_camera(message="Vui lòng kết nối USB Camera")
-        else:
-            # Nếu không có camera nào
-            logger.warning("Không tìm thấy bất kỳ camera nào.")
-            self.disconnect_camera(message="Không tìm thấy camera")
\ No newline at end of file
+        logger.info("Đang tìm kiếm camera...")
+        device, message = self.camera_registry.select(config.CAMERA_PREFERRED)
+        if device is None:
+            logger.warning(f"Không có camera phù hợp: {message}.")
+            self.disconnect_camera(message=message)
+            return
+        logger.info(f"Kết nối với camera '{device['name']}' tại chỉ số {device['index']} ({device['identity']}).")
+        if self.connect_camera(device['index']):
+            self.camera_registry.remember(device)
\ No newline at end of file
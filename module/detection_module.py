@@ -1,27 +1,134 @@
 # module/detection_module.py
+import os
 
-from ultralytics import YOLO
+# Lưu ý: ultralytics (kéo theo torch) chỉ được import khi thật sự tải model,
+# để import module này không làm chậm việc mở cửa sổ chính.
+
+# Backend suy luận -> (định dạng export của Ultralytics, hậu tố file/thư mục export)
+EXPORT_BACKENDS = {
+    'onnx': ('onnx', '.onnx'),
+    'openvino': ('openvino', '_openvino_model'),
+    'openvino_int8': ('openvino', '_int8_openvino_model'),
+}
+
+# File dataset YAML tạm cho hiệu chỉnh INT8 (thư mục cache, không đưa vào git)
+CALIBRATION_YAML_DIR = os.path.join("images", "cache")
+
+def exported_model_path(model_path, backend):
+    """
+    Trả về đường dẫn file export tương ứng với backend, nằm cạnh file .pt.
+    Ví dụ: my_modelv8s.pt -> my_modelv8s.onnx hoặc my_modelv8s_openvino_model/
+    """
+    _, suffix = EXPORT_BACKENDS[backend]
+    stem, _ = os.path.splitext(model_path)
+    return stem + suffix
+
+def write_calibration_yaml(model, image_dir, yaml_path):
+    """
+    Tạo file dataset YAML tối thiểu để Ultralytics lấy ảnh hiệu chỉnh INT8.
+    Chỉ cần ảnh, không cần nhãn, nên dùng trực tiếp thư mục ảnh đã chụp.
+    """
+    image_dir = os.path.abspath(image_dir)
+    if not os.path.isdir(image_dir) or not os.listdir(image_dir):
+        raise FileNotFoundError(f"Không có ảnh hiệu chỉnh trong thư mục '{image_dir}'")
+
+    lines = [f"path: {image_dir}", "train: .", "val: .", "names:"]
+    for cls_id, name in model.names.items():
+        lines.append(f"  {cls_id}: {name}")
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return yaml_path
+
+def resolve_model_path(model_path, backend="torch", imgsz=640, calibration_dir="captured_images"):
+    """
+    Chuẩn bị file model cho backend được chọn.
+    Nếu file export chưa có (hoặc cũ hơn file .pt) thì export một lần và lưu lại cache.
+    Với 'openvino_int8', model được lượng tử hóa sau huấn luyện (PTQ) và hiệu chỉnh
+    trên các ảnh trong `calibration_dir`.
+    """
+    if backend == "torch":
+        return model_path
+    if backend not in EXPORT_BACKENDS:
+        raise ValueError(f"Backend không hợp lệ: '{backend}'. Hỗ trợ: torch, {', '.join(EXPORT_BACKENDS)}")
+
+    export_path = exported_model_path(model_path, backend)
+    if os.path.exists(export_path) and os.path.getmtime(export_path) >= os.path.getmtime(model_path):
+        print(f"✅ Dùng lại model đã export: {export_path}")
+        return export_path
+
+    export_format, _ = EXPORT_BACKENDS[backend]
+    print(f"⏳ Đang export '{model_path}' sang {backend}, việc này chỉ thực hiện một lần...")
+    from ultralytics import YOLO
+    model = YOLO(model_path)
+    # dynamic=True để model export vẫn nhận được batch và kích thước ảnh khác nhau
+    export_args = {'format': export_format, 'imgsz': imgsz, 'dynamic': True}
+    if backend == "openvino_int8":
+        os.makedirs(CALIBRATION_YAML_DIR, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        yaml_path = os.path.join(CALIBRATION_YAML_DIR, stem + "_calib.yaml")
+        export_args.update(int8=True, data=write_calibration_yaml(model, calibration_dir, yaml_path))
+    exported = model.export(**export_args)
+    return str(exported)
 
 class ObjectDetector:
-    def __init__(self, model_path="my_modelv8l.pt"):
+    def __init__(self, model_path="my_modelv8l.pt", backend="torch", calibration_dir="captured_images"):
         """
         Khởi tạo detector với model YOLO.
+
+        Args:
+            model_path: Đường dẫn file trọng số PyTorch (.pt).
+            backend: 'torch', 'onnx', 'openvino' hoặc 'openvino_int8'.
+            calibration_dir: Thư mục ảnh dùng để hiệu chỉnh khi export INT8.
         """
+        self.backend = backend
+        self.model_path = model_path
         try:
-            self.model = YOLO(model_path)
+            try:
+                resolved_path = resolve_model_path(model_path, backend, calibration_dir=calibration_dir)
+            except Exception as e:
+                # Không export được thì vẫn chạy bằng PyTorch để không mất chức năng
+                print(f"⚠️ Không thể chuẩn bị backend '{backend}': {e}. Chuyển về backend torch.")
+                self.backend = "torch"
+                resolved_path = model_path
+            self.model_path = resolved_path
+            from ultralytics import YOLO
+            self.model = YOLO(resolved_path, task="detect")
             # In ra thông tin các lớp mà model có thể nhận diện
-            print(f"✅ Model YOLO đã được tải thành công. Các lớp: {self.model.names}")
+            print(f"✅ Model YOLO ({self.backend}) đã được tải thành công. Các lớp: {self.model.names}")
         except Exception as e:
             print(f"❌ Lỗi khi tải model YOLO: {e}")
             self.model = None
 
-    def detect(self, image, conf=0.75):
+    def _parse_result(self, res):
+        """
+        Chuyển kết quả YOLO của một ảnh thành danh sách dictionary.
+        Toàn bộ tensor được đưa về numpy một lần rồi mới duyệt từng box.
+        """
+        detections = []
+        if res is None or not res.boxes:
+            return detections
+
+        boxes_xyxy = res.boxes.xyxy.cpu().numpy().astype(int).tolist()
+        confs = res.boxes.conf.cpu().numpy().tolist()
+        class_ids = res.boxes.cls.cpu().numpy().astype(int).tolist()
+        names = self.model.names
+
+        for box, conf, cls_id in zip(boxes_xyxy, confs, class_ids):
+            detections.append({
+                'box': box,
+                'conf': float(conf),
+                'class_name': names[cls_id]
+            })
+        return detections
+
+    def detect(self, image, conf=0.75, imgsz=None):
         """
         Thực hiện nhận dạng đối tượng trên ảnh.
 
         Args:
             image: Ảnh đầu vào (định dạng OpenCV).
             conf: Ngưỡng tin cậy.
+            imgsz: Kích thước ảnh suy luận, None để dùng mặc định của model.
 
         Returns:
             Một danh sách các dictionary, mỗi dictionary chứa thông tin về một vật thể được phát hiện.
@@ -30,21 +137,62 @@ class ObjectDetector:
         if self.model is None:
             return []
 
-        detections = []
-        results = self.model(image, conf=conf, verbose=False) # verbose=False để log gọn hơn
-        
-        if results and results[0].boxes:
-            res = results[0]
-            boxes_xyxy = res.boxes.xyxy.cpu().numpy()
-            confs = res.boxes.conf.cpu().numpy()
-            class_ids = res.boxes.cls.cpu().numpy()
-
-            for box, conf, cls_id in zip(boxes_xyxy, confs, class_ids):
-                class_name = self.model.names[int(cls_id)]
-                detections.append({
-                    'box': [int(coord) for coord in box],
-                    'conf': float(conf),
-                    'class_name': class_name
-                })
-        
-        return detections
\ No newline at end of file
+        kwargs = {'imgsz': imgsz} if imgsz else {}
+        results = self.model(image, conf=conf, verbose=False, **kwargs) # verbose=False để log gọn hơn
+        if not results:
+            return []
+        return self._parse_result(results[0])
+
+    def detect_roi(self, image, center, margin=160, conf=0.75, imgsz=320):
+        """
+        Chỉ nhận dạng trong một cửa sổ vuông quanh tâm ngắm, với kích thước suy luận nhỏ hơn.
+        Box trả về đã được quy đổi về tọa độ của toàn bộ frame.
+
+        Args:
+            image: Frame đầy đủ (định dạng OpenCV).
+            center: Tâm ngắm (x, y) trên frame.
+            margin: Nửa cạnh cửa sổ ROI tính bằng pixel.
+            conf: Ngưỡng tin cậy.
+            imgsz: Kích thước ảnh suy luận cho ROI.
+
+        Returns:
+            Danh sách detection như `detect()`. Box chạm vào cạnh ROI (mà không phải cạnh
+            frame) có thêm 'clipped': True vì vật thể có thể bị cắt mất một phần.
+        """
+        h, w = image.shape[:2]
+        cx, cy = int(center[0]), int(center[1])
+        rx1, ry1 = max(0, cx - margin), max(0, cy - margin)
+        rx2, ry2 = min(w, cx + margin), min(h, cy + margin)
+        if rx2 <= rx1 or ry2 <= ry1:
+            return []
+
+        detections = self.detect(image[ry1:ry2, rx1:rx2], conf=conf, imgsz=imgsz)
+        edge = 2 # Sai số pixel khi xét box có chạm cạnh ROI hay không
+        for det in detections:
+            x1, y1, x2, y2 = det['box']
+            det['clipped'] = (
+                (x1 <= edge and rx1 > 0) or (y1 <= edge and ry1 > 0) or
+                (x2 >= rx2 - rx1 - edge and rx2 < w) or (y2 >= ry2 - ry1 - edge and ry2 < h)
+            )
+            det['box'] = [x1 + rx1, y1 + ry1, x2 + rx1, y2 + ry1]
+        return detections
+
+    def detect_batch(self, frames, conf=0.75):
+        """
+        Nhận dạng đối tượng trên nhiều ảnh trong một lần forward của model.
+
+        Args:
+            frames: Danh sách ảnh đầu vào (định dạng OpenCV).
+            conf: Ngưỡng tin cậy.
+
+        Returns:
+            Danh sách có cùng độ dài với `frames`, phần tử thứ i là kết quả
+            của ảnh thứ i theo đúng định dạng của `detect()`.
+        """
+        frames = list(frames)
+        if self.model is None or not frames:
+            return [[] for _ in frames]
+
+        # Ultralytics gom cả danh sách ảnh thành một batch duy nhất
+        results = self.model(frames, conf=conf, verbose=False)
+        return [self._parse_result(res) for res in results]
@@ -1,7 +1,9 @@
 # utils/audio.py
 import logging
 import os
-import pygame
+import threading
+
+from utils import startup_profile
 
 logger = logging.getLogger(__name__)
 
@@ -11,18 +13,44 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 class AudioManager:
     """
     Lớp quản lý âm thanh sử dụng pygame.mixer.
+    pygame chỉ được import khi tải âm thanh, và việc tải có thể chạy trên luồng nền
+    (load_in_background) để không làm chậm lúc mở cửa sổ chính.
     """
-    def __init__(self):
+    def __init__(self, load: bool = True):
+        self.sounds = None
+        self._loaded = threading.Event()
+        if load:
+            self.load()
+
+    def load(self):
+        """Khởi tạo pygame.mixer và tải toàn bộ file âm thanh."""
+        try:
+            import pygame
+        except ImportError as e:
+            logger.error(f"Không import được pygame: {e}. Âm thanh sẽ không hoạt động.")
+            self._loaded.set()
+            return
         try:
             pygame.mixer.init()
             self.sounds = {}
             logger.info("Pygame mixer đã được khởi tạo thành công.")
-            self._load_sounds()
+            self._load_sounds(pygame)
         except pygame.error as e:
             logger.error(f"Lỗi khi khởi tạo pygame.mixer: {e}. Âm thanh sẽ không hoạt động.")
             self.sounds = None
+        finally:
+            self._loaded.set()
+            startup_profile.mark("tải xong âm thanh")
+
+    def load_in_background(self):
+        """Tải âm thanh trên luồng nền; âm thanh được yêu cầu trước khi tải xong sẽ bị bỏ qua."""
+        threading.Thread(target=self.load, name="audio-loader", daemon=True).start()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded.is_set()
 
-    def _load_sounds(self):
+    def _load_sounds(self, pygame):
         """Tải các file âm thanh cần thiết: shot, miss, và scores 1-10."""
         if self.sounds is None: return
         logger.info("Đang tải các file âm thanh...")
@@ -49,7 +77,9 @@ class AudioManager:
 
     def play_sound(self, name: str):
         """Phát một âm thanh đã được tải dựa theo tên."""
-        if self.sounds and name in self.sounds:
+        if not self.is_loaded:
+            logger.info(f"Bỏ qua âm thanh '{name}' vì âm thanh chưa tải xong.")
+        elif self.sounds and name in self.sounds:
             self.sounds[name].play()
         elif self.sounds is None:
             logger.warning("Không thể phát âm thanh vì pygame.mixer chưa được khởi tạo.")
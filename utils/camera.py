@@ -1,22 +1,182 @@
 # core/camera.py
 import cv2
+import glob
 import logging
+import os
+import struct
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import fcntl # Chỉ có trên Linux/macOS
+except ImportError:
+    fcntl = None
+
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
+class FrameRing:
+    """
+    Bộ đệm vòng cấp phát sẵn cho frame camera. Luồng chụp ghi lần lượt vào từng ô;
+    mỗi frame kèm số thứ tự và mốc thời gian chụp (time.monotonic).
+    Frame đọc ra (không copy) chỉ hợp lệ cho tới khi luồng chụp quay vòng lại ô đó,
+    tức khoảng (size - 1) frame nữa; cần giữ lâu hơn thì đọc với copy=True.
+    """
+    def __init__(self, size: int = 4):
+        self.size = max(2, size)
+        self._frames = [None] * self.size
+        self._timestamps = [0.0] * self.size
+        self._seqs = [-1] * self.size
+        self._seq = -1 # Số thứ tự frame mới nhất
+        self._cond = threading.Condition()
+
+    def slot_for_next(self):
+        """
+        Ô (mảng cấp phát sẵn, có thể None ở vòng đầu) sẽ được ghi frame kế tiếp.
+        Ô này bị đánh dấu không hợp lệ ngay (dưới khóa), để trong lúc driver đang giải mã vào đó
+        nearest()/latest() không thể chọn và copy một frame ghi dở với mốc thời gian cũ.
+        """
+        with self._cond:
+            index = (self._seq + 1) % self.size
+            self._seqs[index] = -1
+            return self._frames[index]
+
+    def commit(self, frame, timestamp: float):
+        """Ghi nhận frame vừa chụp vào ô kế tiếp và đánh thức các luồng đang chờ."""
+        with self._cond:
+            seq = self._seq + 1
+            index = seq % self.size
+            self._frames[index] = frame
+            self._timestamps[index] = timestamp
+            self._seqs[index] = seq
+            self._seq = seq
+            self._cond.notify_all()
+
+    @property
+    def latest_seq(self) -> int:
+        return self._seq
+
+    def latest(self, copy: bool = False):
+        """Frame mới nhất dạng (seq, timestamp, frame), hoặc None nếu chưa có frame nào."""
+        with self._cond:
+            if self._seq < 0:
+                return None
+            index = self._seq % self.size
+            frame = self._frames[index]
+            return self._seq, self._timestamps[index], frame.copy() if copy else frame
+
+    def nearest(self, target_time: float, copy: bool = False):
+        """
+        Frame có mốc thời gian gần `target_time` nhất trong bộ đệm, dạng (seq, timestamp, frame);
+        None nếu chưa có frame nào.
+        """
+        with self._cond:
+            best = None
+            for index, seq in enumerate(self._seqs):
+                if seq < 0:
+                    continue
+                if best is None or abs(self._timestamps[index] - target_time) < abs(self._timestamps[best] - target_time):
+                    best = index
+            if best is None:
+                return None
+            frame = self._frames[best]
+            return self._seqs[best], self._timestamps[best], frame.copy() if copy else frame
+
+    def wait_newer(self, seq: int, timeout: float):
+        """Chờ tới khi có frame mới hơn `seq` (tối đa `timeout` giây); trả về như latest()."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seq, timeout):
+                return None
+        return self.latest()
+
+# ======================================================================
+# CHÚ THÍCH: HỒ SƠ ĐỊNH DẠNG CHỤP (CAPTURE PROFILE)
+# Một hồ sơ là dict có thể gồm: 'fourcc' (vd. "MJPG", "YUYV"), 'width', 'height', 'fps', 'buffersize'.
+# Khóa vắng mặt hoặc None thì giữ mặc định của driver. FOURCC được đặt trước kích thước vì với V4L2,
+# kích thước/FPS hợp lệ phụ thuộc định dạng. Driver có thể âm thầm chọn giá trị khác, nên sau khi đặt
+# luôn đọc lại giá trị thật (xem negotiate_format).
+# ======================================================================
+_PROFILE_PROPS = (
+    ('width', cv2.CAP_PROP_FRAME_WIDTH),
+    ('height', cv2.CAP_PROP_FRAME_HEIGHT),
+    ('fps', cv2.CAP_PROP_FPS),
+    ('buffersize', cv2.CAP_PROP_BUFFERSIZE),
+)
+
+def _decode_fourcc(value) -> str:
+    code = int(value)
+    if code <= 0:
+        return ""
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\0")
+
+def negotiate_format(cap, profile: dict) -> dict:
+    """
+    Đặt FOURCC, kích thước, FPS và số frame đệm theo hồ sơ rồi đọc lại giá trị driver thật sự chấp nhận.
+
+    Returns:
+        dict {'requested': ..., 'actual': ..., 'mismatched': [các khóa driver không nhận đúng]}.
+        Một số backend không đọc lại được buffersize (trả về 0); khi đó khóa này không bị coi là lệch.
+    """
+    requested = {key: profile.get(key) for key in ('fourcc',) + tuple(key for key, _ in _PROFILE_PROPS)}
+    if requested['fourcc']:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*requested['fourcc']))
+    for key, prop in _PROFILE_PROPS:
+        if requested[key] is not None:
+            cap.set(prop, requested[key])
+
+    actual = {'fourcc': _decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC))}
+    for key, prop in _PROFILE_PROPS:
+        actual[key] = cap.get(prop)
+    mismatched = []
+    for key, value in requested.items():
+        if value is None:
+            continue
+        if key == 'fourcc':
+            if actual['fourcc'] != value:
+                mismatched.append(key)
+        elif key == 'fps':
+            if abs(actual['fps'] - value) > 0.5:
+                mismatched.append(key)
+        elif key == 'buffersize' and actual['buffersize'] <= 0:
+            continue
+        elif int(actual[key]) != int(value):
+            mismatched.append(key)
+    return {'requested': requested, 'actual': actual, 'mismatched': mismatched}
+
 class Camera:
     """
     Lớp quản lý việc tương tác với một thiết bị camera vật lý.
+    Sau khi start(), một luồng nền đọc frame liên tục vào FrameRing (xả bộ đệm của driver,
+    nên frame đọc ra luôn là frame mới nhất); GUI và trigger đọc từ bộ đệm mà không bị chặn.
     """
-    def __init__(self, index: int):
+    def __init__(self, index: int, ring_size: int = 4, late_factor: float = 1.5, max_read_failures: int = 30,
+                 profile: dict = None):
         """
         Khởi tạo một đối tượng camera.
         
         Args:
             index (int): Chỉ số của thiết bị camera (ví dụ: 0, 1, 2).
+            ring_size (int): Số ô của bộ đệm vòng.
+            late_factor (float): Frame đến sau hơn late_factor chu kỳ frame được tính là trễ.
+            max_read_failures (int): Số lần đọc lỗi liên tiếp trước khi coi như mất camera.
+            profile (dict): Hồ sơ định dạng chụp (xem negotiate_format); None = 1280x720, còn lại theo driver.
         """
         self.index = index
+        self.ring = FrameRing(ring_size)
+        self.late_factor = late_factor
+        self.max_read_failures = max_read_failures
+        # Bộ đếm của luồng chụp
+        self.frames_captured = 0
+        self.frames_dropped = 0 # Ước lượng số frame driver không giao (khoảng trống giữa hai frame)
+        self.frames_late = 0    # Số frame đến trễ hơn late_factor chu kỳ frame
+        self.read_failures = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._failed = threading.Event()
+        self.format = None # Kết quả thương lượng định dạng với driver
         
         # Sử dụng API backend phù hợp với hệ điều hành để tăng độ ổn định
         api_preference = cv2.CAP_ANY # Mặc định
@@ -33,8 +193,19 @@ class Camera:
             logger.error(f"Không thể mở camera có chỉ số {self.index}")
         else:
             logger.info(f"Đã mở thành công camera có chỉ số {self.index}")
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            self.format = negotiate_format(self.cap, profile or {'width': 1280, 'height': 720})
+            actual = self.format['actual']
+            logger.info(
+                f"Camera {self.index}: định dạng {actual['fourcc'] or '?'} {actual['width']:.0f}x{actual['height']:.0f} "
+                f"@ {actual['fps']:g} FPS, đệm {actual['buffersize']:.0f} frame."
+            )
+            if self.format['mismatched']:
+                requested = self.format['requested']
+                details = ", ".join(f"{key}: yêu cầu {requested[key]}, nhận {actual[key]}" for key in self.format['mismatched'])
+                logger.warning(f"Camera {self.index}: Driver không nhận đúng hồ sơ định dạng ({details}).")
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        # Chu kỳ frame danh định (giây); driver không báo FPS thì giả định 30 FPS
+        self.frame_period = 1.0 / fps if fps and 0 < fps <= 240 else 1.0 / 30
 
     def get_index(self) -> int:
         """
@@ -46,38 +217,303 @@ class Camera:
         """
         Kiểm tra xem camera có đang được mở và hoạt động hay không.
         """
-        return self.cap.isOpened()
+        return self.cap.isOpened() and not self._failed.is_set()
+
+    def start(self) -> bool:
+        """Khởi động luồng chụp nền. Trả về False nếu camera chưa mở được."""
+        if not self.cap.isOpened():
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._capture_loop, name=f"camera-{self.index}", daemon=True)
+            self._thread.start()
+        return True
+
+    def _capture_loop(self):
+        """Đọc frame liên tục vào bộ đệm vòng, ghi lại mốc thời gian và đếm frame rơi/trễ."""
+        last_time = None
+        failures = 0
+        while not self._stop.is_set():
+            # grab() trả về ngay khi driver có frame, nên mốc thời gian lấy ngay sau đó
+            if not self.cap.grab():
+                failures += 1
+                self.read_failures += 1
+                metrics.inc('camera_read_failures')
+                if failures >= self.max_read_failures:
+                    logger.error(f"Camera {self.index}: Đọc frame lỗi {failures} lần liên tiếp, dừng luồng chụp.")
+                    self._failed.set()
+                    break
+                time.sleep(self.frame_period)
+                continue
+            timestamp = time.monotonic()
+            slot = self.ring.slot_for_next()
+            ret, frame = self.cap.retrieve(slot) if slot is not None else self.cap.retrieve()
+            if not ret or frame is None:
+                failures += 1
+                self.read_failures += 1
+                metrics.inc('camera_read_failures')
+                continue
+            failures = 0
+
+            if last_time is not None:
+                interval = timestamp - last_time
+                if interval > self.late_factor * self.frame_period:
+                    self.frames_late += 1
+                    metrics.inc('camera_frames_late')
+                    missing = int(interval / self.frame_period + 0.5) - 1
+                    if missing > 0:
+                        self.frames_dropped += missing
+                        metrics.inc('camera_frames_dropped', missing)
+            last_time = timestamp
+            # Nếu driver không ghi được vào ô cấp phát sẵn (khác kích thước), ô đó được thay bằng frame mới
+            self.ring.commit(frame, timestamp)
+            self.frames_captured += 1
+            metrics.inc('camera_frames')
+
+    def latest(self, copy: bool = False):
+        """Frame mới nhất dạng (seq, timestamp, frame) mà không chờ camera; None nếu chưa có frame."""
+        return self.ring.latest(copy)
+
+    def frame_at(self, target_time: float, copy: bool = True):
+        """Frame đã chụp gần thời điểm `target_time` (time.monotonic) nhất, dạng (seq, timestamp, frame)."""
+        return self.ring.nearest(target_time, copy)
+
+    def wait_for_frame(self, timeout: float = 2.0):
+        """Chờ frame đầu tiên (hoặc frame kế tiếp) từ luồng chụp; None nếu hết thời gian."""
+        return self.ring.wait_newer(self.ring.latest_seq, timeout)
 
     def grab(self):
         """
-        Lấy một khung hình (frame) từ camera.
+        Lấy khung hình (frame) mới nhất từ bộ đệm vòng (bản sao, không chờ camera).
         
         Returns:
-            numpy.ndarray: Khung hình đọc được, hoặc None nếu có lỗi.
+            numpy.ndarray: Khung hình mới nhất, hoặc None nếu chưa có frame / camera lỗi.
         """
         if not self.is_opened():
             return None
-            
-        ret, frame = self.cap.read()
-        if not ret:
-            return None
-        
-        return frame
+        latest = self.ring.latest(copy=True)
+        return latest[2] if latest is not None else None
+
+    def stats(self) -> dict:
+        """Bộ đếm của luồng chụp."""
+        return {
+            'captured': self.frames_captured, 'dropped': self.frames_dropped,
+            'late': self.frames_late, 'read_failures': self.read_failures,
+        }
     
     def release(self):
         """
-        Giải phóng thiết bị camera.
+        Dừng luồng chụp và giải phóng thiết bị camera.
         """
-        if self.is_opened() and self.cap is not None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(max(1.0, 3 * self.frame_period))
+            if self._thread.is_alive():
+                logger.warning(f"Luồng chụp của camera {self.index} chưa dừng kịp.")
+        if self.cap is not None and self.cap.isOpened():
             self.cap.release()
             logger.info(f"Đã giải phóng camera có chỉ số {self.index}")
             
+# ======================================================================
+# CHÚ THÍCH: TÌM CAMERA
+# Trên Linux, camera được liệt kê trực tiếp từ /dev/video* và sysfs (không mở VideoCapture):
+# ioctl VIDIOC_QUERYCAP cho biết node nào thật sự là node chụp ảnh (UVC tạo thêm node metadata),
+# sysfs cho biết hãng/sản phẩm/serial USB và camera gắn cố định (laptop) hay tháo rời được.
+# Trên hệ điều hành khác, các chỉ số 0..max_index-1 được thử mở song song bằng OpenCV.
+# Mọi lần dò đều chạy song song và có giới hạn thời gian; kết quả được lưu theo định danh ổn định
+# của thiết bị (không phụ thuộc số /dev/videoN) để lần làm mới sau kết nối lại gần như tức thì.
+# ======================================================================
+_DEV_GLOB = "/dev/video*"
+_SYSFS_V4L = "/sys/class/video4linux"
+# struct v4l2_capability: driver[16], card[32], bus_info[32], version, capabilities, device_caps, reserved[3]
+_V4L2_CAPABILITY = struct.Struct("16s32s32sIII3I")
+_VIDIOC_QUERYCAP = 0x80000000 | (_V4L2_CAPABILITY.size << 16) | (ord('V') << 8) | 0
+_V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+_V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+def _read_sysfs(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _usb_attributes(node_name: str) -> dict:
+    """Thuộc tính USB (hãng, sản phẩm, serial, cố định/tháo rời) của thiết bị chứa node video."""
+    device_dir = os.path.realpath(os.path.join(_SYSFS_V4L, node_name, "device"))
+    # Node video nằm dưới một interface USB; thông tin thiết bị nằm ở thư mục cha có idVendor
+    for directory in (device_dir, os.path.dirname(device_dir)):
+        vendor = _read_sysfs(os.path.join(directory, "idVendor"))
+        if vendor:
+            return {
+                'vendor': vendor,
+                'product': _read_sysfs(os.path.join(directory, "idProduct")),
+                'serial': _read_sysfs(os.path.join(directory, "serial")),
+                'removable': _read_sysfs(os.path.join(directory, "removable")) or "unknown",
+                'port': os.path.basename(directory),
+            }
+    return {}
+
+def _query_capabilities(path: str):
+    """Gọi VIDIOC_QUERYCAP; trả về dict (driver, card, bus_info, capture) hoặc None nếu không đọc được."""
+    if fcntl is None:
+        return None
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        buffer = bytearray(_V4L2_CAPABILITY.size)
+        fcntl.ioctl(fd, _VIDIOC_QUERYCAP, buffer)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    driver, card, bus_info, _, capabilities, device_caps, *_ = _V4L2_CAPABILITY.unpack(bytes(buffer))
+    caps = device_caps if capabilities & _V4L2_CAP_DEVICE_CAPS else capabilities
+    decode = lambda raw: raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+    return {
+        'driver': decode(driver), 'card': decode(card), 'bus_info': decode(bus_info),
+        'capture': bool(caps & _V4L2_CAP_VIDEO_CAPTURE),
+    }
+
+def _probe_v4l2(path: str):
+    """Thông tin một node /dev/videoN (None nếu không phải node chụp ảnh)."""
+    node_name = os.path.basename(path)
+    index = int(node_name[len("video"):])
+    caps = _query_capabilities(path)
+    if caps is None:
+        # Không có quyền mở node: dùng sysfs, node chụp ảnh của UVC có index 0
+        if _read_sysfs(os.path.join(_SYSFS_V4L, node_name, "index")) not in (None, "0"):
+            return None
+        caps = {'driver': None, 'card': _read_sysfs(os.path.join(_SYSFS_V4L, node_name, "name")) or node_name,
+                'bus_info': None, 'capture': True}
+    if not caps['capture']:
+        return None
+    usb = _usb_attributes(node_name)
+    if usb:
+        identity = f"usb:{usb['vendor']}:{usb['product']}:{usb['serial'] or usb['port']}"
+    else:
+        identity = f"v4l2:{caps['bus_info'] or node_name}:{caps['card']}"
+    return {
+        'index': index, 'path': path, 'name': caps['card'], 'identity': identity,
+        # True: tháo rời được (camera USB ngoài), False: gắn cố định (camera laptop), None: không rõ
+        'external': {'removable': True, 'fixed': False}.get(usb.get('removable')),
+    }
+
+def _probe_index(index: int):
+    """Thử mở camera theo chỉ số bằng OpenCV (dùng khi không có /dev/video*)."""
+    cap = cv2.VideoCapture(index, cv2.CAP_ANY)
+    try:
+        if not cap.isOpened():
+            return None
+    finally:
+        cap.release()
+    return {'index': index, 'path': None, 'name': f"Camera {index}", 'identity': f"index:{index}", 'external': None}
+
+class CameraRegistry:
+    """
+    Danh sách camera đang cắm, lưu giữa các lần làm mới theo định danh ổn định của thiết bị.
+    Thiết bị đã kết nối thành công lần trước (remember) được ưu tiên chọn lại.
+    """
+    def __init__(self, probe_timeout: float = 2.0, max_index: int = 10):
+        self.probe_timeout = probe_timeout
+        self.max_index = max_index
+        self.devices = {} # định danh -> thông tin thiết bị
+        self.last_identity = None
+
+    def _probe_parallel(self, probe, targets) -> list:
+        """Chạy `probe` cho mọi target song song, chờ tối đa probe_timeout; trả về các kết quả khác None."""
+        targets = list(targets)
+        if not targets:
+            return []
+        executor = ThreadPoolExecutor(max_workers=min(8, len(targets)), thread_name_prefix="camera-probe")
+        futures = {executor.submit(probe, target): target for target in targets}
+        done, not_done = wait(futures, timeout=self.probe_timeout)
+        # Không chờ các lần dò bị treo (driver lỗi); chúng tự kết thúc ở luồng nền
+        executor.shutdown(wait=False)
+        for future in not_done:
+            logger.warning(f"Dò camera '{futures[future]}' quá {self.probe_timeout:g} giây, bỏ qua.")
+        results = []
+        for future in done:
+            try:
+                device = future.result()
+            except Exception as e:
+                logger.warning(f"Lỗi khi dò camera '{futures[future]}': {e}")
+                continue
+            if device is not None:
+                results.append(device)
+        return results
+
+    def discover(self) -> list:
+        """Liệt kê lại camera (dò song song, có giới hạn thời gian); trả về danh sách theo chỉ số."""
+        start = time.perf_counter()
+        paths = [path for path in glob.glob(_DEV_GLOB) if os.path.basename(path)[len("video"):].isdigit()]
+        if paths:
+            probe, targets = _probe_v4l2, paths
+        else:
+            probe, targets = _probe_index, range(self.max_index)
+
+        found = {device['identity']: device for device in self._probe_parallel(probe, targets)}
+        self.devices = found
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe('camera_discovery_ms', elapsed_ms)
+        names = ", ".join(f"{d['index']}: {d['name']}" for d in sorted(found.values(), key=lambda d: d['index']))
+        logger.info(f"Tìm thấy {len(found)} camera trong {elapsed_ms:.0f} ms ({names or 'không có'}).")
+        return sorted(found.values(), key=lambda device: device['index'])
+
+    def _revalidate(self, device: dict):
+        """Dò lại một thiết bị đã biết; trả về thông tin mới nếu vẫn cắm và đúng định danh, ngược lại None."""
+        if device['path']:
+            if not os.path.exists(device['path']):
+                return None
+            results = self._probe_parallel(_probe_v4l2, [device['path']])
+        else:
+            results = self._probe_parallel(_probe_index, [device['index']])
+        if not results or results[0]['identity'] != device['identity']:
+            return None
+        self.devices[device['identity']] = results[0]
+        return results[0]
+
+    def remember(self, device: dict):
+        """Ghi nhớ thiết bị vừa kết nối thành công để ưu tiên ở lần làm mới sau."""
+        self.last_identity = device['identity']
+
+    def select(self, preferred: str = ""):
+        """
+        Chọn camera để kết nối, theo thứ tự: camera đã dùng lần trước, camera khớp `preferred`
+        (một phần tên hoặc định danh), camera USB tháo rời được. Camera gắn cố định (laptop) không bao giờ
+        được tự chọn. Với camera không rõ ngoài/trong (ngoài Linux, hoặc sysfs báo 'unknown' - nhiều laptop
+        báo như vậy cho cả cổng trong) giữ cách chọn cũ: có nhiều hơn một camera thì dùng camera không rõ
+        có chỉ số nhỏ nhất, chỉ có một camera thì coi là camera laptop và không kết nối.
+
+        Returns:
+            (thiết bị hoặc None, thông báo cho người dùng nếu không chọn được).
+        """
+        # Đường nhanh: chỉ dò lại đúng thiết bị đã dùng lần trước, không liệt kê lại toàn bộ
+        last = self.devices.get(self.last_identity)
+        if last is not None:
+            device = self._revalidate(last)
+            if device is not None:
+                logger.info(f"Kết nối lại camera đã dùng trước đó: {device['name']} ({device['identity']}).")
+                return device, None
+
+        devices = self.discover()
+        if not devices:
+            return None, "Không tìm thấy camera"
+        if self.last_identity in self.devices:
+            return self.devices[self.last_identity], None
+        if preferred:
+            for device in devices:
+                if preferred.lower() in device['name'].lower() or preferred == device['identity']:
+                    return device, None
+        external = [device for device in devices if device['external']]
+        if external:
+            return external[0], None
+        unknown = [device for device in devices if device['external'] is None]
+        if unknown and len(devices) > 1:
+            return unknown[0], None
+        return None, "Vui lòng kết nối USB Camera"
+
 def find_available_cameras(max_cameras_to_check=10):
-    available_cameras = []
-    for i in range(max_cameras_to_check):
-        api_preference = cv2.CAP_ANY
-        cap = cv2.VideoCapture(i, api_preference)
-        if cap.isOpened():
-            available_cameras.append(i)
-            cap.release()
-    return available_cameras
+    """Chỉ số các camera đang cắm (dò song song, xem CameraRegistry)."""
+    return [device['index'] for device in CameraRegistry(max_index=max_cameras_to_check).discover()]
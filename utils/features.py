@@ -0,0 +1,102 @@
+# utils/features.py
+import math
+
+import cv2
+import numpy as np
+
+# Thông số ORB dùng chung cho ảnh bia gốc và ảnh crop, phải giống nhau ở cả hai phía
+ORB_NFEATURES = 1500
+ORB_PARAMS = {'scaleFactor': 1.2, 'edgeThreshold': 15, 'patchSize': 31}
+
+# Các mức tỉ lệ của kim tự tháp ảnh bia gốc (1.0 = độ phân giải gốc)
+PYRAMID_SCALES = (1.0, 0.5, 0.25)
+
+# Ngân sách đặc trưng cho ảnh crop tỉ lệ với diện tích: crop nhỏ không cần 1500 điểm
+CROP_FEATURES_PER_PIXEL = 1 / 40.0
+CROP_MIN_FEATURES = 300
+
+def create_orb(nfeatures: int = ORB_NFEATURES):
+    return cv2.ORB_create(nfeatures=nfeatures, **ORB_PARAMS)
+
+def _fit_mask(mask, shape, dilate_px: int):
+    """
+    Đưa mask về đúng kích thước ảnh và nới rộng một chút để giữ lại
+    các keypoint nằm ngay trên viền bia.
+    """
+    if mask is None:
+        return None
+    h, w = shape[:2]
+    if mask.shape[:2] != (h, w):
+        mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+    mask = (mask > 0).astype(np.uint8) * 255
+    if dilate_px > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * dilate_px + 1, 2 * dilate_px + 1))
+        mask = cv2.dilate(mask, kernel)
+    return mask
+
+def compute_features(image, mask=None, nfeatures: int = ORB_NFEATURES, dilate_px: int = 15):
+    """
+    Tính keypoint + descriptor ORB cho một ảnh.
+
+    Returns:
+        dict {'points': float32 (N, 2), 'descriptors': uint8 (N, 32)} hoặc None nếu không có đặc trưng.
+    """
+    if image is None:
+        return None
+    orb = create_orb(nfeatures)
+    keypoints, descriptors = orb.detectAndCompute(image, _fit_mask(mask, image.shape, dilate_px))
+    if descriptors is None or not keypoints:
+        return None
+    points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+    return {'points': points, 'descriptors': descriptors}
+
+def crop_feature_budget(crop_shape) -> int:
+    """Số đặc trưng ORB cần cho ảnh crop, tỉ lệ với diện tích và không vượt quá ORB_NFEATURES."""
+    h, w = crop_shape[:2]
+    return int(min(ORB_NFEATURES, max(CROP_MIN_FEATURES, h * w * CROP_FEATURES_PER_PIXEL)))
+
+def compute_crop_features(crop):
+    """Tính đặc trưng cho ảnh crop với ngân sách thích ứng theo kích thước."""
+    if crop is None:
+        return None
+    return compute_features(crop, nfeatures=crop_feature_budget(crop.shape))
+
+def compute_feature_pyramid(image, mask=None, scales=PYRAMID_SCALES):
+    """
+    Tính đặc trưng ORB của ảnh bia gốc trên nhiều mức tỉ lệ.
+    Tọa độ điểm ở mọi mức đều được quy về ảnh gốc độ phân giải đầy đủ,
+    nên homography tính với bất kỳ mức nào cũng dùng chung được.
+
+    Returns:
+        Danh sách mức {'scale', 'points', 'descriptors'}, mức lớn nhất đứng đầu; None nếu không có đặc trưng.
+    """
+    if image is None:
+        return None
+    h, w = image.shape[:2]
+    levels = []
+    for scale in sorted(scales, reverse=True):
+        if scale == 1.0:
+            level_img = image
+        else:
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            level_img = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        nfeatures = max(CROP_MIN_FEATURES, int(ORB_NFEATURES * scale))
+        features = compute_features(level_img, mask, nfeatures=nfeatures, dilate_px=max(1, int(15 * scale)))
+        if features is None or len(features['points']) < 10:
+            continue
+        features['points'] = features['points'] / np.float32(scale)
+        features['scale'] = float(scale)
+        levels.append(features)
+    return levels or None
+
+def select_pyramid_level(pyramid, crop_shape, ref_shape):
+    """
+    Chọn mức kim tự tháp có tỉ lệ gần nhất (theo log) với tỉ lệ crop / ảnh gốc.
+    Chấp nhận cả một dict đặc trưng đơn lẻ để tương thích với cách gọi cũ.
+    """
+    if not pyramid or isinstance(pyramid, dict):
+        return pyramid
+    crop_h, crop_w = crop_shape[:2]
+    ref_h, ref_w = ref_shape[:2]
+    target_scale = max(1e-3, min(crop_w / ref_w, crop_h / ref_h))
+    return min(pyramid, key=lambda level: abs(math.log(level['scale'] / target_scale)))
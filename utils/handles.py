@@ -1,107 +1,164 @@
 # utils/handles.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
-from utils.processing import warp_crop_to_original, calculate_score_bia4, calculate_score_bia7, calculate_score_bia8
+from core.shot_queue import stamp
+from utils.processing import estimate_homography, transform_point
+from utils.features import compute_crop_features, select_pyramid_level
+from utils.scoring import build_score_raster, score_point
+from utils import metrics
+
+# Ảnh gốc và ảnh gốc thay thế được so khớp song song (OpenCV nhả GIL trong lúc tính toán)
+_MATCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ref-match")
+# Kết quả với ảnh gốc chính đủ tốt thì không chờ ảnh thay thế nữa
+STRONG_MATCH_INLIERS = 30
+STRONG_MATCH_RATIO = 0.5
 
 # --- CÁC HÀM XỬ LÝ ĐÃ ĐƯỢC NÂNG CẤP ---
 
-def handle_hit_bia_so_4(hit_info, original_frame, original_img, original_img_alt, mask):
-    obj_crop = hit_info['crop']
-    shot_point_relative = hit_info['shot_point_relative']
-    processed_image = original_img.copy()
-    score = 0
-    transformed_point = None
+def _is_valid(result):
+    return result is not None and result['point'] is not None
 
-    _, transformed_point = warp_crop_to_original(original_img, obj_crop, shot_point_relative)
-    if transformed_point:
-        score = calculate_score_bia4(transformed_point, original_img, mask)
-        cv2.drawMarker(processed_image, (int(transformed_point[0]), int(transformed_point[1])), (0, 0, 255), cv2.MARKER_CROSS, 40, 3)
-    elif original_img_alt is not None:
-        _, transformed_point_alt = warp_crop_to_original(original_img_alt, obj_crop, shot_point_relative)
-        if transformed_point_alt:
-            transformed_point = transformed_point_alt # Lưu lại tọa độ
-            score = calculate_score_bia4(transformed_point_alt, original_img_alt, mask)
-            cv2.drawMarker(processed_image, (int(transformed_point_alt[0]), int(transformed_point_alt[1])), (0, 165, 255), cv2.MARKER_CROSS, 40, 3)
-
-    # ======================================================================
-    # CHÚ THÍCH: LOGIC FALLBACK KHI WARP THẤT BẠI
-    # ======================================================================
-    if transformed_point is None:
-        h_orig, w_orig = original_img.shape[:2]
-        h_crop, w_crop = obj_crop.shape[:2]
-        
-        # Ước tính tọa độ bằng cách phóng to theo tỷ lệ
-        scaled_x = int(shot_point_relative[0] * w_orig / w_crop)
-        scaled_y = int(shot_point_relative[1] * h_orig / h_crop)
-        transformed_point = (scaled_x, scaled_y) # Lưu lại tọa độ ước tính
-        
-        score = calculate_score_bia4(transformed_point, original_img, mask)
-        # Vẽ điểm ước tính bằng màu vàng để phân biệt
-        cv2.drawMarker(processed_image, transformed_point, (0, 255, 255), cv2.MARKER_CROSS, 40, 3)
+def _is_strong(result):
+    return _is_valid(result) and result['inliers'] >= STRONG_MATCH_INLIERS \
+        and result['inlier_ratio'] >= STRONG_MATCH_RATIO
+
+def _locate_shot(obj_crop, shot_point_relative, original_img, original_img_alt, features, features_alt,
+                 estimator=None):
+    """
+    Chuyển tọa độ vết đạn trên ảnh crop sang ảnh bia gốc. Ảnh gốc chính và ảnh gốc thay thế
+    được thử đồng thời; kết quả nhiều inlier hơn sẽ thắng. Nếu ảnh gốc chính đã khớp tốt
+    thì việc so khớp với ảnh thay thế bị hủy sớm.
+    Chỉ ước lượng homography và biến đổi một điểm, không warp toàn bộ ảnh.
+
+    Returns:
+        (kết quả estimate_homography, 'primary' | 'alt') hoặc (None, None) nếu cả hai đều thất bại.
+    """
+    # Đặc trưng của ảnh crop chỉ tính một lần (ngân sách theo kích thước crop),
+    # dùng chung cho cả ảnh gốc và ảnh gốc thay thế
+    with metrics.timer('orb_crop_features_ms'):
+        crop_features = compute_crop_features(obj_crop)
+    estimator = estimator or {}
+    # Chọn mức kim tự tháp của ảnh gốc khớp với độ phân giải của crop
+    features = select_pyramid_level(features, obj_crop.shape, original_img.shape)
+    if original_img_alt is not None:
+        features_alt = select_pyramid_level(features_alt, obj_crop.shape, original_img_alt.shape)
+
+    if original_img_alt is None:
+        primary = estimate_homography(
+            original_img, obj_crop, shot_point_relative, ref_features=features, crop_features=crop_features,
+            **estimator
+        )
+        return (primary, 'primary') if _is_valid(primary) else (None, None)
+
+    cancel_alt = threading.Event()
+    alt_future = _MATCH_POOL.submit(
+        estimate_homography, original_img_alt, obj_crop, shot_point_relative,
+        ref_features=features_alt, crop_features=crop_features, cancel_event=cancel_alt, **estimator
+    )
+    # Ảnh gốc chính chạy ngay trên luồng hiện tại, song song với ảnh thay thế
+    primary = estimate_homography(
+        original_img, obj_crop, shot_point_relative, ref_features=features, crop_features=crop_features,
+        **estimator
+    )
+    if _is_strong(primary):
+        cancel_alt.set()
+        alt_future.cancel()
+        return primary, 'primary'
+
+    alt = alt_future.result()
+    if _is_valid(primary) and (not _is_valid(alt) or primary['inliers'] >= alt['inliers']):
+        return primary, 'primary'
+    if _is_valid(alt):
+        return alt, 'alt'
+    return None, None
 
-    return {'target': 'Bia số 4', 'score': score, 'image': processed_image, 'coords': transformed_point}
+def _locate_shot_cached(hit_info, original_img, original_img_alt, features, features_alt, homography_cache,
+                        estimator=None):
+    """
+    Thử dùng lại homography của phát bắn trước trên cùng bia, nếu không được thì ước lượng đầy đủ.
 
-def handle_hit_bia_so_7(hit_info, original_frame, original_img, original_img_alt, mask):
-    # (Logic tương tự được áp dụng cho bia 7)
+    Returns:
+        (tọa độ trên ảnh gốc, 'primary' | 'alt') hoặc (None, None).
+    """
     obj_crop = hit_info['crop']
     shot_point_relative = hit_info['shot_point_relative']
-    processed_image = original_img.copy()
-    score = 0
-    transformed_point = None
-    
-    _, transformed_point = warp_crop_to_original(original_img, obj_crop, shot_point_relative)
-    if transformed_point:
-        score = calculate_score_bia7(transformed_point, original_img, mask)
-        cv2.drawMarker(processed_image, (int(transformed_point[0]), int(transformed_point[1])), (0, 0, 255), cv2.MARKER_CROSS, 40, 3)
-    elif original_img_alt is not None:
-        _, transformed_point_alt = warp_crop_to_original(original_img_alt, obj_crop, shot_point_relative)
-        if transformed_point_alt:
-            transformed_point = transformed_point_alt
-            score = calculate_score_bia7(transformed_point_alt, original_img_alt, mask)
-            cv2.drawMarker(processed_image, (int(transformed_point_alt[0]), int(transformed_point_alt[1])), (0, 165, 255), cv2.MARKER_CROSS, 40, 3)
-
-    if transformed_point is None:
-        h_orig, w_orig = original_img.shape[:2]
-        h_crop, w_crop = obj_crop.shape[:2]
-        scaled_x = int(shot_point_relative[0] * w_orig / w_crop)
-        scaled_y = int(shot_point_relative[1] * h_orig / h_crop)
-        transformed_point = (scaled_x, scaled_y)
-        score = calculate_score_bia7(transformed_point, original_img, mask)
-        cv2.drawMarker(processed_image, transformed_point, (0, 255, 255), cv2.MARKER_CROSS, 40, 3)
-            
-    return {'target': 'Bia số 7', 'score': score, 'image': processed_image, 'coords': transformed_point}
-    
-def handle_hit_bia_so_8(hit_info, original_frame, original_img, original_img_alt, mask):
-    # (Logic tương tự được áp dụng cho bia 8)
+    box, class_name = hit_info.get('box'), hit_info.get('name')
+    use_cache = homography_cache is not None and box is not None
+
+    if use_cache:
+        cached = homography_cache.lookup(class_name, box, obj_crop)
+        if cached is not None:
+            metrics.inc('homography_cache_hits')
+            H, source = cached
+            return transform_point(H, shot_point_relative), source
+
+    metrics.inc('homography_cache_misses' if use_cache else 'homography_full_estimates')
+    start = time.perf_counter()
+    result, source = _locate_shot(
+        obj_crop, shot_point_relative, original_img, original_img_alt, features, features_alt, estimator
+    )
+    if result is None:
+        if use_cache:
+            homography_cache.invalidate()
+        return None, None
+    if use_cache:
+        homography_cache.store(class_name, box, obj_crop, result['H'], source, (time.perf_counter() - start) * 1000)
+    return result['point'], source
+
+def handle_hit(hit_info, original_frame, original_img, original_img_alt, mask,
+               features=None, features_alt=None, score_raster=None, score_raster_alt=None,
+               homography_cache=None, estimator=None, geometry=None, label=None, stamps=None):
+    """
+    Xử lý phát bắn trúng cho mọi loại bia. Các tham số từ `original_img` trở đi
+    là một bộ tài sản do utils.targets.compile_target_assets tạo ra từ hồ sơ bia.
+    Nếu có `stamps` (dict mốc thời gian của phát bắn), ghi mốc 'match' sau bước so khớp.
+    """
     obj_crop = hit_info['crop']
     shot_point_relative = hit_info['shot_point_relative']
     processed_image = original_img.copy()
-    score = 0
-    transformed_point = None
-    
-    _, transformed_point = warp_crop_to_original(original_img, obj_crop, shot_point_relative)
-    if transformed_point:
-        score = calculate_score_bia8(transformed_point, original_img, mask)
+
+    # Ảnh điểm thường được biên dịch sẵn khi tải tài sản, chỉ dựng tại chỗ nếu thiếu
+    if score_raster is None:
+        score_raster = build_score_raster(geometry, original_img.shape, mask)
+
+    transformed_point, source = _locate_shot_cached(
+        hit_info, original_img, original_img_alt, features, features_alt, homography_cache, estimator
+    )
+    stamp(stamps, 'match')
+    match_source = source or 'fallback'
+    metrics.inc(f"match_source_{match_source}")
+    if source == 'primary':
+        score = score_point(score_raster, transformed_point)
         cv2.drawMarker(processed_image, (int(transformed_point[0]), int(transformed_point[1])), (0, 0, 255), cv2.MARKER_CROSS, 40, 3)
-    elif original_img_alt is not None:
-        _, transformed_point_alt = warp_crop_to_original(original_img_alt, obj_crop, shot_point_relative)
-        if transformed_point_alt:
-            transformed_point = transformed_point_alt
-            score = calculate_score_bia8(transformed_point_alt, original_img_alt, mask)
-            cv2.drawMarker(processed_image, (int(transformed_point_alt[0]), int(transformed_point_alt[1])), (0, 165, 255), cv2.MARKER_CROSS, 40, 3)
-
-    if transformed_point is None:
+    elif source == 'alt':
+        if score_raster_alt is None:
+            score_raster_alt = build_score_raster(geometry, original_img_alt.shape, mask)
+        score = score_point(score_raster_alt, transformed_point)
+        cv2.drawMarker(processed_image, (int(transformed_point[0]), int(transformed_point[1])), (0, 165, 255), cv2.MARKER_CROSS, 40, 3)
+    else:
+        # ======================================================================
+        # CHÚ THÍCH: LOGIC FALLBACK KHI WARP THẤT BẠI
+        # ======================================================================
         h_orig, w_orig = original_img.shape[:2]
         h_crop, w_crop = obj_crop.shape[:2]
+
+        # Ước tính tọa độ bằng cách phóng to theo tỷ lệ
         scaled_x = int(shot_point_relative[0] * w_orig / w_crop)
         scaled_y = int(shot_point_relative[1] * h_orig / h_crop)
-        transformed_point = (scaled_x, scaled_y)
-        score = calculate_score_bia8(transformed_point, original_img, mask)
+        transformed_point = (scaled_x, scaled_y) # Lưu lại tọa độ ước tính
+
+        score = score_point(score_raster, transformed_point)
+        # Vẽ điểm ước tính bằng màu vàng để phân biệt
         cv2.drawMarker(processed_image, transformed_point, (0, 255, 255), cv2.MARKER_CROSS, 40, 3)
 
-    return {'target': 'Bia số 8', 'score': score, 'image': processed_image, 'coords': transformed_point}
-    
+    return {'target': label, 'score': score, 'image': processed_image, 'coords': transformed_point,
+            'match_source': match_source}
+
 def handle_miss(hit_info, original_frame):
     processed_image = original_frame.copy()
     shot_point = hit_info['shot_point']
     cv2.drawMarker(processed_image, shot_point, (0, 0, 255), cv2.MARKER_CROSS, 40, 2)
-    return {'target': 'Trượt', 'score': 0, 'image': processed_image, 'coords': None}
\ No newline at end of file
+    return {'target': 'Trượt', 'score': 0, 'image': processed_image, 'coords': None}
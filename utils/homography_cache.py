@@ -0,0 +1,108 @@
+# utils/homography_cache.py
+import logging
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _translation(dx: float, dy: float) -> np.ndarray:
+    return np.array([[1.0, 0.0, dx], [0.0, 1.0, dy], [0.0, 0.0, 1.0]])
+
+def _to_gray(image: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+class HomographyCache:
+    """
+    Lưu homography tốt gần nhất của một loại bia để dùng lại cho phát bắn kế tiếp.
+
+    Trên trường bắn cố định, bia gần như không dịch chuyển giữa các phát bắn. Homography
+    được lưu theo tọa độ frame (không phụ thuộc vị trí box), nên khi box lệch vài pixel
+    vẫn dùng lại được. Trước khi dùng lại, vùng giao giữa crop cũ và crop mới được so
+    sánh bằng tương quan chuẩn hóa (NCC) trên ảnh thu nhỏ; nếu khung cảnh đã đổi thì
+    ước lượng lại từ đầu.
+    """
+    def __init__(self, name: str, box_tolerance: int = 8, min_ncc: float = 0.9,
+                 min_overlap: float = 0.8, thumb_size: int = 64):
+        self.name = name
+        self.box_tolerance = box_tolerance
+        self.min_ncc = min_ncc
+        self.min_overlap = min_overlap
+        self.thumb_size = thumb_size
+        self._entry = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._full_ms = None # Trung bình trượt thời gian ước lượng đầy đủ
+
+    def _thumbnail(self, gray: np.ndarray) -> np.ndarray:
+        h, w = gray.shape[:2]
+        scale = self.thumb_size / max(h, w)
+        size = (max(8, int(round(w * scale))), max(8, int(round(h * scale))))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def _same_scene(self, box, crop) -> bool:
+        """So sánh vùng giao giữa crop đang lưu và crop mới trong tọa độ frame."""
+        old_box, old_gray = self._entry['box'], self._entry['gray']
+        ix1, iy1 = max(box[0], old_box[0]), max(box[1], old_box[1])
+        ix2, iy2 = min(box[2], old_box[2]), min(box[3], old_box[3])
+        if ix2 - ix1 < 8 or iy2 - iy1 < 8:
+            return False
+        new_area = (box[2] - box[0]) * (box[3] - box[1])
+        if new_area <= 0 or (ix2 - ix1) * (iy2 - iy1) / new_area < self.min_overlap:
+            return False
+
+        old_patch = old_gray[iy1 - old_box[1]:iy2 - old_box[1], ix1 - old_box[0]:ix2 - old_box[0]]
+        new_patch = _to_gray(crop)[iy1 - box[1]:iy2 - box[1], ix1 - box[0]:ix2 - box[0]]
+        if old_patch.shape != new_patch.shape or old_patch.size == 0:
+            return False
+        old_thumb, new_thumb = self._thumbnail(old_patch), self._thumbnail(new_patch)
+        ncc = float(cv2.matchTemplate(new_thumb, old_thumb, cv2.TM_CCOEFF_NORMED)[0][0])
+        return ncc >= self.min_ncc
+
+    def lookup(self, class_name: str, box, crop):
+        """
+        Trả về (homography cho crop mới, nguồn ảnh gốc) nếu dùng lại được, ngược lại None.
+        """
+        start = time.perf_counter()
+        entry = self._entry
+        reusable = (
+            entry is not None and entry['class_name'] == class_name
+            and max(abs(a - b) for a, b in zip(box, entry['box'])) <= self.box_tolerance
+            and self._same_scene(box, crop)
+        )
+        check_ms = (time.perf_counter() - start) * 1000
+
+        if not reusable:
+            self.misses += 1
+            logger.info(f"HomographyCache[{self.name}]: không dùng lại được, ước lượng lại. {self._stats()}")
+            return None
+
+        self.hits += 1
+        if self._full_ms is not None:
+            self.saved_ms += max(0.0, self._full_ms - check_ms)
+        logger.info(
+            f"HomographyCache[{self.name}]: dùng lại homography (kiểm tra {check_ms:.1f} ms). {self._stats()}"
+        )
+        H_crop = entry['H_frame'] @ _translation(box[0], box[1])
+        return H_crop / H_crop[2, 2], entry['source']
+
+    def _stats(self) -> str:
+        total = self.hits + self.misses
+        return (f"Tỉ lệ trúng cache {self.hits}/{total} ({100.0 * self.hits / total:.0f}%), "
+                f"tiết kiệm tổng ~{self.saved_ms:.0f} ms")
+
+    def store(self, class_name: str, box, crop, H_crop: np.ndarray, source: str, elapsed_ms: float):
+        """Lưu homography vừa ước lượng đầy đủ (đổi sang tọa độ frame) cho lần sau."""
+        self._full_ms = elapsed_ms if self._full_ms is None else 0.8 * self._full_ms + 0.2 * elapsed_ms
+        self._entry = {
+            'class_name': class_name,
+            'box': tuple(int(v) for v in box),
+            'gray': _to_gray(crop).copy(),
+            'H_frame': H_crop @ _translation(-box[0], -box[1]),
+            'source': source,
+        }
+
+    def invalidate(self):
+        self._entry = None
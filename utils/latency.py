@@ -0,0 +1,131 @@
+# utils/latency.py
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# ======================================================================
+# CHÚ THÍCH: ĐỘ LỆCH THỜI GIAN GIỮA TRIGGER VÀ CAMERA
+# Mọi mốc thời gian đều theo time.monotonic (giây):
+#   - trigger_time: lúc BluetoothTrigger.on_press nhận được sự kiện phím.
+#   - frame_time:   lúc luồng chụp của Camera nhận được frame từ driver.
+# Một khoảnh khắc thực tế đến ứng dụng qua hai đường có độ trễ khác nhau
+# (Bluetooth/HID cho trigger; cảm biến -> USB -> driver cho camera). Độ lệch
+#   offset = trigger_time - frame_time (của frame chụp đúng khoảnh khắc bóp cò)
+# được đo bằng benchmarks/calibrate_trigger_offset.py; lúc bắn, frame được chọn là frame
+# có frame_time gần nhất với trigger_time - offset.
+# ======================================================================
+
+def target_frame_time(trigger_time: float, offset_ms: float) -> float:
+    """Mốc frame_time cần tìm cho một trigger, sau khi bù độ lệch đã hiệu chỉnh."""
+    return trigger_time - offset_ms / 1000.0
+
+def roi_brightness(frame, roi=None) -> float:
+    """Độ sáng trung bình (thang xám 0-255) của vùng `roi` = (x, y, w, h); None = cả frame."""
+    if roi is not None:
+        x, y, w, h = roi
+        frame = frame[y:y + h, x:x + w]
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return float(frame.mean())
+
+def find_step(times, values, start: float, end: float, baseline_s: float = 0.3, threshold: float = 20.0):
+    """
+    Tìm mốc thời gian đầu tiên trong [start, end] mà tín hiệu lệch khỏi mức nền quá `threshold`.
+    Mức nền là trung vị tín hiệu trong `baseline_s` giây ngay trước `start`.
+
+    Args:
+        times, values: Chuỗi mốc thời gian frame (tăng dần) và tín hiệu tương ứng (vd. độ sáng ROI).
+
+    Returns:
+        Mốc thời gian của frame đầu tiên vượt ngưỡng, hoặc None nếu không có.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    before = values[(times >= start - baseline_s) & (times < start)]
+    if before.size == 0:
+        return None
+    baseline = np.median(before)
+    window = np.nonzero((times >= start) & (times <= end) & (np.abs(values - baseline) > threshold))[0]
+    return float(times[window[0]]) if window.size else None
+
+def summarize_offsets(offsets_ms) -> dict:
+    """
+    Thống kê các lần đo độ lệch (ms). Dùng trung vị (và MAD) để một lần đo hỏng
+    (bấm lệch, nhiễu sáng) không kéo lệch kết quả.
+    """
+    offsets = np.asarray(offsets_ms, dtype=np.float64)
+    if offsets.size == 0:
+        return {'count': 0}
+    median = float(np.median(offsets))
+    return {
+        'count': int(offsets.size),
+        'median_ms': median,
+        'mad_ms': float(np.median(np.abs(offsets - median))),
+        'min_ms': float(offsets.min()),
+        'max_ms': float(offsets.max()),
+    }
+
+class FrameRecorder:
+    """Luồng nền ghi lại (mốc thời gian, độ sáng ROI) của mọi frame từ luồng chụp của một Camera."""
+    def __init__(self, cam, roi=None):
+        self.cam = cam
+        self.roi = roi
+        self.times, self.values = [], []
+        self.missed = 0 # Frame luồng chụp đã ghi đè trước khi kịp đọc
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+
+    def _run(self):
+        seq = -1
+        while not self._stop.is_set():
+            latest = self.cam.ring.wait_newer(seq, timeout=0.5)
+            if latest is None:
+                continue
+            if seq >= 0 and latest[0] > seq + 1:
+                self.missed += latest[0] - seq - 1
+            seq, timestamp, frame = latest
+            self.times.append(timestamp)
+            self.values.append(roi_brightness(frame, self.roi))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(1.0)
+
+def measure_flash_latency(recorder: FrameRecorder, flashes: int = 10, threshold: float = 20.0,
+                          window: str = "latency", period_s: float = 0.6):
+    """
+    Đo độ trễ từ màn hình tới ứng dụng (glass-to-app, gồm cả độ trễ hiển thị của màn hình):
+    nháy một cửa sổ toàn màn hình đen/trắng trước camera và tìm frame đầu tiên sáng lên sau mỗi lần nháy.
+    `recorder` phải đang chạy và vùng ROI của nó phải nhìn vào màn hình.
+
+    Returns:
+        Danh sách độ trễ (ms) theo từng lần nháy; None cho lần không thấy màn hình sáng lên.
+    """
+    cv2.namedWindow(window, cv2.WND_PROP_FULLSCREEN)
+    cv2.setWindowProperty(window, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    black = np.zeros((720, 1280, 3), np.uint8)
+    white = np.full_like(black, 255)
+    cv2.imshow(window, black)
+    cv2.waitKey(1000)
+
+    flash_times = []
+    for _ in range(flashes):
+        cv2.imshow(window, white)
+        cv2.waitKey(1)
+        flash_times.append(time.monotonic())
+        cv2.waitKey(int(period_s * 1000))
+        cv2.imshow(window, black)
+        cv2.waitKey(int(period_s * 1000))
+    cv2.destroyWindow(window)
+    cv2.waitKey(1)
+
+    latencies = []
+    for flash_time in flash_times:
+        frame_time = find_step(recorder.times, recorder.values, flash_time, flash_time + period_s, threshold=threshold)
+        latencies.append((frame_time - flash_time) * 1000 if frame_time is not None else None)
+    return latencies
@@ -0,0 +1,105 @@
+# utils/matching.py
+import cv2
+import numpy as np
+
+# Thông số chỉ mục LSH cho descriptor nhị phân (ORB)
+FLANN_INDEX_LSH = 6
+LSH_INDEX_PARAMS = {'algorithm': FLANN_INDEX_LSH, 'table_number': 6, 'key_size': 12, 'multi_probe_level': 1}
+LSH_SEARCH_PARAMS = {'checks': 50}
+
+def _knn2_bruteforce(query: np.ndarray, train: np.ndarray):
+    """
+    Tìm 2 láng giềng gần nhất theo khoảng cách Hamming, trả về trực tiếp mảng NumPy.
+
+    Returns:
+        (dist, idx): hai mảng (len(query), 2); idx = -1 nếu không đủ láng giềng.
+    """
+    if len(train) < 2:
+        dist = np.full((len(query), 2), np.inf, dtype=np.float32)
+        idx = np.full((len(query), 2), -1, dtype=np.int32)
+        if len(train) == 1:
+            dist[:, 0] = cv2.batchDistance(query, train, cv2.CV_32S, normType=cv2.NORM_HAMMING)[0][:, 0]
+            idx[:, 0] = 0
+        return dist, idx
+    dist, idx = cv2.batchDistance(query, train, cv2.CV_32S, normType=cv2.NORM_HAMMING, K=2)
+    return dist.astype(np.float32), idx
+
+def _ratio_mask(dist: np.ndarray, idx: np.ndarray, ratio_thresh: float) -> np.ndarray:
+    """Lowe's ratio test trên mảng; điểm thiếu láng giềng thứ hai bị loại."""
+    return (idx[:, 1] >= 0) & (dist[:, 0] < ratio_thresh * dist[:, 1])
+
+class BruteForceMatcher:
+    """
+    So khớp vét cạn descriptor ORB của ảnh crop với một ảnh bia gốc.
+    Lọc ratio test và lọc tương hỗ (mutual) đều thực hiện trên mảng NumPy.
+    """
+    kind = 'bf'
+
+    def __init__(self, ref_descriptors: np.ndarray):
+        self.ref_descriptors = ref_descriptors
+
+    def _knn_to_reference(self, query: np.ndarray):
+        return _knn2_bruteforce(query, self.ref_descriptors)
+
+    def match(self, crop_descriptors: np.ndarray, ratio_thresh: float = 0.75):
+        """
+        Tìm các cặp match tương hỗ giữa ảnh gốc và ảnh crop.
+
+        Returns:
+            (ref_idx, crop_idx): hai mảng int cùng độ dài, cặp thứ i là một match tương hỗ.
+        """
+        empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+        if crop_descriptors is None or len(crop_descriptors) < 2 or len(self.ref_descriptors) < 2:
+            return empty
+
+        # Chiều crop -> gốc
+        dist_cr, idx_cr = self._knn_to_reference(crop_descriptors)
+        good_crop = np.flatnonzero(_ratio_mask(dist_cr, idx_cr, ratio_thresh))
+        if good_crop.size == 0:
+            return empty
+
+        # Chiều gốc -> crop: chỉ cần xét các điểm gốc đã được chọn ở chiều thuận,
+        # tập kết quả giống hệt việc match toàn bộ ảnh gốc nhưng rẻ hơn nhiều
+        candidate_ref = np.unique(idx_cr[good_crop, 0])
+        dist_rc, idx_rc = _knn2_bruteforce(self.ref_descriptors[candidate_ref], crop_descriptors)
+        good_ref = _ratio_mask(dist_rc, idx_rc, ratio_thresh)
+
+        # Tra ngược: điểm gốc r -> điểm crop tốt nhất của r (hoặc -1 nếu không qua ratio test)
+        best_crop_of_ref = np.full(len(self.ref_descriptors), -1, dtype=np.int64)
+        best_crop_of_ref[candidate_ref[good_ref]] = idx_rc[good_ref, 0]
+
+        ref_idx = idx_cr[good_crop, 0]
+        mutual = best_crop_of_ref[ref_idx] == good_crop
+        return ref_idx[mutual], good_crop[mutual]
+
+class FlannLshMatcher(BruteForceMatcher):
+    """
+    So khớp dùng chỉ mục FLANN-LSH được huấn luyện một lần cho mỗi ảnh bia gốc.
+    Chiều crop -> gốc tra chỉ mục, chiều ngược lại vẫn vét cạn trên tập ứng viên nhỏ.
+    """
+    kind = 'flann'
+
+    def __init__(self, ref_descriptors: np.ndarray):
+        super().__init__(ref_descriptors)
+        self.flann = cv2.FlannBasedMatcher(LSH_INDEX_PARAMS, LSH_SEARCH_PARAMS)
+        self.flann.add([ref_descriptors])
+        self.flann.train()
+
+    def _knn_to_reference(self, query: np.ndarray):
+        dist = np.full((len(query), 2), np.inf, dtype=np.float32)
+        idx = np.full((len(query), 2), -1, dtype=np.int32)
+        for i, neighbours in enumerate(self.flann.knnMatch(query, k=2)):
+            for j, m in enumerate(neighbours[:2]):
+                dist[i, j] = m.distance
+                idx[i, j] = m.trainIdx
+        return dist, idx
+
+MATCHERS = {
+    'bf': BruteForceMatcher,
+    'flann': FlannLshMatcher,
+}
+
+def create_matcher(ref_descriptors: np.ndarray, kind: str = 'bf'):
+    if kind not in MATCHERS:
+        raise ValueError(f"Loại matcher không hợp lệ: '{kind}'. Hỗ trợ: {', '.join(MATCHERS)}")
+    return MATCHERS[kind](ref_descriptors)
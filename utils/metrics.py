@@ -0,0 +1,270 @@
+# utils/metrics.py
+import bisect
+import functools
+import glob
+import json
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Biên các bucket của histogram độ trễ (ms); bucket cuối là +Inf
+DEFAULT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+EXPORT_FORMATS = ('json', 'prometheus')
+
+class Counter:
+    """Bộ đếm tăng dần."""
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class Histogram:
+    """Histogram độ trễ với bucket cố định: mỗi lần ghi chỉ là một phép tìm nhị phân và vài phép cộng."""
+    def __init__(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Ước lượng phân vị từ bucket (nội suy tuyến tính trong bucket chứa phân vị)."""
+        with self._lock:
+            counts, total, max_value = list(self.counts), self.count, self.max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen, lower = 0, 0.0
+        for i, count in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else max_value
+            if count and seen + count >= rank:
+                return min(max_value, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+            lower = upper
+        return max_value
+
+class _Timer:
+    """Đo thời gian một khối lệnh (ms) và ghi vào histogram; dùng được như context manager hoặc decorator."""
+    def __init__(self, registry, name: str):
+        self.registry = registry
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter() if self.registry.enabled else None
+        return self
+
+    def __exit__(self, *exc):
+        if self._start is not None:
+            self.registry.observe(self.name, (time.perf_counter() - self._start) * 1000)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.registry, self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+class MetricsRegistry:
+    """
+    Tập hợp counter và histogram của một tiến trình. Metric được tạo tự động ở lần dùng đầu tiên.
+    Khi `enabled` = False mọi lời gọi gần như không tốn chi phí.
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        metric = self.counters.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.counters.setdefault(name, Counter(name, help_text))
+        return metric
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS_MS) -> Histogram:
+        metric = self.histograms.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.histograms.setdefault(name, Histogram(name, help_text, buckets))
+        return metric
+
+    def inc(self, name: str, amount: float = 1):
+        if self.enabled:
+            self.counter(name).inc(amount)
+
+    def observe(self, name: str, value_ms: float):
+        if self.enabled:
+            self.histogram(name).observe(value_ms)
+
+    def timer(self, name: str) -> _Timer:
+        return _Timer(self, name)
+
+    def snapshot(self) -> dict:
+        """Ảnh chụp toàn bộ metric dưới dạng dict (dùng cho xuất JSON)."""
+        histograms = {}
+        for name, h in list(self.histograms.items()):
+            histograms[name] = {
+                'count': h.count, 'sum_ms': round(h.sum, 3), 'max_ms': round(h.max, 3),
+                'mean_ms': round(h.sum / h.count, 3) if h.count else 0.0,
+                'p50_ms': round(h.quantile(0.5), 3), 'p95_ms': round(h.quantile(0.95), 3),
+                'p99_ms': round(h.quantile(0.99), 3),
+                'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], h.counts)),
+            }
+        return {
+            'timestamp': time.time(),
+            'pid': os.getpid(),
+            'counters': {name: c.value for name, c in list(self.counters.items())},
+            'histograms': histograms,
+        }
+
+    def to_prometheus(self, prefix: str = "simpleapp_", labels: dict = None) -> str:
+        """
+        Xuất theo định dạng văn bản của Prometheus (node_exporter textfile collector đọc được).
+        `labels` được gắn vào mọi series, để file của các tiến trình khác nhau không trùng series.
+        """
+        base = ",".join(f'{key}="{value}"' for key, value in (labels or {}).items())
+        plain = f"{{{base}}}" if base else ""
+        bucket = (base + ",") if base else ""
+        lines = []
+        for name, c in sorted(self.counters.items()):
+            metric = f"{prefix}{name}_total"
+            if c.help:
+                lines.append(f"# HELP {metric} {c.help}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{plain} {c.value}")
+        for name, h in sorted(self.histograms.items()):
+            metric = f"{prefix}{name}"
+            if h.help:
+                lines.append(f"# HELP {metric} {h.help}")
+            lines.append(f"# TYPE {metric} histogram")
+            with h._lock:
+                counts, total, value_sum = list(h.counts), h.count, h.sum
+            cumulative = 0
+            for bound, count in zip(list(h.buckets) + [math.inf], counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                lines.append(f'{metric}_bucket{{{bucket}le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{plain} {value_sum:.3f}")
+            lines.append(f"{metric}_count{plain} {total}")
+        return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """Luồng nền ghi metric ra file theo chu kỳ (ghi file tạm rồi đổi tên để không bao giờ đọc phải file dở)."""
+    def __init__(self, registry: MetricsRegistry, path: str, fmt: str = 'prometheus', interval_s: float = 10.0,
+                 labels: dict = None):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Định dạng xuất metric không hợp lệ: '{fmt}'. Chọn một trong {EXPORT_FORMATS}")
+        self.registry = registry
+        self.path = path
+        self.fmt = fmt
+        self.interval_s = interval_s
+        self.labels = labels or {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Metrics: Xuất metric ra '{self.path}' mỗi {self.interval_s:g} giây ({self.fmt}).")
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.export()
+
+    def export(self):
+        if self.fmt == 'json':
+            content = json.dumps(dict(self.registry.snapshot(), labels=self.labels), ensure_ascii=False, indent=2)
+        else:
+            content = self.registry.to_prometheus(labels=self.labels)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            logger.warning(f"Metrics: Không ghi được file metric '{self.path}': {e}")
+
+    def stop(self):
+        """Dừng luồng nền và xóa file metric, để collector không đọc mãi số liệu của tiến trình đã thoát."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(self.interval_s)
+        remove_export_file(self.path)
+
+# Registry dùng chung trong một tiến trình
+REGISTRY = MetricsRegistry()
+
+def inc(name: str, amount: float = 1):
+    REGISTRY.inc(name, amount)
+
+def observe(name: str, value_ms: float):
+    REGISTRY.observe(name, value_ms)
+
+def timer(name: str) -> _Timer:
+    """Ví dụ: `with metrics.timer('yolo_detect_ms'): ...` hoặc `@metrics.timer('db_add_shot_ms')`."""
+    return _Timer(REGISTRY, name)
+
+def _is_child_process() -> bool:
+    return multiprocessing.current_process().name != 'MainProcess'
+
+def export_path(base_path: str, fmt: str, pid: int = None) -> str:
+    """
+    Đường dẫn file metric của tiến trình hiện tại; tiến trình con ghi file riêng có kèm pid.
+    Truyền `pid` để lấy đường dẫn file của một tiến trình con cụ thể (vd. khi nó đã chết).
+    """
+    ext = '.json' if fmt == 'json' else '.prom'
+    if pid is None and _is_child_process():
+        pid = os.getpid()
+    if pid is not None:
+        return f"{base_path}-{pid}{ext}"
+    return base_path + ext
+
+def process_labels() -> dict:
+    """Nhãn phân biệt series của tiến trình chính và từng tiến trình xử lý con."""
+    return {'process': f"worker-{os.getpid()}" if _is_child_process() else "main"}
+
+def remove_export_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Metrics: Không xóa được file metric '{path}': {e}")
+
+def start_exporter(enabled: bool, base_path: str, fmt: str = 'prometheus', interval_s: float = 10.0):
+    """Bật/tắt thu thập metric cho tiến trình hiện tại và khởi động luồng xuất file nếu bật."""
+    REGISTRY.enabled = enabled
+    if not enabled:
+        return None
+    if not _is_child_process():
+        # File của tiến trình con từ lần chạy trước (bị dừng đột ngột, không kịp tự xóa)
+        ext = '.json' if fmt == 'json' else '.prom'
+        for stale in glob.glob(f"{glob.escape(base_path)}-*{ext}"):
+            remove_export_file(stale)
+    exporter = MetricsExporter(REGISTRY, export_path(base_path, fmt), fmt, interval_s, labels=process_labels())
+    exporter.start()
+    return exporter
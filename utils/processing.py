@@ -3,22 +3,72 @@ import numpy as np
 from typing import Optional, Tuple, List
 import os
 
+from utils.features import compute_features
+from utils.matching import create_matcher
+from utils import metrics
+
 def friendly_object_name(filename: str) -> str:
     base = filename.split('/')[-1]
     name, _ = base.split('.') if '.' in base else (base, '')
     return name.replace('_', ' ')
 
-def check_object_center(detections, image, calibrated_center):
+def crop_to_aspect(frame, aspect_ratio: float = 3.0 / 4.0):
+    """Cắt phần giữa frame theo tỉ lệ rộng/cao, giữ nguyên độ phân giải gốc."""
+    h, w = frame.shape[:2]
+    new_w = int(h * aspect_ratio)
+    start_x = (w - new_w) // 2 if w > new_w else 0
+    return frame[:, start_x : start_x + new_w]
+
+def map_hit_to_hires(hit_info, small_shape, hires_frame):
+    """
+    Quy đổi kết quả trúng tìm được trên frame thu nhỏ sang frame độ phân giải cao
+    (cùng vùng nhìn), để bước so khớp ORB dùng ảnh crop nhiều chi tiết hơn.
+    Tọa độ tâm ngắm tuyệt đối vẫn giữ theo frame thu nhỏ.
+    """
+    sh, sw = small_shape[:2]
+    hh, hw = hires_frame.shape[:2]
+    sx, sy = hw / sw, hh / sh
+    x1, y1, x2, y2 = hit_info['box']
+    hx1, hy1 = max(0, int(x1 * sx)), max(0, int(y1 * sy))
+    hx2, hy2 = min(hw, int(round(x2 * sx))), min(hh, int(round(y2 * sy)))
+    center_x, center_y = hit_info['shot_point_absolute']
+
+    mapped = dict(hit_info)
+    mapped['box'] = (hx1, hy1, hx2, hy2)
+    mapped['crop'] = hires_frame[hy1:hy2, hx1:hx2].copy()
+    mapped['shot_point_relative'] = (center_x * sx - hx1, center_y * sy - hy1)
+    return mapped
+
+def aim_point(image, calibrated_center):
+    """Trả về tâm ngắm đã hiệu chỉnh, hoặc tâm ảnh nếu chưa hiệu chỉnh."""
     if calibrated_center:
-        center_x, center_y = calibrated_center
-    else:
-        h, w, _ = image.shape
-        center_x, center_y = w // 2, h // 2
+        return calibrated_center
+    h, w = image.shape[:2]
+    return w // 2, h // 2
+
+def box_contains(box, point):
+    x1, y1, x2, y2 = box
+    return x1 <= point[0] <= x2 and y1 <= point[1] <= y2
+
+def frame_signature(image, size=(64, 48)) -> np.ndarray:
+    """Ảnh xám thu nhỏ của frame, dùng để so sánh nhanh hai khung cảnh."""
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small
+
+def signature_difference(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Độ lệch tuyệt đối trung bình (0-255) giữa hai chữ ký frame."""
+    if sig_a is None or sig_b is None or sig_a.shape != sig_b.shape:
+        return float('inf')
+    return float(cv2.absdiff(sig_a, sig_b).mean())
+
+def check_object_center(detections, image, calibrated_center):
+    center_x, center_y = aim_point(image, calibrated_center)
 
     highest_conf_hit = None
     for det in detections:
-        x1, y1, x2, y2 = det['box']
-        if x1 <= center_x <= x2 and y1 <= center_y <= y2:
+        if box_contains(det['box'], (center_x, center_y)):
             if highest_conf_hit is None or det['conf'] > highest_conf_hit['conf']:
                 highest_conf_hit = det
 
@@ -30,6 +80,7 @@ def check_object_center(detections, image, calibrated_center):
             'crop': image[y1:y2, x1:x2].copy(),
             'shot_point_relative': (center_x - x1, center_y - y1),
             'shot_point_absolute': (center_x, center_y), # Đảm bảo trả về tọa độ tuyệt đối
+            'box': (x1, y1, x2, y2),
             'conf': highest_conf_hit['conf']
         }
         print(f"✅ TRÚNG | Mục tiêu: {hit_info['name']} (Conf: {hit_info['conf']:.2f})")
@@ -38,168 +89,151 @@ def check_object_center(detections, image, calibrated_center):
     print("❌ TRƯỢT | Tâm ngắm không nằm trong bất kỳ mục tiêu nào.")
     return "TRƯỢT", {'shot_point': (center_x, center_y)}
 
-def warp_crop_to_original(
+# Các bộ ước lượng homography bền vững có thể chọn (USAC cần OpenCV >= 4.5)
+ROBUST_ESTIMATORS = {
+    'ransac': cv2.RANSAC,
+    'usac_default': cv2.USAC_DEFAULT,
+    'usac_fast': cv2.USAC_FAST,
+    'usac_accurate': cv2.USAC_ACCURATE,
+    'magsac': cv2.USAC_MAGSAC,
+}
+
+def robust_homography(
+    src_pts: np.ndarray,
+    dst_pts: np.ndarray,
+    method: str = 'ransac',
+    ransac_thresh: float = 4.0,
+    max_iters: int = 2000,
+    confidence: float = 0.995,
+) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Ước lượng homography từ src_pts sang dst_pts với bộ ước lượng được chọn.
+
+    Returns:
+        (H hoặc None, số inlier).
+    """
+    if method not in ROBUST_ESTIMATORS:
+        raise ValueError(f"Bộ ước lượng không hợp lệ: '{method}'. Hỗ trợ: {', '.join(ROBUST_ESTIMATORS)}")
+    H, inlier_mask = cv2.findHomography(
+        src_pts, dst_pts, ROBUST_ESTIMATORS[method], ransac_thresh,
+        maxIters=max_iters, confidence=confidence,
+    )
+    inliers = int(inlier_mask.sum()) if inlier_mask is not None else 0
+    return H, inliers
+
+def transform_point(H: np.ndarray, point: Tuple[float, float]) -> Tuple[float, float]:
+    """Biến đổi một điểm (x, y) bằng ma trận homography."""
+    src_pt = np.array([[[float(point[0]), float(point[1])]]], dtype=np.float32)
+    warped_pt = cv2.perspectiveTransform(src_pt, H)[0][0]
+    return float(warped_pt[0]), float(warped_pt[1])
+
+def estimate_homography(
     original_img: np.ndarray,
     obj_crop: np.ndarray,
     shot_point: Optional[Tuple[float, float]] = None,
     min_inliers: int = 5,
     ratio_thresh: float = 0.75,
     ransac_thresh: float = 4.0,
-    max_reproj: float = 5.0,
-) -> Tuple[Optional[np.ndarray], Optional[Tuple[float, float]]]:
+    ref_features: Optional[dict] = None,
+    crop_features: Optional[dict] = None,
+    cancel_event=None,
+    method: str = 'ransac',
+    max_iters: int = 2000,
+    confidence: float = 0.995,
+) -> Optional[dict]:
+    """
+    Ước lượng homography từ ảnh crop sang ảnh bia gốc, không warp ảnh.
+
+    `ref_features`/`crop_features` là đặc trưng tính sẵn bằng `compute_features`
+    (ví dụ lấy từ bộ tài sản bia, xem utils.targets); nếu None thì sẽ tính trực tiếp.
+    Nếu `ref_features` có sẵn 'matcher' (xem utils.matching) thì dùng matcher đó.
+    `cancel_event` (threading.Event) cho phép dừng sớm giữa các bước khi kết quả không còn cần.
+    `method`, `ransac_thresh`, `max_iters`, `confidence` chọn bộ ước lượng (xem ROBUST_ESTIMATORS).
+
+    Returns:
+        None nếu thất bại, ngược lại dict gồm:
+        'H' (ma trận 3x3), 'point' (tọa độ vết đạn trên ảnh gốc hoặc None),
+        'matches' (số match tương hỗ), 'inliers' và 'inlier_ratio' (dùng làm điểm chất lượng).
+    """
     if original_img is None or obj_crop is None:
-        print("[warp_crop_to_original] ERROR: Ảnh đầu vào bị None")
-        return None, None
+        print("[estimate_homography] ERROR: Ảnh đầu vào bị None")
+        return None
 
-    orb = cv2.ORB_create(nfeatures=1500, scaleFactor=1.2, edgeThreshold=15, patchSize=31)
-    kp1, des1 = orb.detectAndCompute(original_img, None)
-    kp2, des2 = orb.detectAndCompute(obj_crop, None)
+    if ref_features is None:
+        ref_features = compute_features(original_img)
+    if crop_features is None:
+        crop_features = compute_features(obj_crop)
 
-    if des1 is None or des2 is None or len(kp1) < 10 or len(kp2) < 10:
-        print("[warp_crop_to_original] Không đủ đặc trưng để match.")
-        return None, None
+    if ref_features is None or crop_features is None \
+            or len(ref_features['points']) < 10 or len(crop_features['points']) < 10:
+        print("[estimate_homography] Không đủ đặc trưng để match.")
+        return None
 
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING)
-    matches12 = bf.knnMatch(des1, des2, k=2)
-    matches21 = bf.knnMatch(des2, des1, k=2)
-    
-    # Lọc các điểm match tốt bằng Lowe's ratio test
-    good12 = [m for m, n in matches12 if m.distance < ratio_thresh * n.distance]
-    good21 = [m for m, n in matches21 if m.distance < ratio_thresh * n.distance]
-
-    # Lọc các điểm match tương hỗ (mutual matches)
-    mutual = []
-    reverse_map = {(m.trainIdx, m.queryIdx) for m in good21}
-    for m in good12:
-        if (m.queryIdx, m.trainIdx) in reverse_map:
-            mutual.append(m)
-
-    if len(mutual) < min_inliers:
-        print(f"[warp_crop_to_original] Mutual matches quá ít: {len(mutual)}")
-        return None, None
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    # Matcher gắn sẵn với ảnh gốc (đã huấn luyện một lần), mặc định so khớp vét cạn
+    matcher = ref_features.get('matcher') or create_matcher(ref_features['descriptors'])
+    with metrics.timer('feature_match_ms'):
+        ref_idx, crop_idx = matcher.match(crop_features['descriptors'], ratio_thresh)
 
-    src_pts = np.float32([kp1[m.queryIdx].pt for m in mutual]).reshape(-1, 1, 2)
-    dst_pts = np.float32([kp2[m.trainIdx].pt for m in mutual]).reshape(-1, 1, 2)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
 
-    H, mask = cv2.findHomography(dst_pts, src_pts, cv2.RANSAC, ransac_thresh)
+    if len(ref_idx) < min_inliers:
+        print(f"[estimate_homography] Mutual matches quá ít: {len(ref_idx)}")
+        return None
+
+    src_pts = ref_features['points'][ref_idx].reshape(-1, 1, 2)
+    dst_pts = crop_features['points'][crop_idx].reshape(-1, 1, 2)
+
+    with metrics.timer('homography_estimate_ms'):
+        H, inliers = robust_homography(dst_pts, src_pts, method, ransac_thresh, max_iters, confidence)
     if H is None or abs(np.linalg.det(H)) < 1e-6:
-        print("[warp_crop_to_original] Homography không hợp lệ hoặc suy biến.")
-        return None, None
+        print("[estimate_homography] Homography không hợp lệ hoặc suy biến.")
+        return None
 
     transformed_point = None
     if shot_point is not None:
         try:
-            px, py = float(shot_point[0]), float(shot_point[1])
-            src_pt = np.array([[[px, py]]], dtype=np.float32)
-            warped_pt = cv2.perspectiveTransform(src_pt, H)[0][0]
-            transformed_point = (float(warped_pt[0]), float(warped_pt[1]))
-            print(f"[warp_crop_to_original] Tọa độ vết đạn chuyển sang ảnh gốc: {transformed_point}")
+            transformed_point = transform_point(H, shot_point)
+            print(f"[estimate_homography] Tọa độ vết đạn chuyển sang ảnh gốc: {transformed_point}")
         except Exception as e:
-            print(f"[warp_crop_to_original] Lỗi chuyển tọa độ điểm: {e}")
+            print(f"[estimate_homography] Lỗi chuyển tọa độ điểm: {e}")
 
-    print("[warp_crop_to_original] Warp ảnh thành công")
-    warped = cv2.warpPerspective(obj_crop, H, (original_img.shape[1], original_img.shape[0]), flags=cv2.INTER_LINEAR)
-    return warped, transformed_point
+    return {
+        'H': H,
+        'point': transformed_point,
+        'matches': int(len(ref_idx)),
+        'inliers': inliers,
+        'inlier_ratio': inliers / len(ref_idx),
+    }
 
-#tính điểm bia 8
-def calculate_score_bia8(pt: Tuple[float, float], original_img: np.ndarray, mask: np.ndarray) -> int:
+@metrics.timer('warp_crop_to_original_ms')
+def warp_crop_to_original(
+    original_img: np.ndarray,
+    obj_crop: np.ndarray,
+    shot_point: Optional[Tuple[float, float]] = None,
+    min_inliers: int = 5,
+    ratio_thresh: float = 0.75,
+    ransac_thresh: float = 4.0,
+    max_reproj: float = 5.0,
+    ref_features: Optional[dict] = None,
+    crop_features: Optional[dict] = None,
+) -> Tuple[Optional[np.ndarray], Optional[Tuple[float, float]]]:
     """
-    Tính điểm cho bia số 8 dựa trên các vòng elip.
+    Ước lượng homography rồi warp toàn bộ ảnh crop sang khung ảnh bia gốc.
+    Chỉ dùng khi thực sự cần ảnh warp (ví dụ overlay để debug); nếu chỉ cần
+    tọa độ vết đạn thì gọi `estimate_homography` để bỏ qua bước warpPerspective.
     """
-    if pt is None or mask is None or original_img is None:
-        return 0
-
-    x, y = int(pt[0]), int(pt[1])
-    # Lấy kích thước từ ảnh gốc thay vì ảnh mask để đảm bảo chính xác
-    h, w = original_img.shape[:2]
-
-    if not (0 <= y < h and 0 <= x < w) or mask[y, x] == 0:
-        return 0
-
-    center_x, center_y = 87, 116
-
-    ellipse_rings = [
-        {'score': 10, 'width': 42,  'height': 63},
-        {'score': 9,  'width': 84, 'height': 126},
-        {'score': 8,  'width': 126, 'height': 190},
-        {'score': 7,  'width': 172, 'height': 258},
-        {'score': 6,  'width': 216, 'height': 324},
-        {'score': 5,  'width': 260, 'height': 324},
-        {'score': 4,  'width': 304, 'height': 456},
-        {'score': 3,  'width': 348, 'height': 522},
-        {'score': 2,  'width': 392, 'height': 588},
-        {'score': 1,  'width': 436, 'height': 654}
-    ]
-
-    for ring in ellipse_rings:
-        a = ring['width'] / 2.0
-        b = ring['height'] / 2.0
-        if a > 0 and b > 0:
-            check = ((x - center_x)**2 / a**2) + ((y - center_y)**2 / b**2)
-            if check <= 1:
-                return ring['score']
-    
-    return 0
+    result = estimate_homography(
+        original_img, obj_crop, shot_point,
+        min_inliers=min_inliers, ratio_thresh=ratio_thresh, ransac_thresh=ransac_thresh,
+        ref_features=ref_features, crop_features=crop_features,
+    )
+    if result is None:
+        return None, None
 
-#tính điểm bia 7
-def calculate_score_bia7(pt: Tuple[float, float], original_img: np.ndarray, mask: np.ndarray) -> int:
-    """
-    Tính điểm cho bia số 7 dựa trên các vòng elip.
-    """
-    if pt is None or mask is None or original_img is None:
-        return 0
-
-    x, y = int(pt[0]), int(pt[1])
-    # Lấy kích thước từ ảnh gốc thay vì ảnh mask để đảm bảo chính xác
-    h, w = original_img.shape[:2]
-
-    if not (0 <= y < h and 0 <= x < w) or mask[y, x] == 0:
-        return 0
-
-    center_x, center_y = 136, 177
-
-    ellipse_rings = [
-        {'score': 10, 'width': 63,  'height': 95},
-        {'score': 9,  'width': 126, 'height': 190},
-        {'score': 8,  'width': 189, 'height': 284},
-        {'score': 7,  'width': 252, 'height': 378},
-        {'score': 6,  'width': 309, 'height': 464},
-        {'score': 5,  'width': 375, 'height': 562},
-        {'score': 4,  'width': 436, 'height': 654},
-        {'score': 3,  'width': 497, 'height': 746},
-        {'score': 2,  'width': 557, 'height': 836},
-        {'score': 1,  'width': 613, 'height': 920}
-    ]
-
-    for ring in ellipse_rings:
-        a = ring['width'] / 2.0
-        b = ring['height'] / 2.0
-        if a > 0 and b > 0:
-            check = ((x - center_x)**2 / a**2) + ((y - center_y)**2 / b**2)
-            if check <= 1:
-                return ring['score']
-    
-    return 0
-
-#tính điểm bia số 4
-def calculate_score_bia4(pt: Tuple[float, float], original_img: np.ndarray, mask: np.ndarray) -> int:
-    if original_img is None or mask is None or pt is None:
-        return 0
-    x, y = int(pt[0]), int(pt[1])
-    h, w = original_img.shape[:2]
-    if not (0 <= x < w and 0 <= y < h):
-        return 0
-
-    center_x, center_y = w // 2, h // 2
-    distance = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
-    
-    # Kiểm tra xem điểm chạm có nằm trong vùng hợp lệ của bia không
-    if mask[y, x] == 255:
-        if distance < 56: return 10
-        elif distance < 116: return 9
-        elif distance < 173: return 8
-        elif distance < 230: return 7
-        elif distance < 285: return 6
-        elif distance < 320: return 5
-    
-    return 0
\ No newline at end of file
+    print("[warp_crop_to_original] Warp ảnh thành công")
+    warped = cv2.warpPerspective(obj_crop, result['H'], (original_img.shape[1], original_img.shape[0]), flags=cv2.INTER_LINEAR)
+    return warped, result['point']
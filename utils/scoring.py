@@ -0,0 +1,76 @@
+# utils/scoring.py
+import numpy as np
+from typing import Tuple
+
+def _fit_mask(mask: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Cắt/đệm mask về đúng kích thước ảnh gốc, phần thiếu coi như nằm ngoài bia."""
+    fitted = np.zeros((h, w), dtype=mask.dtype)
+    mh, mw = min(h, mask.shape[0]), min(w, mask.shape[1])
+    fitted[:mh, :mw] = mask[:mh, :mw]
+    return fitted
+
+def build_score_raster(geometry: dict, image_shape, mask: np.ndarray) -> np.ndarray:
+    """
+    Biên dịch hình học vòng điểm + mask thành ảnh điểm uint8 cùng kích thước ảnh bia gốc.
+    Giá trị mỗi pixel là số điểm của phát bắn trúng pixel đó (0 nếu ngoài bia).
+
+    `geometry` lấy từ hồ sơ bia (core/target_profiles.json), tọa độ tính trên ảnh bia gốc:
+    - 'ellipse': vòng elip đồng tâm, điểm thuộc vòng nếu (dx/a)^2 + (dy/b)^2 <= 1.
+    - 'circle': vòng tròn đồng tâm, điểm thuộc vòng nếu khoảng cách < bán kính.
+    center = None nghĩa là lấy tâm ảnh. Vòng được xét theo thứ tự, vòng đầu tiên chứa điểm sẽ thắng.
+    'mask_value' (tùy chọn): chỉ pixel mask có đúng giá trị này mới thuộc bia.
+    """
+    h, w = image_shape[:2]
+    raster = np.zeros((h, w), dtype=np.uint8)
+    if mask is None:
+        return raster
+
+    center = geometry.get('center')
+    center_x, center_y = center if center is not None else (w // 2, h // 2)
+    ys, xs = np.mgrid[0:h, 0:w]
+    dx, dy = xs - center_x, ys - center_y
+
+    # Vẽ từ vòng ngoài vào trong để vòng trong (xét trước) ghi đè lên
+    for ring in reversed(geometry['rings']):
+        if geometry['type'] == 'circle':
+            inside = dx * dx + dy * dy < ring['radius'] ** 2
+        else:
+            a, b = ring['width'] / 2.0, ring['height'] / 2.0
+            if a <= 0 or b <= 0:
+                continue
+            inside = (dx ** 2 / a ** 2) + (dy ** 2 / b ** 2) <= 1
+        raster[inside] = ring['score']
+
+    mask = _fit_mask(mask, h, w)
+    mask_value = geometry.get('mask_value')
+    valid = (mask == mask_value) if mask_value is not None else (mask != 0)
+    raster[~valid] = 0
+    return raster
+
+def score_points(score_raster: np.ndarray, pts) -> np.ndarray:
+    """
+    Tính điểm cho nhiều phát bắn cùng lúc bằng một phép tra mảng.
+
+    Args:
+        score_raster: Ảnh điểm tạo bởi `build_score_raster`.
+        pts: Mảng (N, 2) tọa độ (x, y) trên ảnh bia gốc.
+
+    Returns:
+        Mảng uint8 (N,) số điểm của từng phát bắn, 0 nếu nằm ngoài ảnh hoặc ngoài bia.
+    """
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    scores = np.zeros(len(pts), dtype=np.uint8)
+    if score_raster is None or len(pts) == 0:
+        return scores
+    h, w = score_raster.shape[:2]
+    # Cắt phần thập phân giống int() để khớp với cách làm tròn trước đây
+    xs, ys = np.trunc(pts[:, 0]), np.trunc(pts[:, 1])
+    inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+    scores[inside] = score_raster[ys[inside].astype(np.intp), xs[inside].astype(np.intp)]
+    return scores
+
+def score_point(score_raster: np.ndarray, pt: Tuple[float, float]) -> int:
+    """Tính điểm cho một phát bắn."""
+    if pt is None:
+        return 0
+    return int(score_points(score_raster, [pt])[0])
@@ -0,0 +1,128 @@
+# utils/startup_profile.py
+import builtins
+import importlib.util
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class StartupProfiler:
+    """
+    Đo thời gian khởi động: thời gian import lần đầu của từng module (bọc builtins.__import__)
+    và các mốc khởi tạo (cửa sổ hiển thị, frame đầu tiên, worker sẵn sàng...).
+    Thời gian 'riêng' của một module đã trừ đi thời gian import các module con của nó.
+    """
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.imports = []  # (module, luồng, tổng ms, riêng ms, độ sâu)
+        self.marks = []    # (mốc, ms kể từ started_at, luồng)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    def install(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _pending_modules(self, name, globals, fromlist, level):
+        """Tên các module sắp được nạp lần đầu bởi lệnh import này (rỗng nếu đã nạp hết)."""
+        if level:
+            package = (globals or {}).get('__package__')
+            if not package:
+                return []
+            try:
+                name = importlib.util.resolve_name('.' * level + name, package)
+            except (ImportError, ValueError):
+                return []
+        if name not in sys.modules:
+            return [name]
+        # `from pkg import attr`: chỉ là module con cần nạp khi pkg chưa có thuộc tính đó
+        module = sys.modules[name]
+        return [
+            f"{name}.{item}" for item in fromlist or ()
+            if item != '*' and not hasattr(module, item) and f"{name}.{item}" not in sys.modules
+        ]
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        pending = self._pending_modules(name, globals, fromlist, level)
+        if not pending:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            children_ms = stack.pop()
+            if stack:
+                stack[-1] += total_ms
+            with self._lock:
+                self.imports.append((
+                    ", ".join(pending), threading.current_thread().name, total_ms, total_ms - children_ms, len(stack)
+                ))
+
+    def mark(self, stage: str):
+        elapsed_ms = (time.monotonic() - self.started_at) * 1000
+        with self._lock:
+            self.marks.append((stage, elapsed_ms, threading.current_thread().name))
+
+    def format_report(self, top: int = 25) -> str:
+        with self._lock:
+            imports, marks = list(self.imports), list(self.marks)
+        lines = ["Hồ sơ khởi động", "Các mốc khởi tạo (ms kể từ lúc chạy):"]
+        for stage, elapsed_ms, thread in marks:
+            lines.append(f"  {elapsed_ms:>9.0f}  {stage} [{thread}]")
+
+        per_thread = {}
+        for _, thread, total_ms, _, depth in imports:
+            if depth == 0:
+                per_thread[thread] = per_thread.get(thread, 0.0) + total_ms
+        lines.append("Tổng thời gian import theo luồng (ms):")
+        for thread, total_ms in sorted(per_thread.items(), key=lambda item: -item[1]):
+            lines.append(f"  {total_ms:>9.0f}  {thread}")
+
+        lines.append(f"{top} module import lâu nhất (ms, riêng / gồm module con):")
+        for module, thread, total_ms, self_ms, _ in sorted(imports, key=lambda item: -item[3])[:top]:
+            lines.append(f"  {self_ms:>9.1f} {total_ms:>9.1f}  {module} [{thread}]")
+        return "\n".join(lines)
+
+# Bộ đo của tiến trình hiện tại; None khi không chạy với --profile-startup
+_PROFILER = None
+_reported = False
+
+def enable(started_at=None) -> StartupProfiler:
+    """Bật đo thời gian khởi động. Cần gọi trước khi import các module nặng."""
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = StartupProfiler(started_at)
+        _PROFILER.install()
+    return _PROFILER
+
+def is_enabled() -> bool:
+    return _PROFILER is not None
+
+def mark(stage: str):
+    """Ghi một mốc khởi động; không làm gì nếu chưa bật."""
+    if _PROFILER is not None:
+        _PROFILER.mark(stage)
+
+def report(top: int = 25):
+    """In báo cáo khởi động (một lần) và gỡ bộ đo import."""
+    global _reported
+    if _PROFILER is None or _reported:
+        return
+    _reported = True
+    _PROFILER.uninstall()
+    logger.info(_PROFILER.format_report(top))
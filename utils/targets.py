@@ -0,0 +1,245 @@
+# utils/targets.py
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from utils.features import ORB_NFEATURES, ORB_PARAMS, PYRAMID_SCALES, compute_feature_pyramid
+from utils.homography_cache import HomographyCache
+from utils.matching import create_matcher
+from utils.scoring import build_score_raster
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi đổi cách bố trí file cache để cache cũ tự bị bỏ qua
+CACHE_FORMAT_VERSION = 1
+# Mỗi mảng trong file blob bắt đầu ở offset chia hết cho giá trị này
+_ALIGN = 64
+REQUIRED_FIELDS = ('label', 'image', 'mask', 'geometry')
+
+# ======================================================================
+# CHÚ THÍCH: HỒ SƠ BIA (TARGET PROFILE)
+# Mỗi loại bia được mô tả bằng một mục trong file JSON (mặc định core/target_profiles.json):
+#   "<key>": {
+#       "label": tên hiển thị, "aliases": [các tên class của YOLO ứng với bia này],
+#       "image": ảnh bia gốc, "image_alt": ảnh gốc thay thế (tùy chọn), "mask": mask của bia,
+#       "geometry": hình học vòng điểm (xem utils.scoring.build_score_raster)
+#   }
+# Thêm bia mới chỉ cần thêm một mục vào file, không cần viết thêm code.
+# ======================================================================
+
+def load_target_profiles(path: str) -> dict:
+    """
+    Đọc file hồ sơ bia và kiểm tra các trường bắt buộc.
+
+    Returns:
+        dict {key: profile}, giữ đúng thứ tự trong file.
+    """
+    with open(path, encoding="utf-8") as f:
+        profiles = json.load(f)
+    for key, profile in profiles.items():
+        missing = [field for field in REQUIRED_FIELDS if field not in profile]
+        if missing:
+            raise ValueError(f"Hồ sơ bia '{key}' trong '{path}' thiếu trường: {', '.join(missing)}")
+        profile.setdefault('aliases', [key])
+        profile.setdefault('image_alt', None)
+    return profiles
+
+def class_aliases(profiles: dict) -> dict:
+    """Ánh xạ tên class của model sang key hồ sơ bia."""
+    aliases = {}
+    for key, profile in profiles.items():
+        for name in profile['aliases']:
+            if name in aliases:
+                logger.warning(f"Tên class '{name}' bị khai báo ở cả '{aliases[name]}' và '{key}', dùng '{key}'.")
+            aliases[name] = key
+    return aliases
+
+def _profiles_signature(profiles: dict, scales) -> str:
+    """Chuỗi băm thay đổi khi hồ sơ, file nguồn hoặc thông số đặc trưng thay đổi."""
+    parts = [
+        f"v{CACHE_FORMAT_VERSION}",
+        f"orb={ORB_NFEATURES},{sorted(ORB_PARAMS.items())},scales={sorted(scales)}",
+        json.dumps(profiles, sort_keys=True, ensure_ascii=False),
+    ]
+    for profile in profiles.values():
+        for path in (profile['image'], profile['image_alt'], profile['mask']):
+            if path and os.path.exists(path):
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{int(stat.st_mtime)}")
+            else:
+                parts.append(f"{path}:missing")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+class PackedAssetCache:
+    """
+    Gói toàn bộ mảng tài sản (ảnh, mask, ảnh điểm, descriptor) vào một file blob nhị phân
+    kèm một file manifest JSON mô tả offset/dtype/shape của từng mảng.
+    Khi khởi động chỉ cần một lần memory-map file blob; mỗi mảng là một view vào vùng nhớ đó.
+    """
+    def __init__(self, cache_path: str):
+        self.blob_path = f"{cache_path}.bin"
+        self.manifest_path = f"{cache_path}.json"
+
+    def load(self, signature: str):
+        """Trả về (dict mảng, metadata) nếu cache còn khớp chữ ký, ngược lại None."""
+        if not os.path.exists(self.blob_path) or not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get('signature') != signature:
+                return None
+            # Chế độ copy-on-write: các mảng ghi được nhưng không bao giờ sửa vào file
+            blob = np.memmap(self.blob_path, dtype=np.uint8, mode='c')
+            arrays = {
+                name: np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']), buffer=blob, offset=spec['offset'])
+                for name, spec in manifest['arrays'].items()
+            }
+            return arrays, manifest['meta']
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Không đọc được cache tài sản '{self.blob_path}': {e}. Sẽ biên dịch lại.")
+            return None
+
+    @staticmethod
+    def _temp_file(path: str, mode: str):
+        """Mở một file tạm riêng (tên duy nhất) cạnh `path`, để nhiều tiến trình ghi cùng lúc không ghi đè nhau."""
+        directory = os.path.dirname(path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        return os.fdopen(fd, mode, **({} if "b" in mode else {'encoding': "utf-8"})), tmp_path
+
+    def save(self, signature: str, arrays: dict, meta: dict):
+        """Ghi blob rồi mới ghi manifest, để cache dở dang không bao giờ khớp chữ ký."""
+        specs, offset = {}, 0
+        tmp_paths = []
+        try:
+            os.makedirs(os.path.dirname(self.blob_path) or ".", exist_ok=True)
+            f, tmp_path = self._temp_file(self.blob_path, "wb")
+            tmp_paths.append(tmp_path)
+            with f:
+                for name, array in arrays.items():
+                    array = np.ascontiguousarray(array)
+                    padding = -offset % _ALIGN
+                    f.write(b"\0" * padding)
+                    offset += padding
+                    specs[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+                    f.write(array.tobytes())
+                    offset += array.nbytes
+            os.replace(tmp_path, self.blob_path)
+            f, tmp_path = self._temp_file(self.manifest_path, "w")
+            tmp_paths.append(tmp_path)
+            with f:
+                json.dump({'signature': signature, 'arrays': specs, 'meta': meta}, f)
+            os.replace(tmp_path, self.manifest_path)
+            logger.info(f"Đã lưu cache tài sản bia: {self.blob_path} ({offset / 1e6:.1f} MB)")
+        except OSError as e:
+            logger.warning(f"Không thể lưu cache tài sản: {e}")
+        finally:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+def _compile_profile(key: str, profile: dict, scales, arrays: dict):
+    """Đọc ảnh, dựng ảnh điểm và kim tự tháp đặc trưng của một bia; ghi mảng vào `arrays`."""
+    img = cv2.imread(profile['image'])
+    mask = cv2.imread(profile['mask'], cv2.IMREAD_GRAYSCALE)
+    if img is None or mask is None:
+        logger.error(f"LỖI: Không tìm thấy file tài sản cho '{key}'")
+        return None
+    img_alt_path = profile['image_alt']
+    img_alt = cv2.imread(img_alt_path) if img_alt_path and os.path.exists(img_alt_path) else None
+
+    meta = {}
+    sources = [('', img)] + ([('_alt', img_alt)] if img_alt is not None else [])
+    for suffix, image in sources:
+        arrays[f"{key}/image{suffix}"] = image
+        arrays[f"{key}/raster{suffix}"] = build_score_raster(profile['geometry'], image.shape, mask)
+        pyramid = compute_feature_pyramid(image, mask, scales) or []
+        if not pyramid:
+            logger.warning(f"Không tìm được đặc trưng nào cho ảnh bia '{key}{suffix}'")
+        meta[f"levels{suffix}"] = [level['scale'] for level in pyramid]
+        for i, level in enumerate(pyramid):
+            arrays[f"{key}/features{suffix}/L{i}/points"] = level['points']
+            arrays[f"{key}/features{suffix}/L{i}/descriptors"] = level['descriptors']
+        counts = ", ".join(f"{level['scale']:g}x: {len(level['points'])}" for level in pyramid)
+        logger.info(f"Đã tính đặc trưng cho ảnh bia '{key}{suffix}' ({counts})")
+    arrays[f"{key}/mask"] = mask
+    return meta
+
+def _pyramid(arrays: dict, prefix: str, scales, matcher_kind: str):
+    """Dựng lại kim tự tháp từ các mảng đã nạp và huấn luyện matcher cho từng mức."""
+    if not scales:
+        return None
+    levels = []
+    for i, scale in enumerate(scales):
+        descriptors = arrays[f"{prefix}/L{i}/descriptors"]
+        levels.append({
+            'scale': float(scale),
+            'points': arrays[f"{prefix}/L{i}/points"],
+            'descriptors': descriptors,
+            'matcher': create_matcher(descriptors, matcher_kind),
+        })
+    return levels
+
+def _load_or_compile(profiles: dict, cache_path: str, scales):
+    """Nạp mảng tài sản từ cache đóng gói; cache không khớp thì biên dịch lại và ghi cache."""
+    cache = PackedAssetCache(cache_path)
+    signature = _profiles_signature(profiles, scales)
+    loaded = cache.load(signature)
+    if loaded is not None:
+        arrays, meta = loaded
+        logger.info(f"Đã nạp cache tài sản bia: {cache.blob_path} ({len(meta)} bia)")
+        return arrays, meta
+    arrays, meta = {}, {}
+    for key, profile in profiles.items():
+        target_meta = _compile_profile(key, profile, scales, arrays)
+        if target_meta is not None:
+            meta[key] = target_meta
+    cache.save(signature, arrays, meta)
+    return arrays, meta
+
+def ensure_target_cache(profiles: dict, cache_path: str, scales=PYRAMID_SCALES) -> int:
+    """
+    Bảo đảm cache đóng gói đã có và còn khớp hồ sơ (biên dịch nếu cần), không dựng bộ tài sản.
+    Dùng trước khi khởi động nhiều tiến trình, để các tiến trình đó chỉ cần nạp cache.
+
+    Returns:
+        Số bia có trong cache.
+    """
+    _, meta = _load_or_compile(profiles, cache_path, scales)
+    return len(meta)
+
+def compile_target_assets(profiles: dict, cache_path: str, matcher_kind: str = 'bf', scales=PYRAMID_SCALES) -> dict:
+    """
+    Biên dịch các hồ sơ bia thành bộ tài sản dùng cho handle_hit.
+    Lần đầu (hoặc khi hồ sơ/file nguồn đổi) đọc ảnh và tính toán rồi ghi cache đóng gói;
+    những lần sau chỉ memory-map cache đó.
+
+    Returns:
+        dict {key: bộ tài sản} với các khóa khớp tham số của utils.handles.handle_hit.
+    """
+    arrays, meta = _load_or_compile(profiles, cache_path, scales)
+    assets = {}
+    for key, target_meta in meta.items():
+        has_alt = f"{key}/image_alt" in arrays
+        assets[key] = {
+            'original_img': arrays[f"{key}/image"],
+            'original_img_alt': arrays[f"{key}/image_alt"] if has_alt else None,
+            'mask': arrays[f"{key}/mask"],
+            'features': _pyramid(arrays, f"{key}/features", target_meta['levels'], matcher_kind),
+            'features_alt': _pyramid(
+                arrays, f"{key}/features_alt", target_meta['levels_alt'], matcher_kind
+            ) if has_alt else None,
+            # Ảnh điểm biên dịch sẵn: tính điểm chỉ còn là một phép tra mảng
+            'score_raster': arrays[f"{key}/raster"],
+            'score_raster_alt': arrays[f"{key}/raster_alt"] if has_alt else None,
+            # Homography gần nhất của bia này, dùng lại khi khung cảnh không đổi
+            'homography_cache': HomographyCache(key),
+            'geometry': profiles[key]['geometry'],
+            'label': profiles[key]['label'],
+        }
+    return assets